@@ -32,7 +32,7 @@ def fit(model: ModelInterface):  # TODO: some better version control =\
     return status, fit_result
 
 
-def predict(model: ModelInterface):
+def predict(model: ModelInterface, write_out: bool = True):
     l.info(f'Trying to predict {model.__class__}')
     try:
         model.load_model_core(Config.LATEST_TAG)
@@ -40,7 +40,7 @@ def predict(model: ModelInterface):
         l.warning(f'Predict called on not fitted model!')
         model.fit()
         model.dump_model_core(dump_id='initial', new_champ=True)
-    rs = model.predict(write_out=True)
+    rs = model.predict(write_out=write_out)
     return rs
 
 
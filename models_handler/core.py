@@ -4,11 +4,17 @@ from enum import Enum
 import importlib
 import json
 import os
+import pickle
 import pkgutil
 import shelve
+import sys
+import threading
+import time
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 from datetime import datetime
 from sklearn.exceptions import NotFittedError
+from orchestrator import l
 
 class Config(Enum):
     LATEST_TAG = 'latest'
@@ -20,12 +26,81 @@ class Config(Enum):
     LAST_LAUNCH_TIME = 'last_launch_time'
     DUMP_MODEL_SECTION = 'model'
     DEMP_META_SECTION = 'description'
+    CHAMPION_EXT = '.champion'  # file next to model dump, holds identity of the dump that is latest
 
     def __get__(self, instance, owner):
         return self.value
 
 
 DUMPS_PATH = os.environ['DUMPS_PATH']
+MODELS_POLL_INTERVAL = float(os.environ.get('MODELS_POLL_INTERVAL', 2))  # seconds between checks for changed models
+MODEL_CACHE_SIZE = int(os.environ.get('MODEL_CACHE_SIZE', 8))  # loaded dumps kept in memory, 0 disables the cache
+MODEL_CACHE_BYTES = int(os.environ.get('MODEL_CACHE_BYTES', 0))  # bound on their pickled size, 0 is unbounded
+
+
+class ModelCoreCache:
+    """
+    Thread-safe LRU of loaded model dumps, keyed by model class, dump id and ModelInterface.dump_stamp();
+    Writing dumps changes the stamp, so a stale dump is never hit. Models invalidate their entries on dump and delete
+    as well, for filesystems with coarse mtimes.
+    Dumps are kept pickled and every hit gets it's own copy, so a model fitted in place after a load doesn't change
+    the cached one; It saves reading the shelve, not unpickling.
+    """
+
+    def __init__(self, max_items: int = MODEL_CACHE_SIZE, max_bytes: int = MODEL_CACHE_BYTES):
+        """
+        :param max_items: number of dumps kept, 0 keeps none
+        :param max_bytes: bound on pickled size of dumps kept, 0 is unbounded
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()  # key -> pickled dump, least recently used first
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(entry)
+
+    def put(self, key, dump):
+        if not self.max_items:
+            return
+        try:
+            entry = pickle.dumps(dump, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:  # can't be copied, so it's not kept
+            return
+        if self.max_bytes and entry.__len__() > self.max_bytes:
+            return
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__bytes -= old.__len__()
+            self.__entries[key] = entry
+            self.__bytes += entry.__len__()
+            while self.__entries.__len__() > self.max_items or (self.max_bytes and self.__bytes > self.max_bytes):
+                self.__bytes -= self.__entries.popitem(last=False)[1].__len__()
+
+    def invalidate(self, model: type):
+        """
+        Drops all dumps of model class
+        """
+        with self.__lock:
+            for key in [k for k in self.__entries if k[0] is model]:
+                self.__bytes -= self.__entries.pop(key).__len__()
+
+    def __len__(self):
+        return self.__entries.__len__()
+
+
+core_cache = ModelCoreCache()
 
 
 class ModelInterface(metaclass=ABCMeta):
@@ -111,8 +186,9 @@ class ModelInterface(metaclass=ABCMeta):
         db = shelve.open(self.__dump_path)
 
         self._update_meta()
+        saved = datetime.now()
         db[dump_id] = {
-                'saved': datetime.now(),
+                'saved': saved,
                 'description': self.metadata,
                 'model': self.model_core,
                 'score': self.score()
@@ -121,6 +197,9 @@ class ModelInterface(metaclass=ABCMeta):
             db[Config.LATEST_TAG] = db.get(dump_id)
 
         db.close()
+        if new_champ:
+            self._record_champion(f'{dump_id}@{saved.isoformat()}')
+        core_cache.invalidate(self.__class__)
         return True
 
     @abstractmethod
@@ -131,12 +210,17 @@ class ModelInterface(metaclass=ABCMeta):
         """
         if not os.path.exists(DUMPS_PATH):
             os.mkdir(DUMPS_PATH, mode=0o777)  # checks and creates dumps folder inside modelwrapper root
-        db = shelve.open(self.__dump_path)
-        model = db.get(dump_id)
-        db.close()
+        # stamp is taken before reading, so a dump written meanwhile is never cached under the newer stamp
+        key = (self.__class__, dump_id, self.__class__.dump_stamp())
+        model = core_cache.get(key)
         if model is None:
-            raise NotFittedError()
-        self.model_core = model[Config.DUMP_MODEL_SECTION]
+            db = shelve.open(self.__dump_path)
+            model = db.get(dump_id)
+            db.close()
+            if model is None:
+                raise NotFittedError()
+            core_cache.put(key, model)
+        self.model_core = model[Config.DUMP_MODEL_SECTION]  # own copy, can be fitted in place
         self.metadata = model[Config.DEMP_META_SECTION]
         self.score_ball = model['score']
         return True
@@ -149,6 +233,9 @@ class ModelInterface(metaclass=ABCMeta):
         db = shelve.open(self.__dump_path)
         del db[dump_id]
         db.close()
+        if dump_id == Config.LATEST_TAG:
+            self._record_champion(None)
+        core_cache.invalidate(self.__class__)
         return True
 
     def show_dumps(self):
@@ -163,32 +250,156 @@ class ModelInterface(metaclass=ABCMeta):
         finally:
             db.close()
 
+    @classmethod
+    def dump_stamp(cls) -> str:
+        """
+        Version stamp of model dumps; Changes whenever dumps are written, e.g. new champion is promoted or restored.
+        Doesn't need model instance, so it's cheap enough for every task call
+        :return: str, empty if model was never dumped
+        """
+        path = os.path.join(DUMPS_PATH, cls.__name__)
+        # shelve backends store to path itself or add their own extensions
+        stamps = [os.stat(f).st_mtime_ns for f in [path, f'{path}.db', f'{path}.dat', f'{path}.dir'] if os.path.exists(f)]
+        return str(max(stamps)) if stamps else ''
+
+    @classmethod
+    def champion_stamp(cls) -> str:
+        """
+        Identity of the champion (latest) dump; Unlike dump_stamp, doesn't change when a challenger that lost is dumped.
+        Read from a small file, so it's as cheap as dump_stamp
+        :return: str, dump_stamp if champion was never recorded (e.g. dumps made by an older version)
+        """
+        try:
+            with open(os.path.join(DUMPS_PATH, cls.__name__ + Config.CHAMPION_EXT)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return cls.dump_stamp()
+
+    def _record_champion(self, identity):
+        """
+        :param identity: str, None if there is no champion anymore
+        """
+        path = os.path.join(DUMPS_PATH, self.__class__.__name__ + Config.CHAMPION_EXT)
+        if identity is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(identity)
+        os.replace(f'{path}.tmp', path)  # readers never see a half written file
+
     def restore_dump(self, dump_id: str):
         self.load_model_core(dump_id=dump_id)
         self.dump_model_core(dump_id=dump_id, new_champ=True)
         return True
 
 
+class ModelRegistry:
+    """
+    Process-wide dict of ModelInterface implementations found in models folder: subclasses, direct or not, defined
+    in it's modules; Classes imported there from elsewhere are not models, unlike with ModelInterface.__subclasses__().
+    Model modules are imported once; On lookup, at most every poll_interval seconds, their files are checked by mtime:
+    new modules are imported, changed ones reloaded and deleted ones forgotten, so uploaded models are picked up
+    without a restart. Checking on lookup instead of in a thread keeps forked worker processes up to date too.
+    """
+
+    def __init__(self, base_folder: str, package: str, poll_interval: float = MODELS_POLL_INTERVAL):
+        """
+        :param base_folder: folder with a package per model
+        :param package: importable name of base_folder
+        :param poll_interval: seconds, 0 checks files on every lookup
+        """
+        self.base_folder = base_folder
+        self.package = package
+        self.poll_interval = poll_interval
+        self.models = dict()  # model name -> ModelInterface implementation
+        self.__modules = dict()  # module name -> mtime of it's file
+        self.__classes = dict()  # module name -> dict of model name to class, of models defined in the module
+        self.__checked = None
+        self.__lock = threading.Lock()
+
+    def get(self, model_name: str):
+        """
+        :return: ModelInterface implementation
+        :raises KeyError: if there is no such model
+        """
+        if self.__checked is None or time.monotonic() - self.__checked >= self.poll_interval:
+            self.refresh()
+        model = self.models.get(model_name)
+        if model is None:
+            self.refresh()  # may have been uploaded since the last check
+            model = self.models[model_name]
+        return model
+
+    def __scan(self) -> dict:
+        """
+        :return: dict of module name to mtime of it's file, of modules in models/{model}/ folders
+        """
+        found = dict()
+        for model in os.listdir(self.base_folder):  # check models dir and it's subfolders. os.walk is not convenient
+            pkg_dir = os.path.join(self.base_folder, model)
+            for (finder, name, ispkg) in pkgutil.iter_modules([pkg_dir]):
+                spec = finder.find_spec(name)
+                if spec is None or spec.origin is None:
+                    continue
+                try:
+                    found[f'{self.package}.{model}.{name}'] = os.stat(spec.origin).st_mtime_ns
+                except OSError:  # deleted meanwhile
+                    continue
+        return found
+
+    def refresh(self) -> bool:
+        """
+        Imports new, reloads changed and forgets deleted model modules
+        :return: True if models changed
+        """
+        with self.__lock:
+            found = self.__scan()
+            changed = False
+            for module, mtime in found.items():
+                known = self.__modules.get(module)
+                if known == mtime:
+                    continue
+                importlib.invalidate_caches()  # so a module uploaded just now is found
+                if known is not None:  # imported anew rather than reloaded, so classes renamed away don't linger
+                    sys.modules.pop(module, None)
+                try:
+                    imported = importlib.import_module(module)
+                except Exception as e:  # broken upload keeps the models it had, and is tried again next check
+                    l.error(f'Model module {module} could not be imported: {e}')
+                    continue
+                self.__modules[module] = mtime
+                self.__classes[module] = {obj.__name__: obj for obj in vars(imported).values()
+                                          if isinstance(obj, type) and issubclass(obj, ModelInterface)
+                                          and obj.__module__ == module}
+                l.info(f'Model module {module} {"loaded" if known is None else "reloaded"}')
+                changed = True
+            for module in set(self.__modules) - set(found):
+                del self.__modules[module]
+                self.__classes.pop(module, None)
+                l.info(f'Model module {module} removed')
+                changed = True
+            if changed:  # swapped whole, so lookups never see it half built
+                self.models = {name: cls for classes in self.__classes.values() for name, cls in classes.items()}
+            self.__checked = time.monotonic()
+            return changed
+
+
+registry = ModelRegistry(os.path.join(os.path.dirname(__file__), Config.MODELS_FOLDER), f'{__package__}.models')
+
+
 class ModelLoader:
     """
-    Loads models from folders dynamically.
+    Looks models up in the process-wide registry, see ModelRegistry.
     """
 
     def __init__(self, model_name: str):
-        self.__model_list = None
-        self.__base_folder = os.path.join(os.path.dirname(__file__), Config.MODELS_FOLDER)
-        self._import_models()  # load models recursively based on ModelInterface implementation
-        self.model = self.__model_list[model_name]
+        self.model = registry.get(model_name)
+        self.__model_list = registry.models
 
     def _import_models(self) -> None:
         """
-        Finds all ModelInterface subclasses and treats them as models. Imports them dynamically.
+        Checks models folder for new and changed models right away
         """
-        for model in os.listdir(self.__base_folder):  # check models dir and it's subfolders. os.walk is not convenient
-            pkg_dir = os.path.join(self.__base_folder, model)
-            for (finder, name, ispkg) in pkgutil.iter_modules([pkg_dir]):
-                # dynamically import packages from models/{model_name}/ folder
-                importlib.import_module(f'{__package__}.models.{model}.{name}')
-
-        # generates a dict of ModelInterface implementations
-        self.__model_list = {subcl.__name__: subcl for subcl in ModelInterface.__subclasses__()}
+        registry.refresh()
+        self.__model_list = registry.models
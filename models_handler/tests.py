@@ -1,8 +1,11 @@
 import os
 import shelve
+import sys
+import tempfile
 from datetime import datetime
 from unittest import TestCase
-from models_handler.core import ModelInterface, ModelLoader, Config
+from models_handler.core import ModelInterface, ModelLoader, ModelRegistry, ModelCoreCache, Config, core_cache, \
+    registry
 from models_handler import fit, predict, current_loader
 from numpy.core.multiarray import ndarray
 from sklearn.exceptions import NotFittedError
@@ -28,10 +31,16 @@ class TestModelLoader(TestCase):
 
     def test_model_list(self):
         model_list = getattr(self.loader, "_ModelLoader__model_list")
-        keys = {'TestModel1', 'TestModel2', 'BTtC_Model'}
+        keys = {'TestModel1', 'TestModel2'}  # example models; Subclasses defined in tests are not listed
         self.assertTrue(type(model_list) == dict)
         self.assertSetEqual(set(model_list.keys()), keys)
 
+    def test_registry_list(self):
+        examples = ModelRegistry(registry.base_folder, registry.package, poll_interval=0)
+        examples.refresh()
+        self.assertSetEqual(set(examples.models), {'TestModel1', 'TestModel2'})
+        self.assertIs(examples.get(MODEL_NAME), self.loader.model)  # modules are imported once per process
+
     def test_model_subclasses(self):
         for k, model in getattr(self.loader, "_ModelLoader__model_list").items():
             self.assertTrue(issubclass(model, ModelInterface))
@@ -40,6 +49,116 @@ class TestModelLoader(TestCase):
         self.assertTrue(issubclass(self.loader.model, ModelInterface))
 
 
+MODEL_SOURCE = '''from models_handler.core import ModelInterface
+
+
+class {name}(ModelInterface):
+    def __init__(self):
+        super().__init__(__file__)
+
+    def fit(self): return True
+
+    def predict(self): return True
+
+    def score(self): return {score}
+
+    def dump_model_core(self, dump_id='', new_champ=False): return True
+
+    def load_model_core(self, dump_id): return True
+
+    def delete_model_core(self, dump_id): return True
+'''
+
+
+class TestModelRegistry(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.package = 'registry_test_models'
+        base = os.path.join(self.folder.name, self.package)
+        os.makedirs(os.path.join(base, 'uploaded'))
+        for init in (os.path.join(base, '__init__.py'), os.path.join(base, 'uploaded', '__init__.py')):
+            open(init, 'w').close()
+        self.module = os.path.join(base, 'uploaded', 'model.py')
+        sys.path.insert(0, self.folder.name)
+        self.registry = ModelRegistry(base, self.package, poll_interval=0)
+
+    def tearDown(self):
+        sys.path.remove(self.folder.name)
+        for module in [m for m in sys.modules if m.startswith(self.package)]:
+            del sys.modules[module]
+        self.folder.cleanup()
+
+    def write(self, name, score, stamp):
+        with open(self.module, 'w') as fl:
+            fl.write(MODEL_SOURCE.format(name=name, score=score))
+        os.utime(self.module, ns=(stamp, stamp))  # mtime changes even within filesystem timestamp resolution
+
+    def test_hot_reload(self):
+        with self.assertRaises(KeyError):
+            self.registry.get('Uploaded')
+        self.write('Uploaded', 0.1, 10 ** 18)
+        self.assertEqual(self.registry.get('Uploaded').score(None), 0.1)  # uploaded without a restart
+        self.assertFalse(self.registry.refresh())  # not changed, not reimported
+        self.write('Uploaded', 0.2, 2 * 10 ** 18)
+        self.assertEqual(self.registry.get('Uploaded').score(None), 0.2)
+        self.write('Renamed', 0.3, 3 * 10 ** 18)
+        self.assertTrue(self.registry.refresh())
+        self.assertEqual(set(self.registry.models), {'Renamed'})
+        os.remove(self.module)
+        self.assertTrue(self.registry.refresh())
+        self.assertEqual(self.registry.models, dict())
+
+    def test_poll_interval(self):
+        self.registry.poll_interval = 3600
+        self.write('Uploaded', 0.1, 10 ** 18)
+        model = self.registry.get('Uploaded')
+        self.write('Uploaded', 0.2, 2 * 10 ** 18)
+        self.assertIs(self.registry.get('Uploaded'), model)  # lookups are dict access between checks
+        self.registry.refresh()
+        self.assertIsNot(self.registry.get('Uploaded'), model)
+
+
+class TestModelCoreCache(TestCase):
+    @staticmethod
+    def key(dump_id, stamp=''):
+        return ModelInterface, dump_id, stamp
+
+    def test_lru(self):
+        cache = ModelCoreCache(max_items=2)
+        cache.put(self.key('first'), {'model': 1})
+        cache.put(self.key('second'), {'model': 2})
+        self.assertEqual(cache.get(self.key('first')), {'model': 1})  # second is least recently used now
+        cache.put(self.key('third'), {'model': 3})
+        self.assertIsNone(cache.get(self.key('second')))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_max_bytes(self):
+        cache = ModelCoreCache(max_items=10, max_bytes=2000)
+        cache.put(self.key('big'), {'model': b'x' * 5000})
+        self.assertEqual(len(cache), 0)
+        for dump_id in ('first', 'second', 'third'):
+            cache.put(self.key(dump_id), {'model': b'x' * 800})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(self.key('first')))
+
+    def test_copies(self):
+        cache = ModelCoreCache()
+        dump = {'model': [1]}
+        cache.put(self.key('fitted'), dump)
+        dump['model'].append(2)  # e.g. fitted in place after it was loaded
+        cache.get(self.key('fitted'))['model'].append(3)
+        self.assertEqual(cache.get(self.key('fitted')), {'model': [1]})
+
+    def test_invalidate(self):
+        cache = ModelCoreCache()
+        cache.put(self.key(Config.LATEST_TAG, '1'), {})
+        cache.put((ModelLoader, Config.LATEST_TAG, '1'), {})
+        cache.invalidate(ModelInterface)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(self.key(Config.LATEST_TAG, '1')))
+
+
 class TestModelInterface(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -124,6 +243,23 @@ class TestModelInterface(TestCase):
         print('Shelve keys:', list(db.keys()))
         db.close()
 
+    def test_dump_stamp(self):
+        stamp = self.model.__class__.dump_stamp()
+        self.model.dump_model_core(dump_id='stamp', new_champ=True)
+        self.assertNotEqual(stamp, self.model.__class__.dump_stamp())
+
+    def test_core_cache(self):
+        self.model.dump_model_core(Config.LATEST_TAG, new_champ=True)
+        self.model.load_model_core(Config.LATEST_TAG)
+        hits = core_cache.hits
+        other = ModelLoader(MODEL_NAME).model()
+        other.load_model_core(Config.LATEST_TAG)
+        self.assertEqual(core_cache.hits, hits + 1)  # not read from the dump again
+        self.assertIs(other.model_core, self.model.model_core)
+        self.model.dump_model_core('challenger', new_champ=True)
+        other.load_model_core(Config.LATEST_TAG)
+        self.assertEqual(core_cache.hits, hits + 1)  # new champion is read from the dump
+
     def test_delete_model_core(self):
         dump_path = os.path.join(DUMPS_PATH, MODEL_NAME)
 
@@ -72,7 +72,29 @@ class StorageEnvironment(Environment):
             'ssl_certfile': None,
             'ssl_cert_reqs': None,
             'ssl_ca_certs': None,
-            'max_connections': None
+            'max_connections': None,  # shared by all connectors with the same parameters, see RedisPoolRegistry
+            'pool_timeout': 20,  # seconds to wait for a free connection when max_connections is reached
+            # typed values encoding, see orchestrator.serializers
+            'serializer': 'pickle',  # pickle, pickle5 (out-of-band buffers) or msgpack (JSON-safe payloads)
+            'pickle_protocol': None,  # None for default protocol
+            'compression': None,  # None, zlib or lz4
+            'compress_threshold': 65536,  # bytes
+            'compress_level': None
+        }
+    }
+
+    MEMORY = {
+        'cls': 'memory',
+        'conf': {
+            'typed': True,
+            'db': 0,
+            'max_bytes': None,  # LRU eviction bound for stored values, None is unbounded
+            'expire_interval': 1,  # seconds between active expiry sweeps
+            'serializer': 'pickle',  # same as for REDIS
+            'pickle_protocol': None,
+            'compression': None,
+            'compress_threshold': 65536,
+            'compress_level': None
         }
     }
 
@@ -83,7 +105,9 @@ class StorageEnvironment(Environment):
 class ConfigEnvironment(Environment):
     PERSISTENT = {
         'cls': 'persistent',
-        'conf': {}  # uses default connector
+        'conf': {  # uses default connector
+            'cache': True  # local read-through cache, invalidated over connector pub/sub
+        }
     }
 
     default = {'cls': _os.environ.get('orc_config_env'), 'conf': {}} if _os.environ.get(
@@ -108,10 +132,42 @@ class TaskEnvironment(Environment):
         'conf': {
             'tasks': {
                 'health': health
+            },
+            # task name -> (lane, max concurrency), so health checks are not queued behind long tasks
+            'lanes': {
+                'health': ('service', 1)
             }
         }
     }
 
+    PROCESS = {
+        'cls': 'multiprocess',
+        'conf': {
+            'tasks': {
+                'health': health
+            },
+            'lanes': {
+                'health': ('service', 1)
+            },
+            # fork shares registered tasks with workers; spawn and forkserver need them importable (not from __main__)
+            'start_method': 'fork'
+        }
+    }
+
+    QUEUE = {
+        'cls': 'queue',
+        'conf': {
+            'tasks': {
+                'health': health
+            },
+            'lanes': {
+                'health': ('service', 1)
+            },
+            # threads taking tasks from the shared queue, TaskerConfig.WORKER_NUM if None; 0 for API-only nodes
+            'consumers': None
+        }
+    }
+
     default = {'cls': _os.environ.get('orc_task_env'), 'conf': {}} if _os.environ.get(
         'orc_task_env') is not None else THREAD
 
@@ -214,6 +270,95 @@ class Connector(BaseAbstract, metaclass=ABCMeta):
         """
         return []
 
+    @abstractmethod
+    def expire(self, key, time):
+        """
+        Set key to expire
+        :param key: Key in connected database
+        :param time: seconds to live
+        :return: bool: False if key does not exist
+        """
+        return True
+
+    @abstractmethod
+    def hset(self, key, mapping):
+        """
+        Store fields of a hash; Each field value is stored separately
+        :param key: Hash key
+        :param mapping: dict of field name to value
+        :return: bool: Success of the operation
+        """
+        return True
+
+    @abstractmethod
+    def hmget(self, key, fields):
+        """
+        Get several fields of a hash without fetching the rest
+        :param key: Hash key
+        :param fields: list of field names
+        :return: list: values in the order of fields, None for missing ones
+        """
+        return [None for _ in fields]
+
+    @abstractmethod
+    def hgetall(self, key):
+        """
+        :param key: Hash key
+        :return: dict: all fields of a hash, empty if key does not exist
+        """
+        return dict()
+
+    @abstractmethod
+    def mget(self, keys):
+        """
+        Get stored values for several keys in one round trip
+        :param keys: list of keys
+        :type keys: list
+        :return: list: values in the order of keys, None for missing ones
+        """
+        return [None for _ in keys]
+
+    @abstractmethod
+    def mset(self, mapping, ex=None):
+        """
+        Store several values in one round trip
+        :param mapping: dict of key to value
+        :type mapping: dict
+        :param ex: expire time in seconds applied to every key
+        :return: bool: Success of the operation
+        """
+        return True
+
+    @abstractmethod
+    def pipeline(self, transaction=True):
+        """
+        Batch of commands sent in one round trip; Supports the same typed operations as connector itself.
+        Usable as a context manager, commands are queued and return the pipeline, execute() sends them.
+        :param transaction: run batch atomically
+        :return: pipeline object, execute() returns a list of command results
+        """
+        pass
+
+    @abstractmethod
+    def scan_iter(self, match='*', count=None):
+        """
+        Cursor-based iteration over keys by pattern; Does not block the storage like keys() does
+        :param match: pattern with * as wildcard
+        :param count: hint of how many keys to fetch per cursor step
+        :return: generator of stored keys
+        """
+        yield from []
+
+    @abstractmethod
+    def exists(self, key):
+        """
+        Check if key is present
+        :param key: Key in connected database
+        :type key: str
+        :return: bool
+        """
+        return False
+
     @abstractmethod
     def graceful_shutdown(self):
         """
@@ -221,6 +366,198 @@ class Connector(BaseAbstract, metaclass=ABCMeta):
         :return:
         """
 
+    def pool_status(self) -> dict:
+        """
+        :return: dict describing utilization of connections (or storage) behind this connector, empty if unknown
+        """
+        return dict()
+
+
+class IndexConnector(metaclass=ABCMeta):
+    """
+    Optional capability of a Connector: unordered (set) and ordered (sorted set) indexes of str members;
+    Users check isinstance(connector, IndexConnector) and fall back to scanning keys without it
+    """
+
+    @abstractmethod
+    def sadd(self, key, *members):
+        """
+        Add members to an unordered index (set) stored at key
+        :param key: Index key
+        :param members: str members to add
+        :return: int: number of members added
+        """
+        return 0
+
+    @abstractmethod
+    def srem(self, key, *members):
+        """
+        Remove members from an unordered index (set) stored at key
+        :param key: Index key
+        :param members: str members to remove
+        :return: int: number of members removed
+        """
+        return 0
+
+    @abstractmethod
+    def smembers(self, key):
+        """
+        :param key: Index key
+        :return: set: all members of an unordered index
+        """
+        return set()
+
+    @abstractmethod
+    def sismember(self, key, member):
+        """
+        :param key: Index key
+        :param member: str member to check
+        :return: bool: True if member is in the unordered index
+        """
+        return False
+
+    @abstractmethod
+    def zadd(self, key, mapping):
+        """
+        Add members to an ordered index (sorted set) stored at key
+        :param key: Index key
+        :param mapping: dict of str member to it's numeric score
+        :return: int: number of members added
+        """
+        return 0
+
+    @abstractmethod
+    def zrem(self, key, *members):
+        """
+        Remove members from an ordered index
+        :param key: Index key
+        :param members: str members to remove
+        :return: int: number of members removed
+        """
+        return 0
+
+    @abstractmethod
+    def zrange(self, key, start=0, end=-1, desc=False):
+        """
+        Slice an ordered index by rank; Both ends are inclusive, negative values count from the end
+        :param key: Index key
+        :param start: first rank
+        :param end: last rank
+        :param desc: order by score descending
+        :return: list: members
+        """
+        return []
+
+    @abstractmethod
+    def zremrangebyscore(self, key, min, max):
+        """
+        Remove members of an ordered index with score between min and max (inclusive)
+        :param key: Index key
+        :return: int: number of members removed
+        """
+        return 0
+
+
+class QueueConnector(metaclass=ABCMeta):
+    """
+    Optional capability of a Connector: lists used as work queues, an item taken is moved, never lost in between;
+    Required by the queue tasker
+    """
+
+    @abstractmethod
+    def lpush(self, key, *members):
+        """
+        Push members to the head of a list (work queue)
+        :param key: List key
+        :param members: str members
+        :return: int: length of the list after push
+        """
+        return 0
+
+    @abstractmethod
+    def rpoplpush(self, src, dst):
+        """
+        Atomically move the tail member of src to the head of dst, so an item taken from a queue is never lost
+        :return: str member or None if src is empty
+        """
+        return None
+
+    @abstractmethod
+    def brpoplpush(self, src, dst, timeout=0):
+        """
+        Blocking version of rpoplpush; Waits up to timeout seconds (0 is forever) for a member to appear in src
+        :return: str member or None on timeout
+        """
+        return None
+
+    @abstractmethod
+    def lrem(self, key, count, member):
+        """
+        Remove occurrences of member from a list; count > 0 from the head, < 0 from the tail, 0 - all of them
+        :return: int: number of members removed
+        """
+        return 0
+
+    @abstractmethod
+    def llen(self, key):
+        """
+        :return: int: length of the list stored at key, 0 if there is none
+        """
+        return 0
+
+    @abstractmethod
+    def lrange(self, key, start=0, end=-1):
+        """
+        Slice a list by position, both ends inclusive, negative values count from the end
+        :return: list: members
+        """
+        return []
+
+
+class PubSubConnector(metaclass=ABCMeta):
+    """
+    Optional capability of a Connector: broadcasting messages to subscribers sharing the storage;
+    Without it waiters and config caches poll the storage instead
+    """
+
+    @abstractmethod
+    def publish(self, channel, message):
+        """
+        Broadcast a message to every subscriber of channel, including ones in other processes sharing the storage
+        :param channel: str
+        :param message: str
+        :return: int: number of subscribers reached
+        """
+        return 0
+
+    @abstractmethod
+    def subscribe(self, channel, handler):
+        """
+        Calls handler(message) from a background listener for every message published to channel;
+        handler(None) is called whenever messages might have been missed, e.g. on (re)subscription
+        :param channel: str
+        :param handler: function
+        :return: subscription object with .active flag and .stop()
+        """
+        pass
+
+
+class LockConnector(metaclass=ABCMeta):
+    """
+    Optional capability of a Connector: compare-and-delete of a key, to take over claims nobody released;
+    Without it identical task calls are not coalesced
+    """
+
+    @abstractmethod
+    def delete_if_equal(self, key, value):
+        """
+        Atomically delete a key only if it still holds value, e.g. to take over a lock nobody released
+        :param key: Key in connected database
+        :param value: Value the key is expected to hold
+        :return: bool: True if key was deleted
+        """
+        return True
+
 
 # this populates implementations of connector class
 from . import connectors
@@ -316,6 +653,15 @@ class ConfigLoader(BaseAbstract, metaclass=ABCMeta):
         """
         pass
 
+    @property
+    @abstractmethod
+    def list_config(self):
+        """
+        Property
+        :return: returns a dict of config keys, marked as public, to their current values
+        """
+        pass
+
     @abstractmethod
     def set_public(self, key, value):
         """
@@ -356,17 +702,22 @@ class ConfigLoader(BaseAbstract, metaclass=ABCMeta):
 
 # Populating impl_list of ConfigLoader
 from . import config_loader
-from .errors import InvalidTaskArguments, NotAFunction
+from .errors import InvalidTaskArguments, NotAFunction, TaskCancelled, TaskTimeout
 # Tasker
-import types, time
+import types, time, threading
 
 from inspect import signature
 from inspect import _ParameterKind, _empty
 
 
+def no_hook(*args, **kwargs):
+    return None
+
+
 class Tasker(BaseAbstract, metaclass=ABCMeta):
     default = Conductor.TASKER
     name = None
+    DEFAULT_LANE = 'default'
 
     @abstractmethod
     def __init__(self, connector=None, configurator=None, **kwargs):
@@ -387,17 +738,53 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def register_task(self, name: str, func: types.FunctionType) -> bool:
+    def register_task(self, name: str, func: types.FunctionType, lane: str = None, max_concurrency: int = None,
+                      cache_ttl: int = None, cache_version: types.FunctionType = None, coalesce: bool = False,
+                      recovery: str = None, max_attempts: int = None, timeout: float = None,
+                      affinity: types.FunctionType = None) -> bool:
         """
         Adds a new task to tasker dict;
         :param name: name of function
         :param func:
+        :param lane: tasks of a lane run on their own workers, so long tasks of one lane don't starve another;
+        Tasker.DEFAULT_LANE if None
+        :param max_concurrency: number of workers of the lane, TaskerConfig.WORKER_NUM for a new lane if None
+        :param cache_ttl: results are memoized for this many seconds, by task name and arguments; None - never
+        :param cache_version: called with task args and kwargs, returns a token that is part of memoization key,
+        e.g. id of the model dump results depend on
+        :param coalesce: a call identical to one still new or in progress (by name, arguments and cache_version)
+        is not run again, caller gets the running task instead
+        :param recovery: what recover() does with the task found in progress after a crash: TaskWrapper.RETRY runs it
+        from scratch, TaskWrapper.RESUME runs it with last TaskContext.checkpoint, TaskWrapper.FAIL (default) fails it
+        :param max_attempts: task is failed instead of being run again once it was run this many times; None - no limit
+        :param timeout: seconds a task may take from submission, it's stored in timeout status after that;
+        None - no limit
+        :param affinity: called with task args and kwargs, returns a key of what a run leaves loaded in it's worker,
+        e.g. model name and dump id; taskers with separate workers prefer a free worker that ran the same key
         :return:
         """
         pass
 
     @abstractmethod
-    def run_task(self, name: str, args: list = [], kwargs: dict = {}, blocking=False, validate=False):
+    def recover(self):
+        """
+        Picks up tasks left unfinished by a previous run: new tasks are run again in order of creation, tasks in progress
+        are handled according to recovery policy they were registered with. Call it once tasks are registered.
+        """
+        pass
+
+    @abstractmethod
+    def invalidate_cache(self, name: str = None) -> int:
+        """
+        Drops memoized results of a task, or of all tasks
+        :param name: task name, None for all
+        :return: number of results dropped
+        """
+        pass
+
+    @abstractmethod
+    def run_task(self, name: str, args: list = [], kwargs: dict = {}, blocking=False, validate=False,
+                 timeout: float = None):
         """
         calls task with *args and **kwargs
         :param name: Name in task Registry
@@ -407,15 +794,68 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
         :param kwargs: Kwargs for the function stored
         :type kwargs: dict
         :param blocking: If set to true, makes the function call synchronous, returning result right away
+        :param timeout: deadline of this call in seconds, the shorter of it and task's timeout applies; Tasks submitted
+        from a task with a deadline get no more than it's remaining time
         :return:
         """
         pass
 
     @abstractmethod
-    def get_task_info(self, task_id: str):
+    def run_tasks(self, calls: list, validate=False) -> list:
+        """
+        Submits a batch of tasks; Whole batch is validated before anything is run, records are stored in one go
+        :param calls: list of dicts with task name under 'task' and optional 'args', 'kwargs' and 'timeout'
+        :param validate: check arguments of every call against task signature
+        :return: list of TaskResultWrapper, in order of calls
+        """
+        pass
+
+    @abstractmethod
+    def run_workflow(self, nodes: dict, blocking=False, timeout: float = None):
+        """
+        Runs a DAG of task calls as one workflow task: a node is submitted once it's upstream nodes are done,
+        so independent branches run in parallel, and results are passed downstream
+        :param nodes: dict of node name to {'task': name, 'kwargs': {...}, 'after': [node, ...],
+        'inputs': {kwarg: node} - kwarg gets node's result, 'when': node - runs only if node's result is true}
+        :param blocking: same as in run_task
+        :param timeout: same as in run_task, nodes get no more than what's left of it
+        :return: TaskResultWrapper of the workflow task
+        """
+        pass
+
+    @abstractmethod
+    def workflow_status(self, task_id: str):
+        """
+        :param task_id: workflow task id
+        :return: dict with workflow status and status and task id of every node, None if there is no such workflow
+        """
+        pass
+
+    @abstractmethod
+    def get_metrics(self) -> str:
+        """
+        :return: queue wait, run time, result size histograms and outcome counts of tasks run by this node,
+        queue depth and active workers of lanes, in Prometheus text format
+        """
+        pass
+
+    @abstractmethod
+    def get_task_info(self, task_id: str, result: bool = True):
         """
         :param task_id:
-        :return:
+        :param result: if False, only status fields are fetched and result payload is not deserialized
+        :return: TaskResultWrapper or None
+        """
+        pass
+
+    @abstractmethod
+    def wait_task(self, task_id: str, timeout: float = None, result: bool = True):
+        """
+        Blocks until task is finished, woken by completion notification instead of polling
+        :param task_id:
+        :param timeout: seconds to wait at most, None for TaskerConfig.TASK_SYNC_TIMEOUT
+        :param result: same as in get_task_info
+        :return: TaskResultWrapper (unfinished if timeout passed) or None
         """
         pass
 
@@ -447,14 +887,21 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
     @abstractmethod
     def kill_task(self, name: str) -> bool:
         """
-        Kills task by id
-        :param name:
-        :return:
+        Cancels task by id: a queued task is not run, a running one is asked to stop (TaskContext.check)
+        or killed if tasker can do that; Task is stored in CANCELLED status right away
+        :param name: task id
+        :return: False if task is already finished
         """
         pass
     @abstractmethod
-    def list_tasks(self) -> list:
-        """ returns current tasks list """
+    def list_tasks(self, offset: int = 0, limit: int = None, result: bool = False) -> list:
+        """
+        returns current tasks list, ordered by creation time
+        :param offset: number of tasks to skip
+        :param limit: max number of tasks to return, None for all
+        :param result: fetch results and call arguments too, by default only status fields are loaded
+        :return: list of TaskResultWrapper
+        """
         pass
     # cheating
     class TaskWrapper:
@@ -469,14 +916,37 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
         Wrapper for a task with execute hooks and TypError catching
         Stored in TaskRegistry, which is a dict in Tasker
         """
-        def __init__(self, name, f):  # 1.1 Adding args and kwargs for validate function calls. Backwards compatible
+        RETRY = 'retry'
+        RESUME = 'resume'
+        FAIL = 'fail'
+
+        def __init__(self, name, f, lane=None, cache_ttl=None, cache_version=None, coalesce=False, recovery=None,
+                     max_attempts=None, timeout=None, affinity=None):  # 1.1 Adding args and kwargs for validate function calls
             """
             Creates a task wrapper to store in TaskRegistry
             :param name:
             :param f:
+            :param lane: lane task is run in, Tasker.DEFAULT_LANE if None
+            :param cache_ttl: seconds results are memoized for, None to not memoize
+            :param cache_version: function of task arguments, returning version token of memoized results
+            :param coalesce: identical calls attach to the one in flight
+            :param recovery: RETRY, RESUME or FAIL (default) for the task interrupted by a crash
+            :param max_attempts: max number of runs of one task, None for no limit
+            :param timeout: seconds a task may take from submission, None for no limit
+            :param affinity: function of task arguments, returning key of the state a run leaves warm in it's worker
             """
             l.debug(f'{name} task wrapper created')
             self.name = name  # used for self logging
+            self.lane = lane or Tasker.DEFAULT_LANE
+            self.cache_ttl = cache_ttl
+            self.cache_version = cache_version
+            self.coalesce = coalesce
+            if recovery not in [None, self.RETRY, self.RESUME, self.FAIL]:
+                raise InvalidTaskArguments(f'Unknown recovery policy {recovery} for {name}')
+            self.recovery = recovery or self.FAIL
+            self.max_attempts = max_attempts
+            self.timeout = timeout
+            self.affinity = affinity
             if not isinstance(f, types.FunctionType):
                 raise NotAFunction(f'{f} is not a function')
             self.f = f
@@ -496,8 +966,8 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
                     )
                 )
 
-            self.pre_execute = lambda *args, **kwargs: None
-            self.post_execute = lambda *args, **kwargs: None
+            self.pre_execute = no_hook  # module-level, so wrappers stay picklable for process taskers
+            self.post_execute = no_hook
 
         def validate(self, args, kwargs):
             name = self.name
@@ -582,6 +1052,104 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
                 raise NotAFunction(f'{f} is not a function!')
             self.post_execute = f
 
+    class TaskContext:
+        """
+        Handle of a running task for the task itself: Tasker.TaskContext.current() inside task function.
+        Long tasks should call check() every now and then, so they stop soon after being cancelled or timed out,
+        and can plan by remaining time
+        """
+        __local = threading.local()
+
+        def __init__(self, task_id: str, state=None, saver=None, deadline=None):
+            """
+            :param task_id:
+            :param state: last checkpoint of the task, when it's resumed
+            :param saver: function storing a checkpoint
+            :param deadline: timestamp task has to be finished by, None if there is none
+            """
+            self.task_id = task_id
+            self.state = state
+            self.deadline = deadline
+            self.__outer = dict()  # thread id -> context current before this one was entered
+            self.__saver = saver
+            self.__cancelled = threading.Event()
+            self.__on_cancel = []
+            self.__on_cancel_lock = threading.Lock()  # hook removed by off_cancel is not running and won't run
+
+        @classmethod
+        def current(cls):
+            """
+            :return: TaskContext of the task running in this thread, None outside of a task
+            """
+            return getattr(cls.__local, 'context', None)
+
+        def __enter__(self):  # might be entered by the thread running task body as well, see ThreadTasker._execute
+            self.__outer[threading.get_ident()] = Tasker.TaskContext.current()
+            Tasker.TaskContext.__local.context = self
+            return self
+
+        def __exit__(self, exc_type, exc_val, exc_tb):
+            Tasker.TaskContext.__local.context = self.__outer.pop(threading.get_ident(), None)
+
+        @property
+        def cancelled(self) -> bool:
+            return self.__cancelled.is_set()
+
+        @property
+        def remaining(self):
+            """
+            :return: seconds left until deadline, None if there is no deadline
+            """
+            if self.deadline is None:
+                return None
+            return max(self.deadline - time.time(), 0)
+
+        @property
+        def expired(self) -> bool:
+            return self.deadline is not None and time.time() >= self.deadline
+
+        def on_cancel(self, f):
+            """
+            Registers a function to call on cancellation, e.g. to kill a process running the task
+            """
+            with self.__on_cancel_lock:
+                self.__on_cancel.append(f)
+                if self.cancelled:
+                    f()
+
+        def off_cancel(self, f):
+            """
+            Unregisters a function registered with on_cancel, e.g. once the process is handed to another task
+            """
+            with self.__on_cancel_lock:
+                if f in self.__on_cancel:
+                    self.__on_cancel.remove(f)
+
+        def cancel(self):
+            with self.__on_cancel_lock:
+                self.__cancelled.set()
+                for f in self.__on_cancel:
+                    f()
+
+        def checkpoint(self, state):
+            """
+            Stores progress of the task; Task registered with RESUME recovery gets it back as state after a crash
+            :param state: anything the storage can serialize
+            """
+            self.state = state
+            if self.__saver is not None:
+                self.__saver(state)
+
+        def check(self):
+            """
+            :raises TaskCancelled: if task was cancelled
+            :raises TaskTimeout: if task is past it's deadline
+            """
+            if self.cancelled:
+                raise TaskCancelled(f'Task {self.task_id} was cancelled')
+            if self.expired:
+                raise TaskTimeout(f'Task {self.task_id} is past it\'s deadline')
+
     class TaskResultWrapper:
         """
         Stores task results, including status, timestamps and initial args-kwargs;
@@ -591,6 +1159,14 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
         PROGRESS = 'progress'
         ERROR = 'error'
         DONE = 'done'
+        CANCELLED = 'cancelled'
+        TIMEOUT = 'timeout'
+        FINISHED = (DONE, ERROR, CANCELLED, TIMEOUT)
+
+        # a task is stored as a hash with a field per attribute, so status changes don't rewrite the payload
+        FIELDS = ('tid', 'name', 'st', 'created', 'updated', 'exception', 'res', 'args', 'kwargs', 'attempts', 'state',
+                  'deadline', 'started_at', 'finished_at')
+        STATUS_FIELDS = ('tid', 'name', 'st', 'created', 'updated', 'exception', 'started_at', 'finished_at')
 
         def __init__(self, task_id: str, task_name: str='', args=[], kwargs={}):
             """
@@ -608,14 +1184,20 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
             self.exception = False
             self.args = args
             self.kwargs = kwargs
+            self.attempts = 1  # number of times task was handed out to run
+            self.state = None  # last TaskContext.checkpoint
+            self.deadline = None  # timestamp task is timed out at
+            self.started_at = None  # timestamp task was last handed to a worker
+            self.finished_at = None
 
         def started(self):
             """
             Run to set status to "in progress"; Should only be used by tasker;
             :return:
             """
-            self.updated = time.time()
+            self.updated = self.started_at = time.time()
             self.st = Tasker.TaskResultWrapper.PROGRESS
+            return self.record('st', 'updated', 'started_at')
 
         def closed(self, result):
             """
@@ -623,9 +1205,10 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
             :param result: Result of function run
             :return:
             """
-            self.updated = time.time()
+            self.updated = self.finished_at = time.time()
             self.res = result
             self.st = Tasker.TaskResultWrapper.DONE
+            return self.record('st', 'updated', 'finished_at', 'res')
 
         def error(self, exception):
             """
@@ -633,10 +1216,55 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
             :param exception: Exception occured in running task
             :return:
             """
-            self.updated = time.time()
+            self.updated = self.finished_at = time.time()
             self.exception = True
             self.res = f'{exception.__class__}:({exception.__str__()})'
             self.st = Tasker.TaskResultWrapper.ERROR
+            return self.record('st', 'updated', 'finished_at', 'res', 'exception')
+
+        def timed_out(self, exception):
+            """
+            Set status to timeout, storing exception as error result; Should only be used by tasker
+            """
+            self.error(exception)
+            self.st = Tasker.TaskResultWrapper.TIMEOUT
+            return self.record('st', 'updated', 'finished_at', 'res', 'exception')
+
+        def cancelled(self):
+            """
+            Set status to cancelled; Should only be used by tasker
+            :return:
+            """
+            self.updated = self.finished_at = time.time()
+            self.st = Tasker.TaskResultWrapper.CANCELLED
+            return self.record('st', 'updated', 'finished_at')
+
+        def record(self, *fields) -> dict:
+            """
+            :param fields: fields to include, all of FIELDS if none given
+            :return: dict of field name to value, as it is stored
+            """
+            return {field: getattr(self, field) for field in (fields or Tasker.TaskResultWrapper.FIELDS)}
+
+        @classmethod
+        def from_record(cls, record: dict):
+            """
+            Restores a task from stored fields; Fields not present (e.g. result when only status was fetched) stay default
+            :param record: dict of field name to value
+            :return: TaskResultWrapper
+            """
+            trw = cls(record.get('tid'), task_name=record.get('name', ''))
+            for field in Tasker.TaskResultWrapper.FIELDS:
+                if field in record:
+                    setattr(trw, field, record[field])
+            return trw
+
+        @property
+        def finished(self):
+            """
+            :return: True if task is done, failed or cancelled
+            """
+            return self.st in Tasker.TaskResultWrapper.FINISHED
 
         @property
         def ident(self):
@@ -662,6 +1290,7 @@ class Tasker(BaseAbstract, metaclass=ABCMeta):
 
 # oh no, it's time to write a tasker; derp
 from . import tasker
+from .scheduler import Scheduler
 
 
 # API
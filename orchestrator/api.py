@@ -1,10 +1,10 @@
 # API
-from flask import request, Flask
+from flask import request, Flask, Response
 from flask.app import BadRequest
 from flask_restful import Resource, Api as rapi
-from . import ApiEnvironment, Api, ConfigLoader, Tasker, l, Conductor
+from . import ApiEnvironment, Api, ConfigLoader, Tasker, Scheduler, l, Conductor
 from .config import ApiConfig, TaskerConfig
-from .errors import TaskNotFound, InvalidTaskArguments
+from .errors import TaskNotFound, InvalidTaskArguments, InvalidSchedule, TaskerOverloaded
 from json import loads as json_loads
 from json.decoder import JSONDecodeError
 from time import time, sleep
@@ -19,8 +19,27 @@ def gen_response(message, error=False, object=None, timestamp=None, response=Non
     if response is not None:
         res['response'] = response
     return res
+
+
+def request_timeout():
+    """ Timeout header: seconds the task has to be done in, None if not given """
+    timeout = request.headers.get('Timeout')
+    if timeout is None:
+        return None
+    try:
+        return float(timeout)
+    except ValueError:
+        raise InvalidTaskArguments(f'Timeout header should be a number of seconds, got {timeout}')
+
+
+def overloaded(e: TaskerOverloaded):
+    """ 429 response to a rejected submission """
+    return gen_response(e.message, error=True), 429, {'Retry-After': str(e.retry_after)}
+
+
 class BaseResource(Resource):
     tasker = None
+    scheduler = None
     @classmethod
     def get_cls(cls, tasker):
         new_cls = cls
@@ -32,32 +51,50 @@ class FlaskApi(Api):
 
     class TaskControl(BaseResource):
         def get(self):
-            """ returns list of tasks in tasker """
-            tasks = BaseResource.tasker.list_tasks()
+            """ returns list of tasks in tasker; ?offset= and ?limit= page through it """
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', None, type=int)
+            tasks = BaseResource.tasker.list_tasks(offset=offset, limit=limit)
             ret_t = list()
             for task in tasks:
                 ret_t.append({
                     'id': task.tid,
                     'name': task.name,
-                    'progress': False if task.result[0] is not None or task.result[1] else True,
-                    'worked_for': task.status[1] - task.ident[1]
+                    'progress': not task.finished,
+                    'worked_for': task.status[1] - task.ident[1],
+                    'started': task.started_at,
+                    'finished': task.finished_at
                 })
             return ret_t
 
         def delete(self):
+            """ cancels task given by ?task_id= """
             task_id = request.args.get('task_id')
-            return BaseResource.tasker.kill_task(task_id)
+            if not task_id:
+                return gen_response('task_id is required', error=True), 400
+            try:
+                if BaseResource.tasker.kill_task(task_id):
+                    return gen_response(f'Task {task_id} cancelled', object=task_id, timestamp=time())
+                return gen_response(f'Task {task_id} is already finished', error=True, object=task_id)
+            except TaskNotFound as e:
+                return gen_response(e.message, error=True, object=task_id)
 
     class Task(BaseResource):
         def get(self, task, **kwargs):
             """
-            returns task result
+            returns task result; ?result=false returns status only, without fetching the result payload
+            ?wait=30 long-polls: responds once task is finished or after 30 seconds (capped by task_sync_timeout)
             :param task: task id
             :param kwargs: unused
             :return: gen_response dict, containing status, response (or error), and timestamp updated
             """
-            # request.args.get()
-            res = BaseResource.tasker.get_task_info(task)
+            result = request.args.get('result', 'true') != 'false'
+            wait = request.args.get('wait', 0, type=float)
+            if wait > 0:
+                wait = min(wait, BaseResource.tasker.config.get(TaskerConfig.TASK_SYNC_TIMEOUT))
+                res = BaseResource.tasker.wait_task(task, timeout=wait, result=result)
+            else:
+                res = BaseResource.tasker.get_task_info(task, result=result)
             if res is None:
                 return gen_response(f'Task {task} not found', error=True)
             message = f'Task is in {res.status[0]} status since {res.status[1]}'
@@ -78,7 +115,7 @@ class FlaskApi(Api):
 
         def post(self, task, **kwargs):
             """
-            Add a new task. Task kwargs are taken from input JSON payload
+            Add a new task. Task kwargs are taken from input JSON payload; Timeout header sets it's deadline in seconds
             :param task: Task name in TaskRegistry
             :param kwargs: unused
             :return: gen_response dict, containing status, response (if available right away), and timestamp created
@@ -92,7 +129,7 @@ class FlaskApi(Api):
                 l.debug(f'Validate is {validate}')
                 # task is task_name
                 in_data = dict() if int(request.headers.get('Content-Length', 0)) == 0 else request.get_json(force=True)
-                ret = BaseResource.tasker.run_task(task, kwargs=in_data, validate=validate)
+                ret = BaseResource.tasker.run_task(task, kwargs=in_data, validate=validate, timeout=request_timeout())
                 exc = ret.result[0] if not isinstance(ret.result[0], Exception) else ret.result[0].__repr__()
                 return gen_response(
                     'Task registered',
@@ -101,6 +138,8 @@ class FlaskApi(Api):
                     object=ret.ident[0],
                     timestamp=ret.status[1]
                 )
+            except TaskerOverloaded as e:
+                return overloaded(e)
             except Exception as e:  #catching anything to return as error
                 return gen_response(f'{e.__class__}: {e.__str__()}', error=True)
 
@@ -114,18 +153,123 @@ class FlaskApi(Api):
                 l.debug(f'Validate is {validate}')
                 # task is task_name
                 in_data = dict() if int(request.headers.get('Content-Length', 0)) == 0 else request.get_json(force=True)
-                ret = BaseResource.tasker.run_task(task, kwargs=in_data, validate=validate, blocking=True)
+                ret = BaseResource.tasker.run_task(task, kwargs=in_data, validate=validate, blocking=True,
+                                                   timeout=request_timeout())
                 exc = ret.result[0] if not isinstance(ret.result[0], Exception) else ret.result[0].__repr__()
                 return gen_response(
-                    'Task ran',
+                    'Task ran' if ret.finished else f'Task is still in {ret.status[0]} status, GET it later',
                     response=exc,
                     error=ret.result[1],
                     object=ret.ident[0],
                     timestamp=ret.status[1]
                 )
+            except TaskerOverloaded as e:
+                return overloaded(e)
+            except Exception as e:  #catching anything to return as error
+                return gen_response(f'{e.__class__}: {e.__str__()}', error=True)
+
+    class TaskBatch(BaseResource):
+        def post(self):
+            """
+            Add a batch of tasks. JSON payload is a list of {"task": task name, "kwargs": {...}} entries;
+            Nothing is run if any entry is invalid. Entry's "timeout" overrides Timeout header
+            :return: gen_response dict, object is a list of task ids in order of entries
+            """
+            try:
+                validate = request.headers.get('Validate')
+                if validate is None:
+                    validate = BaseResource.tasker.config.get(TaskerConfig.VALIDATE)
+                else:
+                    validate = True if validate == 'true' else False
+                in_data = request.get_json(force=True)
+                if not isinstance(in_data, list):
+                    raise InvalidTaskArguments('Batch payload should be a list of {"task": ..., "kwargs": ...}')
+                timeout = request_timeout()
+                calls = [{'task': entry.get('task'), 'kwargs': entry.get('kwargs') or dict(),
+                          'timeout': entry.get('timeout', timeout)} for entry in in_data]
+                ret = BaseResource.tasker.run_tasks(calls, validate=validate)
+                return gen_response(
+                    f'{ret.__len__()} tasks registered',
+                    object=[trw.tid for trw in ret],
+                    timestamp=time()
+                )
+            except TaskerOverloaded as e:
+                return overloaded(e)
             except Exception as e:  #catching anything to return as error
                 return gen_response(f'{e.__class__}: {e.__str__()}', error=True)
 
+    class Workflow(BaseResource):
+        def get(self, workflow=None):
+            """
+            returns workflow status with status and task id of every node
+            :param workflow: workflow task id
+            """
+            res = BaseResource.tasker.workflow_status(workflow) if workflow is not None else None
+            if res is None:
+                return gen_response(f'Workflow {workflow} not found', error=True, object=workflow)
+            return gen_response(f'Workflow is in {res["st"]} status since {res["updated"]}', response=res,
+                                error=res['st'] == Tasker.TaskResultWrapper.ERROR, object=workflow,
+                                timestamp=res['updated'])
+
+        def post(self, workflow=None):
+            """
+            Runs a workflow. JSON payload: {"nodes": {node name: {"task": task name, "kwargs": {...},
+            "after": [node, ...], "inputs": {kwarg: node}, "when": node}}}, see Tasker.run_workflow
+            :return: gen_response dict, object is workflow task id
+            """
+            try:
+                in_data = request.get_json(force=True)
+                if not isinstance(in_data, dict):
+                    raise InvalidTaskArguments('Workflow payload should be {"nodes": {...}}')
+                ret = BaseResource.tasker.run_workflow(in_data.get('nodes'), timeout=request_timeout())
+                return gen_response('Workflow registered', object=ret.tid, timestamp=ret.status[1])
+            except TaskerOverloaded as e:
+                return overloaded(e)
+            except Exception as e:  #catching anything to return as error
+                return gen_response(f'{e.__class__}: {e.__str__()}', error=True)
+
+    class ScheduleControl(BaseResource):
+        def get(self, name=None):
+            """
+            returns schedules with their last and next run times and ids of runs in progress
+            :param name: schedule name, all schedules if not given
+            """
+            schedules = BaseResource.scheduler.list_schedules()
+            if name is not None:
+                if name not in schedules:
+                    return gen_response(f'Schedule {name} not found', error=True, object=name)
+                schedules = {name: schedules[name]}
+            return {n: dict(schedule.record(), **BaseResource.scheduler.schedule_status(schedule))
+                    for n, schedule in schedules.items()}
+
+        def put(self, name=None):
+            """
+            Adds or replaces a schedule. JSON payload: {"task": task name, "kwargs": {...}, "cron": "0 3 * * *" or
+            "interval": seconds, "jitter": seconds, "misfire": "skip" or "once", "misfire_grace": seconds,
+            "max_concurrency": 1, "enabled": true}
+            :param name: schedule name
+            """
+            try:
+                in_data = request.get_json(force=True)
+                if name is None or not isinstance(in_data, dict):
+                    raise InvalidSchedule('PUT /schedules/<name> with a JSON object payload')
+                in_data = {k: v for k, v in in_data.items() if k != 'created'}
+                schedule = BaseResource.scheduler.add_schedule(name, **in_data)
+                return gen_response(f'Schedule {name} set', object=name, response=schedule.record(), timestamp=time())
+            except (InvalidSchedule, TypeError, BadRequest) as e:
+                return gen_response(f'{e.__class__}: {getattr(e, "message", e.__str__())}', error=True, object=name)
+
+        def delete(self, name=None):
+            """ deletes schedule; runs already fired are not cancelled """
+            if name is None or not BaseResource.scheduler.delete_schedule(name):
+                return gen_response(f'Schedule {name} not found', error=True, object=name)
+            return gen_response(f'Schedule {name} deleted', object=name, timestamp=time())
+
+    class Metrics(BaseResource):
+        def get(self):
+            """ task lifecycle metrics of this node in Prometheus text format, for scraping """
+            return Response(BaseResource.tasker.get_metrics(), mimetype='text/plain; version=0.0.4')
+
     class Service(BaseResource):
         def delete(self):
             """
@@ -148,9 +292,10 @@ class FlaskApi(Api):
             api_status contains "alive" when alive.
             """
             pub = BaseResource.tasker.config.list_public
+            val = BaseResource.tasker.config.list_config
             configurable = {q: {
                 "desc": pub[q],
-                "val": BaseResource.tasker.config.get_public(q)
+                "val": val.get(q)
             } for q in pub}
             return dict(
                 tasker_status=BaseResource.tasker.get_self_status(),
@@ -182,17 +327,26 @@ class FlaskApi(Api):
     def __init__(self, **kwargs):
         l.info(f'Initializing {self.name} WEB API')
 
-        self.config = kwargs.pop('configurator', ApiEnvironment.WEB_FLASK.conf.get('configurator', ConfigLoader(ApiConfig)))
-        self.tasker = kwargs.pop('tasker', ApiEnvironment.WEB_FLASK.conf.get('tasker', Tasker()))
+        self.config = kwargs.pop('configurator', None) or ApiEnvironment.WEB_FLASK.conf.get('configurator') or \
+            ConfigLoader(ApiConfig)
+        self.tasker = kwargs.pop('tasker', None) or ApiEnvironment.WEB_FLASK.conf.get('tasker') or Tasker()
         BaseResource.tasker = self.tasker
+        # schedules can be edited on any node, they only fire on nodes with a started scheduler
+        self.scheduler = kwargs.pop('scheduler', None) or ApiEnvironment.WEB_FLASK.conf.get('scheduler') or \
+            Scheduler(tasker=self.tasker)
+        BaseResource.scheduler = self.scheduler
 
         self.app = Flask(Conductor.ORCHESTRATION)
         self.api = rapi(self.app)
         
         self.add_resource(FlaskApi.Service, ['/service'], strict_slashes=False)
+        self.add_resource(FlaskApi.Metrics, ['/metrics'], strict_slashes=False)
         self.add_resource(FlaskApi.Task, ['/tasks/<string:task>', '/tasks'], strict_slashes=False)  # ?sync blocks
+        self.add_resource(FlaskApi.TaskBatch, ['/tasks:batch'], strict_slashes=False)
+        self.add_resource(FlaskApi.Workflow, ['/workflows/<string:workflow>', '/workflows'], strict_slashes=False)
 
         self.add_resource(FlaskApi.TaskControl, ['/control/'], strict_slashes=False)
+        self.add_resource(FlaskApi.ScheduleControl, ['/schedules/<string:name>', '/schedules'], strict_slashes=False)
 
         l.info(f'Web API initialized')
 
@@ -206,6 +360,7 @@ class FlaskApi(Api):
     def graceful_shutdown(self):
         l.info('Shutting down API')
         self.config.graceful_shutdown()
+        self.scheduler.graceful_shutdown()
         self.tasker.graceful_shutdown()
         l.info('Goodbye...')
 
@@ -0,0 +1,79 @@
+"""
+Serializer micro-benchmark: python -m orchestrator.benchmarks [repeat]
+Compares typed connector encodings on task records and prediction sized payloads, so
+StorageEnvironment.REDIS.conf['serializer'] and ['compression'] can be picked from data
+"""
+import sys
+import time
+from uuid import uuid4
+
+from . import Tasker
+from .errors import SerializerNotAvailable
+from .serializers import Serializer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CONFIGURATIONS = [
+    ('pickle', dict()),
+    ('pickle protocol 5', dict(protocol=5)),
+    ('pickle5 out-of-band', dict(serializer='pickle5')),
+    ('msgpack', dict(serializer='msgpack')),
+    ('pickle + zlib', dict(compression='zlib')),
+    ('pickle5 + zlib', dict(serializer='pickle5', compression='zlib')),
+    ('pickle5 + lz4', dict(serializer='pickle5', compression='lz4')),
+]
+
+
+def prediction(rows=250000):
+    """ 2MB float64 prediction, NumPy array if it is available """
+    if numpy is not None:
+        return numpy.random.random_sample(rows)
+    import array, random
+    return array.array('d', (random.random() for _ in range(rows)))
+
+
+def payloads():
+    trw = Tasker.TaskResultWrapper(uuid4().__str__(), task_name='predict', kwargs={'model_name': 'TestModel1'})
+    status = trw.started()
+    done = Tasker.TaskResultWrapper(uuid4().__str__(), task_name='fit', kwargs={'model_name': 'TestModel1'})
+    done.closed({'accuracy': 0.93, 'fitted': True, 'rows': 150000})
+    return [
+        ('status change fields', status),
+        ('task record', done.record()),
+        ('prediction result', prediction()),
+        ('prediction task record', dict(done.record(), res=prediction())),
+    ]
+
+
+def measure(serializer, value, repeat):
+    dumped = serializer.dumps(value)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        dumped = serializer.dumps(value)
+    dump_time = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        serializer.loads(dumped)
+    load_time = (time.perf_counter() - start) / repeat
+    return dumped.__len__(), dump_time, load_time
+
+
+def run(repeat=20):
+    header = f'{"payload":<24}{"serializer":<22}{"bytes":>12}{"dumps, ms":>12}{"loads, ms":>12}'
+    print(header)
+    print('-' * header.__len__())
+    for payload_name, value in payloads():
+        for name, conf in CONFIGURATIONS:
+            try:
+                serializer = Serializer(**conf)
+            except SerializerNotAvailable:
+                continue  # optional package is not installed
+            size, dump_time, load_time = measure(serializer, value, repeat)
+            print(f'{payload_name:<24}{name:<22}{size:>12}{dump_time * 1000:>12.3f}{load_time * 1000:>12.3f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if sys.argv.__len__() > 1 else 20)
@@ -34,6 +34,61 @@ class TaskerConfig(BaseConfig):
         'description': 'number of workers to run'
     }
 
+    WORKER_MAX_TASKS = {
+        'namespace': 'orchestrator.tasker.worker_max_tasks',
+        'default': 0,
+        'public': True,
+        'description': 'Process workers are replaced after running this many tasks, to cap memory growth; 0 is never'
+    }
+
+    WORKER_AFFINITY_KEYS = {
+        'namespace': 'orchestrator.tasker.worker_affinity_keys',
+        'default': 4,
+        'public': True,
+        'description': 'Affinity keys (e.g. models) remembered as warm per process worker, most recent first'
+    }
+
+    WORKFLOW_NUM = {
+        'namespace': 'orchestrator.tasker.workflows',
+        'default': 4,
+        'public': True,
+        'description': 'Workflows driven at once; Each waits for it\'s nodes in a thread of workflow lane'
+    }
+
+    MAX_QUEUE_DEPTH = {
+        'namespace': 'orchestrator.tasker.max_queue_depth',
+        'default': 0,
+        'public': True,
+        'description': 'Tasks waiting for a worker in a lane, over which new ones are not admitted; 0 is unbounded'
+    }
+    LANE_QUEUE_DEPTH = {
+        'namespace': 'orchestrator.tasker.lane_queue_depth',
+        'default': {},
+        'public': True,
+        'description': 'lane name -> max queue depth of the lane, overrides max_queue_depth'
+    }
+    TASK_QUEUE_DEPTH = {
+        'namespace': 'orchestrator.tasker.task_queue_depth',
+        'default': {},
+        'public': True,
+        'description': 'task name -> max waiting tasks of it; Counted per node, the queue tasker rejects tasks '
+                       'that have one, it only bounds lanes'
+    }
+    MAX_ABANDONED = {
+        'namespace': 'orchestrator.tasker.max_abandoned',
+        'default': 16,
+        'public': True,
+        'description': 'Threads of timed out tasks still running in a lane, over which it takes no new tasks; '
+                       '0 is unbounded'
+    }
+    OVERLOAD = {
+        'namespace': 'orchestrator.tasker.overload',
+        'default': 'reject',
+        'public': True,
+        'description': 'Over max queue depth: reject new tasks (HTTP 429 with Retry-After estimated from recent '
+                       'run times), or shed - cancel the oldest waiting ones to make room'
+    }
+
     TASK_EX = {
         'namespace': 'orchestrator.tasker.task_lifetime',
         'default': 86400,
@@ -54,11 +109,61 @@ class TaskerConfig(BaseConfig):
         'public': False,
         'description': 'connector key to store task result objects'
     }
-    TASK_SYNC_REFRESH_RATE = {  # fixme : this should really be a blocking call instead of this bollocks
+    TASK_INDEX = {
+        'namespace': 'orchestrator.tasker.task_index',
+        'default': 'tasker.index',
+        'public': False,
+        'description': 'connector key of task ids index, ordered by creation time'
+    }
+    TASK_CACHE = {
+        'namespace': 'orchestrator.tasker.task_cache',
+        'default': 'tasker.cache',
+        'public': False,
+        'description': 'connector key memoized task results are stored under'
+    }
+    TASK_INFLIGHT = {
+        'namespace': 'orchestrator.tasker.task_inflight',
+        'default': 'tasker.inflight',
+        'public': False,
+        'description': 'connector key ids of running coalesced tasks are stored under'
+    }
+    TASK_CHANNEL = {
+        'namespace': 'orchestrator.tasker.task_channel',
+        'default': 'tasker.done',
+        'public': False,
+        'description': 'connector channel ids of finished tasks are published to'
+    }
+    TASK_QUEUE = {
+        'namespace': 'orchestrator.tasker.task_queue',
+        'default': 'tasker.queue',
+        'public': False,
+        'description': 'connector key of shared task queue; Processing lists and node heartbeats are stored under it'
+    }
+    QUEUE_HEARTBEAT_EX = {
+        'namespace': 'orchestrator.tasker.queue_heartbeat',
+        'default': 30,
+        'public': True,
+        'description': 'Seconds without heartbeat after which queue node is considered dead and its tasks are requeued'
+    }
+    DURABILITY = {
+        'namespace': 'orchestrator.tasker.durability',
+        'default': 'sync',
+        'public': True,
+        'description': 'When task records are written to storage: sync on every change, batched every flush interval, '
+                       'or on completion only; Tasks in flight are served from memory by thread and process taskers'
+    }
+    FLUSH_INTERVAL = {
+        'namespace': 'orchestrator.tasker.flush_interval',
+        'default': 0.5,
+        'public': True,
+        'description': 'Seconds between writes of task changes with batched durability'
+    }
+    TASK_SYNC_REFRESH_RATE = {
         'namespace': 'orchestrator.tasker.task_sync_refresh',
         'default': 5,
         'public': True,
-        'description': 'Determines how often a syncrhous request checks task status'
+        'description': 'Waiting for a task is woken by completion notification; '
+                       'Status is also rechecked this often in case a notification is lost'
     }
 
     TASK_SYNC_TIMEOUT = {
@@ -75,3 +180,29 @@ class TaskerConfig(BaseConfig):
     }
 
 
+class SchedulerConfig(BaseConfig):
+    SCHEDULES = {
+        'namespace': 'orchestrator.scheduler.schedules',
+        'default': {},
+        'public': False,
+        'description': 'schedule name -> Schedule record; Edited through Scheduler or /schedules API'
+    }
+    SCHEDULER_PATH = {
+        'namespace': 'orchestrator.scheduler.key',
+        'default': 'scheduler',
+        'public': False,
+        'description': 'connector key last fired slots, fire locks and running task ids of schedules are stored under'
+    }
+    SCHEDULER_TICK = {
+        'namespace': 'orchestrator.scheduler.tick',
+        'default': 1,
+        'public': True,
+        'description': 'Seconds between checks for due schedules'
+    }
+    MISFIRE_GRACE = {
+        'namespace': 'orchestrator.scheduler.misfire_grace',
+        'default': 60,
+        'public': True,
+        'description': 'Seconds a schedule may fire late, e.g. after downtime; Later runs are skipped, unless '
+                       'schedule\'s misfire policy is once'
+    }
@@ -1,10 +1,13 @@
 from .errors import NotAValidConfig, NotPermitted
 from enum import Enum
-from . import ConfigLoader, Connector, ConfigEnvironment, l
+import threading
+from . import ConfigLoader, Connector, IndexConnector, PubSubConnector, ConfigEnvironment, l
 
 # lol kek constants
 config_path = 'config'
 config_public = 'public'
+config_public_index = 'public_index'  # set of public config names, so listing does not walk the keyspace
+config_channel = 'config.invalidate'  # changed keys are published here so every loader drops it's cached copy
 
 
 def config_key(cfg):
@@ -52,10 +55,20 @@ class RedisConfigurator(ConfigLoader):
     name = ConfigEnvironment.PERSISTENT.cls
 
     def __init__(self, initial: BaseConfig = None, **kwargs):
-        connector = kwargs.pop('connector', ConfigEnvironment.PERSISTENT.conf.get('connector', Connector()))
+        connector = kwargs.pop('connector', None) or ConfigEnvironment.PERSISTENT.conf.get('connector')
         if connector is None:
-            connector = Connector()  # initiate default package-wide connection if none given fixme: remove redundant
+            connector = Connector()  # initiate default package-wide connection if none given
         self.__conn = connector
+        self.__indexed = False
+        self.__cache = dict()
+        self.__generation = 0  # bumped on every invalidation, so a read racing with one is not cached
+        self.__cache_lock = threading.Lock()  # invalidations come from the subscription's thread
+        cache = kwargs.pop('cache', ConfigEnvironment.PERSISTENT.conf.get('cache', True))
+        # changes made by other processes are only heard of with pub/sub, config is not cached without it
+        self.__notifying = isinstance(self.__conn, PubSubConnector)
+        self.__indexing = isinstance(self.__conn, IndexConnector)
+        self.__subscription = self.__conn.subscribe(config_channel, self.__invalidate) \
+            if cache and self.__notifying else None
         if initial is not None:
             self.init_config(initial)
 
@@ -73,7 +86,7 @@ class RedisConfigurator(ConfigLoader):
             self.__init_config(cfg)
 
     def __check(self, cfg: BaseConfig):
-        return False if self.__conn.keys(config_key(cfg.namespace)).__len__() == 0 else True
+        return self.__conn.exists(config_key(cfg.namespace))
 
     def __init_config(self, cfg):
         if not self.__check(cfg):
@@ -81,18 +94,55 @@ class RedisConfigurator(ConfigLoader):
             if cfg.public:
                 self.make_public(cfg)
 
+    def __invalidate(self, key):
+        with self.__cache_lock:
+            self.__generation += 1
+            if key is None:
+                self.__cache.clear()
+            else:
+                self.__cache.pop(key, None)
+
+    def __cached(self):
+        # while subscription is down invalidations can be missed, so cache is bypassed
+        return self.__subscription is not None and self.__subscription.active
+
+    def __read(self, key, read):
+        if not self.__cached():
+            return read(key)
+        try:
+            return self.__cache[key]
+        except KeyError:
+            pass
+        generation = self.__generation
+        value = read(key)
+        if value is not None:
+            with self.__cache_lock:
+                if generation == self.__generation:
+                    self.__cache[key] = value
+        return value
+
+    def __changed(self, *keys):
+        for key in keys:
+            self.__invalidate(key)
+            if self.__notifying:
+                self.__conn.publish(config_channel, key)
+
     def __get(self, key):
-        return self.__conn.get(key)
+        return self.__read(key, self.__conn.get)
 
     def __set(self, key, value):
-        return self.__conn.set(key, value)
+        res = self.__conn.set(key, value)
+        self.__changed(key)
+        return res
 
     def get(self, cfg: BaseConfig):
         if not RedisConfigurator.valid(cfg):
             raise NotAValidConfig(f'{cfg} is not a BaseConfig subclass')
-        if not self.__check(cfg):
+        value = self.__get(config_key(cfg.namespace))
+        if value is None and not self.__check(cfg):
             self.__init_config(cfg)
-        return self.__get(config_key(cfg.namespace))
+            value = self.__get(config_key(cfg.namespace))
+        return value
 
     def set(self, cfg: BaseConfig, value=None):
         if not RedisConfigurator.valid(cfg):
@@ -109,47 +159,68 @@ class RedisConfigurator(ConfigLoader):
     def make_public(self, cfg: BaseConfig):
         if not RedisConfigurator.valid(cfg):
             raise NotAValidConfig('Unable to make config public')
-        return self.__set(config_publicity_key(cfg.namespace), cfg.description)  # TODO: types
+        res = self.__set(config_publicity_key(cfg.namespace), cfg.description)  # TODO: types
+        if self.__indexing:
+            self.__conn.sadd(config_public_index, cfg.namespace)
+        self.__changed(config_public_index)
+        return res
 
     def unmake_public(self, cfg: BaseConfig):
         if not RedisConfigurator.valid(cfg):
             raise NotAValidConfig(f'Cant unset public status: {cfg} is not a public config')
-        if self.__conn.delete(config_publicity_key(cfg.namespace))>0:
+        if self.__indexing:
+            self.__conn.srem(config_public_index, cfg.namespace)
+        deleted = self.__conn.delete(config_publicity_key(cfg.namespace))
+        self.__changed(config_public_index, config_publicity_key(cfg.namespace))
+        if deleted > 0:
             l.info(f'{cfg} is no longer public')
             return True
         else:
             l.warning(f'{cfg} not unset as public since it wasnt in the first place')
             return False  # TODO make self DELETE method
 
+    def __index_public(self, index):
+        if not self.__indexing:
+            return {config_strip(key) for key in self.__conn.scan_iter(config_publicity_key('*'))}
+        names = self.__conn.smembers(index)
+        if not names and not self.__indexed:
+            # publicity set before the index existed: walk with a cursor once and rebuild
+            names = {config_strip(key) for key in self.__conn.scan_iter(config_publicity_key('*'))}
+            if names:
+                self.__conn.sadd(index, *names)
+        self.__indexed = True
+        return names
+
+    def __public_names(self):
+        return self.__read(config_public_index, self.__index_public)
+
     @property
     def list_public(self):
-        res = dict()
-        keys = self.__conn.keys(config_publicity_key('*'))
-        for key in keys:
-            res[config_strip(key)] = self.__get(key)  # return descriptions
-        return res
+        names = list(self.__public_names())
+        # return descriptions
+        return dict(zip(names, self.__conn.mget([config_publicity_key(name) for name in names])))
 
     @property
     def list_config(self) -> dict:
-        return {q: self.get_public(q) for q in self.list_public}
+        names = list(self.__public_names())
+        return dict(zip(names, self.__conn.mget([config_key(name) for name in names])))
 
     def set_public(self, key, value):
-        if key not in self.list_public:
+        if not self.check_public(key):
             raise NotPermitted(f'Failed to set {key}: not public')
-        return self.__conn.set(config_key(key), value)
+        return self.__set(config_key(key), value)
 
     def get_public(self, key):
-        if key not in self.list_public:
+        if not self.check_public(key):
             raise NotPermitted('{key} is not in public config list')
-        return self.__conn.get(config_key(key))
+        return self.__get(config_key(key))
 
     def check_public(self, key):
-        if key not in self.list_public:
-            return False
-        else:
-            return True
+        return key in self.__public_names()
 
     def graceful_shutdown(self):
+        if self.__subscription is not None:
+            self.__subscription.stop()
         self.__conn.graceful_shutdown()
 
 
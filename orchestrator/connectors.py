@@ -1,13 +1,90 @@
-from redis import StrictRedis
-from redis.exceptions import ConnectionError
-import pickle
-from . import Connector, StorageEnvironment, l
+from redis import StrictRedis, ConnectionPool, BlockingConnectionPool
+from redis.connection import UnixDomainSocketConnection, SSLConnection
+from redis.exceptions import ConnectionError, TimeoutError
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, deque
+from fnmatch import fnmatchcase
+from itertools import islice
+import heapq
+import threading
+import time
+from . import Connector, IndexConnector, QueueConnector, PubSubConnector, LockConnector, StorageEnvironment, l
 from .errors import ConnectorInitFail
+from .serializers import Serializer
 
 # CONNECTORS ARE NOT LOGGED BECAUSE FUCK YOU
 
-class RedisConnector(StrictRedis, Connector):
+_now = time.time
+
+
+class RedisPoolRegistry:
+    """
+    Process-wide redis connection pools, keyed by connection parameters;
+    Every RedisConnector with the same parameters shares one pool, so max_connections bounds the whole process.
+    A bounded pool blocks for up to pool_timeout seconds waiting for a free connection instead of failing.
+    Bounds are not part of the key: the pool keeps ones it was created with, a connector asking for others is warned
+    """
+    __pools = dict()  # key -> [pool, number of connectors using it, (max_connections, pool_timeout)]
+    __lock = threading.Lock()
+
+    @staticmethod
+    def key(connection_kwargs):
+        return repr(sorted(connection_kwargs.items(), key=lambda item: item[0]))
+
+    @classmethod
+    def acquire(cls, max_connections=None, pool_timeout=20, **connection_kwargs):
+        key = cls.key(connection_kwargs)
+        with cls.__lock:
+            entry = cls.__pools.get(key)
+            if entry is None:
+                if max_connections is None:
+                    pool = ConnectionPool(**connection_kwargs)
+                else:
+                    pool = BlockingConnectionPool(max_connections=max_connections, timeout=pool_timeout,
+                                                  **connection_kwargs)
+                entry = [pool, 0, (max_connections, pool_timeout)]
+                cls.__pools[key] = entry
+            elif entry[2] != (max_connections, pool_timeout):
+                l.warning(f'Shared redis pool has max_connections={entry[2][0]}, pool_timeout={entry[2][1]}; '
+                          f'max_connections={max_connections}, pool_timeout={pool_timeout} asked for are ignored')
+            entry[1] += 1
+            return entry[0]
+
+    @classmethod
+    def release(cls, pool):
+        """ Pool is disconnected once the last connector using it is shut down """
+        with cls.__lock:
+            for key, entry in list(cls.__pools.items()):
+                if entry[0] is pool:
+                    entry[1] -= 1
+                    if entry[1] > 0:
+                        return False
+                    del cls.__pools[key]
+                    break
+        pool.disconnect()
+        return True
+
+    @classmethod
+    def status(cls, pool) -> dict:
+        if isinstance(pool, BlockingConnectionPool):
+            created = pool._connections.__len__()
+            available = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        else:
+            created = pool._created_connections
+            available = pool._available_connections.__len__()
+        with cls.__lock:
+            users = next((entry[1] for entry in cls.__pools.values() if entry[0] is pool), 1)
+        return {
+            'max_connections': None if pool.max_connections >= 2 ** 31 else pool.max_connections,
+            'created': created,
+            'in_use': created - available,
+            'available': available,
+            'connectors': users
+        }
+
+class RedisConnector(StrictRedis, Connector, IndexConnector, QueueConnector, PubSubConnector, LockConnector):
     name = StorageEnvironment.REDIS.cls
+    DELETE_IF_EQUAL = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
 
     def __init__(self, **kwargs):
         self.typed = kwargs.pop('typed', StorageEnvironment.REDIS.conf.get('typed', True))
@@ -33,44 +110,100 @@ class RedisConnector(StrictRedis, Connector):
         ssl_cert_reqs = kwargs.pop('ssl_cert_reqs', StorageEnvironment.REDIS.conf.get('ssl_cert_reqs', None))
         ssl_ca_certs = kwargs.pop('ssl_ca_certs', StorageEnvironment.REDIS.conf.get('ssl_ca_certs', None))
         max_connections = kwargs.pop('max_connections', StorageEnvironment.REDIS.conf.get('max_connections', None))
+        pool_timeout = kwargs.pop('pool_timeout', StorageEnvironment.REDIS.conf.get('pool_timeout', 20))
+        self.serializer = Serializer(
+            serializer=kwargs.pop('serializer', StorageEnvironment.REDIS.conf.get('serializer', 'pickle')),
+            protocol=kwargs.pop('pickle_protocol', StorageEnvironment.REDIS.conf.get('pickle_protocol', None)),
+            compression=kwargs.pop('compression', StorageEnvironment.REDIS.conf.get('compression', None)),
+            compress_threshold=kwargs.pop('compress_threshold',
+                                          StorageEnvironment.REDIS.conf.get('compress_threshold', 65536)),
+            compress_level=kwargs.pop('compress_level', StorageEnvironment.REDIS.conf.get('compress_level', None))
+        )
 
         encoding = 'utf-8'
         if self.typed:
             decode_responses = False
         else:
             decode_responses = True
+        self.__shared_pool = connection_pool is None
+        self.__shutdown = False
+        self.__delete_if_equal = None  # script, registered on first use
+        if self.__shared_pool:
+            # same arguments StrictRedis would build it's own pool with
+            pool_kwargs = dict(db=db, password=password, socket_timeout=socket_timeout,
+                               encoding=charset or encoding, encoding_errors=errors or encoding_errors,
+                               decode_responses=decode_responses, retry_on_timeout=retry_on_timeout)
+            if unix_socket_path is not None:
+                pool_kwargs.update(path=unix_socket_path, connection_class=UnixDomainSocketConnection)
+            else:
+                pool_kwargs.update(host=host, port=port, socket_connect_timeout=socket_connect_timeout,
+                                   socket_keepalive=socket_keepalive, socket_keepalive_options=socket_keepalive_options)
+                if ssl:
+                    pool_kwargs.update(connection_class=SSLConnection, ssl_keyfile=ssl_keyfile,
+                                       ssl_certfile=ssl_certfile, ssl_cert_reqs=ssl_cert_reqs,
+                                       ssl_ca_certs=ssl_ca_certs)
+            connection_pool = RedisPoolRegistry.acquire(max_connections=max_connections, pool_timeout=pool_timeout,
+                                                        **pool_kwargs)
         try:
             l.debug(f'Starting connector to {host}:{port}({db})')
-            super(RedisConnector, self).__init__(host=host, port=port, db=db, password=password,
-                                                 socket_timeout=socket_timeout,
-                                                 socket_connect_timeout=socket_connect_timeout,
-                                                 socket_keepalive=socket_keepalive,
-                                                 socket_keepalive_options=socket_keepalive_options,
-                                                 connection_pool=connection_pool, unix_socket_path=unix_socket_path,
-                                                 encoding=encoding,
-                                                 encoding_errors=encoding_errors, charset=charset, errors=errors,
-                                                 decode_responses=decode_responses,
-                                                 retry_on_timeout=retry_on_timeout, ssl=ssl, ssl_keyfile=ssl_keyfile,
-                                                 ssl_certfile=ssl_certfile,
-                                                 ssl_cert_reqs=ssl_cert_reqs, ssl_ca_certs=ssl_ca_certs,
-                                                 max_connections=max_connections)
+            super(RedisConnector, self).__init__(connection_pool=connection_pool)
         except ConnectionError:
             raise ConnectorInitFail(f'Failed to connect to redis at {host}:{port}')
 
-    def set(self, key, val, ex=None, px=None, nx=False, xx=False):
+    def _dumps(self, val):
         if self.typed:
-            val = pickle.dumps(val)
-        return super(RedisConnector, self).set(key, val, ex=ex, px=px, nx=nx, xx=xx)
+            return self.serializer.dumps(val)
+        return val
 
-    def get(self, key):
-        res = super(RedisConnector, self).get(key)
+    def _loads(self, res):
         if res is None or res == '' or not self.typed:
             return res
         else:
-            return pickle.loads(res)
+            return self.serializer.loads(res)
+
+    def set(self, key, val, ex=None, px=None, nx=False, xx=False):
+        return super(RedisConnector, self).set(key, self._dumps(val), ex=ex, px=px, nx=nx, xx=xx)
+
+    def get(self, key):
+        return self._loads(super(RedisConnector, self).get(key))
+
+    def mget(self, keys):
+        if not keys:
+            return []
+        return [self._loads(res) for res in super(RedisConnector, self).mget(keys)]
+
+    def mset(self, mapping, ex=None):
+        if not mapping:
+            return True
+        if ex is None:
+            return super(RedisConnector, self).mset({k: self._dumps(v) for k, v in mapping.items()})
+        # MSET has no expiry, so it's SET EX for each key in one round trip
+        pipe = self.pipeline(transaction=False)
+        for key, val in mapping.items():
+            pipe.set(key, val, ex=ex)
+        return all(pipe.execute())
+
+    def delete_if_equal(self, key, value):
+        if self.__delete_if_equal is None:
+            self.__delete_if_equal = self.register_script(self.DELETE_IF_EQUAL)
+        return bool(self.__delete_if_equal(keys=[key], args=[self._dumps(value)]))
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return RedisPipeline(self, super(RedisConnector, self).pipeline(transaction=transaction, shard_hint=shard_hint))
 
     def graceful_shutdown(self):
-        return self.connection_pool.disconnect()
+        if not self.__shared_pool:
+            return self.connection_pool.disconnect()
+        if self.__shutdown:
+            return False
+        self.__shutdown = True
+        return RedisPoolRegistry.release(self.connection_pool)
+
+    def pool_status(self):
+        return RedisPoolRegistry.status(self.connection_pool)
+
+    def subscribe(self, channel, handler):
+        return RedisChannelListener.subscribe(self, channel, handler)
 
     def keys(self, pattern='*'):
         keys = super(RedisConnector, self).keys(pattern)
@@ -78,7 +211,758 @@ class RedisConnector(StrictRedis, Connector):
             keys = [key.decode('utf-8') for key in keys]
         return keys
 
-    # TODO: hmset, hmget, etc
+    def _decode(self, member):
+        if self.typed and isinstance(member, bytes):
+            return member.decode('utf-8')
+        return member
+
+    def scan_iter(self, match='*', count=None):
+        for key in super(RedisConnector, self).scan_iter(match=match, count=count):
+            yield self._decode(key)
+
+    def exists(self, key):
+        return bool(super(RedisConnector, self).exists(key))
+
+    # index members are plain identifiers and are never pickled
+    def smembers(self, key):
+        return {self._decode(m) for m in super(RedisConnector, self).smembers(key)}
+
+    def zadd(self, key, mapping):
+        args = []
+        for member, score in mapping.items():
+            args.extend((score, member))
+        return super(RedisConnector, self).zadd(key, *args)
+
+    def zrange(self, key, start=0, end=-1, desc=False):
+        return [self._decode(m) for m in super(RedisConnector, self).zrange(key, start, end, desc=desc)]
+
+    # queue members are plain identifiers as well
+    def rpoplpush(self, src, dst):
+        return self._decode(super(RedisConnector, self).rpoplpush(src, dst))
+
+    def brpoplpush(self, src, dst, timeout=0):
+        return self._decode(super(RedisConnector, self).brpoplpush(src, dst, timeout=timeout))
+
+    def lrange(self, key, start=0, end=-1):
+        return [self._decode(m) for m in super(RedisConnector, self).lrange(key, start, end)]
+
+    # hash field values are typed the same way as plain values
+    def hset(self, key, mapping):
+        return super(RedisConnector, self).hmset(key, {f: self._dumps(v) for f, v in mapping.items()})
+
+    def hmget(self, key, fields):
+        return [self._loads(res) for res in super(RedisConnector, self).hmget(key, fields)]
+
+    def _loads_hash(self, res):
+        return {self._decode(f): self._loads(v) for f, v in res.items()}
+
+    def hgetall(self, key):
+        return self._loads_hash(super(RedisConnector, self).hgetall(key))
+
+
+class RedisSubscription:
+    """
+    Subscription of a handler to a channel; Messages come from the channel's RedisChannelListener
+    """
+    def __init__(self, listener, handler):
+        self.channel = listener.channel
+        self.handler = handler
+        self.__listener = listener
+
+    @property
+    def active(self):
+        return self.__listener.active
+
+    def stop(self):
+        self.__listener.remove(self)
+
+
+class RedisChannelListener:
+    """
+    Listens to a channel on a daemon thread for every subscription to it through the same connection pool,
+    so they hold one connection and one thread between them; Resubscribes after connection failures.
+    Stops with it's last subscription
+    """
+    __listeners = dict()  # (id of connection pool, channel) -> RedisChannelListener
+    __listeners_lock = threading.Lock()
+
+    @classmethod
+    def subscribe(cls, connector: RedisConnector, channel, handler, retry_interval=1) -> RedisSubscription:
+        key = (id(connector.connection_pool), channel)  # listener holds the pool, so id is not reused meanwhile
+        with cls.__listeners_lock:
+            listener = cls.__listeners.get(key)
+            if listener is None:
+                listener = cls.__listeners[key] = cls(key, connector, channel, retry_interval)
+            subscription = RedisSubscription(listener, handler)
+            listener.subscriptions.append(subscription)
+        return subscription
+
+    def __init__(self, key, connector: RedisConnector, channel, retry_interval=1):
+        self.channel = channel
+        self.subscriptions = []
+        self.active = False
+        self.__key = key
+        self.__conn = connector
+        self.__retry_interval = retry_interval
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__listen, name=f'subscription-{channel}', daemon=True)
+        self.__thread.start()
+
+    def remove(self, subscription: RedisSubscription):
+        with RedisChannelListener.__listeners_lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+            if not self.subscriptions and RedisChannelListener.__listeners.get(self.__key) is self:
+                del RedisChannelListener.__listeners[self.__key]
+                self.__running = False
+
+    def __handle(self, message):
+        for subscription in list(self.subscriptions):
+            try:
+                subscription.handler(message)
+            except Exception as e:
+                l.error(f'Subscription handler for {self.channel} failed: {e}')
+
+    def __listen(self):
+        while self.__running:
+            pubsub = self.__conn.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                self.__handle(None)  # anything published while not subscribed is lost
+                self.active = True
+                while self.__running:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message['type'] == 'message':
+                        self.__handle(self.__conn._decode(message['data']))
+            except (ConnectionError, TimeoutError) as e:
+                l.warning(f'Subscription to {self.channel} lost: {e}')
+                time.sleep(self.__retry_interval)
+            finally:
+                self.active = False
+                pubsub.close()
+
+
+class RedisPipeline:
+    """
+    Typed wrapper around redis pipeline: values are (de)serialized the same way RedisConnector does it
+    """
+    def __init__(self, connector: RedisConnector, pipe):
+        self.__conn = connector
+        self.__pipe = pipe
+        self.__decoders = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.reset()
+
+    def __queue(self, decoder, command, *args, **kwargs):
+        getattr(self.__pipe, command)(*args, **kwargs)
+        self.__decoders.append(decoder)
+        return self
+
+    def __members(self, res):
+        return {self.__conn._decode(m) for m in res}
+
+    def set(self, key, val, ex=None, px=None, nx=False, xx=False):
+        return self.__queue(None, 'set', key, self.__conn._dumps(val), ex=ex, px=px, nx=nx, xx=xx)
+
+    def get(self, key):
+        return self.__queue(self.__conn._loads, 'get', key)
+
+    def mget(self, keys):
+        return self.__queue(lambda res: [self.__conn._loads(r) for r in res], 'mget', keys)
+
+    def delete(self, *keys):
+        return self.__queue(None, 'delete', *keys)
+
+    def exists(self, key):
+        return self.__queue(bool, 'exists', key)
+
+    def expire(self, key, time):
+        return self.__queue(None, 'expire', key, time)
+
+    def sadd(self, key, *members):
+        return self.__queue(None, 'sadd', key, *members)
+
+    def srem(self, key, *members):
+        return self.__queue(None, 'srem', key, *members)
+
+    def smembers(self, key):
+        return self.__queue(self.__members, 'smembers', key)
+
+    def zadd(self, key, mapping):
+        args = []
+        for member, score in mapping.items():
+            args.extend((score, member))
+        return self.__queue(None, 'zadd', key, *args)
+
+    def zrem(self, key, *members):
+        return self.__queue(None, 'zrem', key, *members)
+
+    def zremrangebyscore(self, key, min, max):
+        return self.__queue(None, 'zremrangebyscore', key, min, max)
+
+    def lpush(self, key, *members):
+        return self.__queue(None, 'lpush', key, *members)
+
+    def lrem(self, key, count, member):
+        return self.__queue(None, 'lrem', key, count, member)
+
+    def llen(self, key):
+        return self.__queue(None, 'llen', key)
+
+    def hset(self, key, mapping):
+        return self.__queue(None, 'hmset', key, {f: self.__conn._dumps(v) for f, v in mapping.items()})
+
+    def hmget(self, key, fields):
+        return self.__queue(lambda res: [self.__conn._loads(r) for r in res], 'hmget', key, fields)
+
+    def hgetall(self, key):
+        return self.__queue(self.__conn._loads_hash, 'hgetall', key)
+
+    def publish(self, channel, message):
+        return self.__queue(None, 'publish', channel, message)
+
+    def execute(self):
+        decoders, self.__decoders = self.__decoders, []
+        return [res if decoder is None else decoder(res) for decoder, res in zip(decoders, self.__pipe.execute())]
+
+    def reset(self):
+        self.__decoders = []
+        return self.__pipe.reset()
+
+
+class HashValue(dict):
+    """ Hash kind of MemoryStore value """
+    pass
+
+
+class _Above:
+    """ Sorts after any member, to bisect past all members of a score """
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+
+class SortedSetValue(dict):
+    """ Sorted set kind of MemoryStore value: member -> score, with (score, member) pairs kept in order """
+    def __init__(self):
+        super().__init__()
+        self.order = []
+
+    def add(self, member, score) -> bool:
+        """
+        :return: True if member is new
+        """
+        old = self.get(member)
+        if old == score:
+            return False
+        if old is not None:
+            del self.order[bisect_left(self.order, (old, member))]
+        self[member] = score
+        insort(self.order, (score, member))
+        return old is None
+
+    def discard(self, member) -> bool:
+        old = self.pop(member, None)
+        if old is None:
+            return False
+        del self.order[bisect_left(self.order, (old, member))]
+        return True
+
+    def discard_range(self, min, max) -> list:
+        """
+        :return: members with scores from min to max, inclusive, that were removed
+        """
+        start, end = bisect_left(self.order, (min,)), bisect_right(self.order, (max, _Above()))
+        dropped = [member for score, member in self.order[start:end]]
+        del self.order[start:end]
+        for member in dropped:
+            del self[member]
+        return dropped
+
+
+class MemoryStore:
+    """
+    Keyspace of MemoryConnector; Shared by every connector to the same db, so components of one process see each other
+    Values are kept serialized (when typed), so stored objects are not mutated behind connector's back;
+    Collections are changed in place by the connector, which reports the change of their size with resize()
+    """
+    SWEEP_BATCH = 100  # keys expired per hold of the lock
+    __stores = dict()
+    __stores_lock = threading.Lock()
+
+    @classmethod
+    def get_store(cls, db, max_bytes=None, expire_interval=1):
+        with cls.__stores_lock:
+            store = cls.__stores.get(db)
+            if store is None:
+                store = cls(max_bytes=max_bytes, expire_interval=expire_interval)
+                cls.__stores[db] = store
+            return store
+
+    def __init__(self, max_bytes=None, expire_interval=1):
+        self.lock = threading.RLock()
+        self.pushed = threading.Condition(self.lock)  # notified on list pushes, for blocking pops
+        self.data = OrderedDict()  # key -> value, ordered from least to most recently used
+        self.sizes = dict()
+        self.expires = dict()  # key -> unix time of expiry
+        self.subscribers = dict()  # channel -> list of handlers
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.__expire_interval = expire_interval
+        self.__deadlines = []  # heap of (expiry, key); entries whose key got another expiry since are skipped
+        self.__expiring = threading.Condition(self.lock)  # notified when the earliest expiry changes
+        self.__sweeper = None  # started with the first expiry
+
+    @staticmethod
+    def size_of(value):
+        if isinstance(value, (bytes, str)):
+            return len(value)
+        if isinstance(value, HashValue):
+            return sum(len(f) + MemoryStore.size_of(v) for f, v in value.items())
+        if isinstance(value, SortedSetValue):
+            return sum(len(m) + 8 for m in value)
+        return sum(len(m) for m in value)  # set or list
+
+    def expire_at(self, key, deadline):
+        """ Must be called under lock """
+        self.expires[key] = deadline
+        if self.__deadlines.__len__() > 2 * self.expires.__len__() + 64:  # mostly entries of changed expiries
+            self.__deadlines = [(d, k) for k, d in self.expires.items()]
+            heapq.heapify(self.__deadlines)
+        else:
+            heapq.heappush(self.__deadlines, (deadline, key))
+        if self.__sweeper is None:
+            self.__sweeper = threading.Thread(target=self.__sweep, name='memory-connector-expire', daemon=True)
+            self.__sweeper.start()
+        elif self.__deadlines[0] == (deadline, key):
+            self.__expiring.notify()
+
+    def __sweep(self):
+        """
+        Active expiry, so keys nobody reads again are not held forever; Keys are taken from the heap of expiries
+        in batches, other threads get the lock between them. Parked while no key has an expiry
+        """
+        with self.lock:
+            while True:
+                if not self.__deadlines:
+                    self.__expiring.wait()
+                    continue
+                wait = self.__deadlines[0][0] - time.time()
+                if wait > 0:
+                    self.__expiring.wait(min(wait, self.__expire_interval))
+                    continue
+                now = time.time()
+                for _ in range(MemoryStore.SWEEP_BATCH):
+                    if not self.__deadlines or self.__deadlines[0][0] > now:
+                        break
+                    deadline, key = heapq.heappop(self.__deadlines)
+                    if self.expires.get(key) == deadline:
+                        self.remove(key)
+                self.__expiring.wait(0)  # lets waiting threads in
+
+    def alive(self, key):
+        """ Lazy expiry; Must be called under lock """
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self.remove(key)
+        return key in self.data
+
+    def read(self, key, default=None):
+        if not self.alive(key):
+            return default
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def write(self, key, value, keep_ttl=False):
+        self.remove(key, keep_ttl=keep_ttl)
+        if isinstance(value, (set, dict, deque)) and not value:
+            return  # empty collections are not stored, same as in redis
+        size = MemoryStore.size_of(value)
+        self.data[key] = value
+        self.sizes[key] = size
+        self.used_bytes += size
+        self.evict(key)
+
+    def create(self, key, value):
+        """ Stores an empty collection about to be filled in place, see resize """
+        self.remove(key)
+        self.data[key] = value
+        self.sizes[key] = 0
+
+    def resize(self, key, delta):
+        """
+        Accounts for a collection changed in place; Removes it once empty, same as in redis
+        :param delta: change of it's size in bytes
+        """
+        if not self.data[key]:
+            self.remove(key)
+            return
+        self.sizes[key] += delta
+        self.used_bytes += delta
+        self.evict(key)
+
+    def remove(self, key, keep_ttl=False):
+        if not keep_ttl:
+            self.expires.pop(key, None)
+        if key not in self.data:
+            return False
+        del self.data[key]
+        self.used_bytes -= self.sizes.pop(key)
+        return True
+
+    def evict(self, keep):
+        if self.max_bytes is None:
+            return
+        while self.used_bytes > self.max_bytes and self.data.__len__() > 1:
+            key = next(iter(self.data))
+            if key == keep:
+                self.data.move_to_end(key)
+                key = next(iter(self.data))
+            self.remove(key)
+
+    def flush(self):
+        self.data.clear()
+        self.sizes.clear()
+        self.expires.clear()
+        self.__deadlines = []
+        self.used_bytes = 0
+
+
+class MemoryConnector(Connector, IndexConnector, QueueConnector, PubSubConnector, LockConnector):
+    """
+    In-process connector with the same semantics as RedisConnector; Thread-safe.
+    Keys expire both lazily on access and actively by a sweeper thread;
+    With max_bytes set, least recently used keys are evicted once stored values exceed it.
+    """
+    name = StorageEnvironment.MEMORY.cls
+
+    def __init__(self, **kwargs):
+        self.typed = kwargs.pop('typed', StorageEnvironment.MEMORY.conf.get('typed', True))
+        db = kwargs.pop('db', StorageEnvironment.MEMORY.conf.get('db', 0))
+        max_bytes = kwargs.pop('max_bytes', StorageEnvironment.MEMORY.conf.get('max_bytes', None))
+        expire_interval = kwargs.pop('expire_interval', StorageEnvironment.MEMORY.conf.get('expire_interval', 1))
+        self.serializer = Serializer(
+            serializer=kwargs.pop('serializer', StorageEnvironment.MEMORY.conf.get('serializer', 'pickle')),
+            protocol=kwargs.pop('pickle_protocol', StorageEnvironment.MEMORY.conf.get('pickle_protocol', None)),
+            compression=kwargs.pop('compression', StorageEnvironment.MEMORY.conf.get('compression', None)),
+            compress_threshold=kwargs.pop('compress_threshold',
+                                          StorageEnvironment.MEMORY.conf.get('compress_threshold', 65536)),
+            compress_level=kwargs.pop('compress_level', StorageEnvironment.MEMORY.conf.get('compress_level', None))
+        )
+        l.debug(f'Starting in-memory connector ({db})')
+        self.__store = MemoryStore.get_store(db, max_bytes=max_bytes, expire_interval=expire_interval)
+
+    def _dumps(self, val):
+        if self.typed:
+            return self.serializer.dumps(val)
+        if isinstance(val, bytes):
+            return val.decode('utf-8')
+        return val if isinstance(val, str) else str(val)
+
+    def _loads(self, res):
+        if res is None or not self.typed:
+            return res
+        return self.serializer.loads(res)
+
+    def __collection(self, key, kind, create=False):
+        """
+        :param create: missing key gets an empty collection stored, to be filled in place and resized
+        """
+        value = self.__store.read(key)
+        if value is None:
+            value = kind()
+            if create:
+                self.__store.create(key, value)
+            return value
+        if type(value) is not kind:
+            raise TypeError(f'Operation against a key {key} holding the wrong kind of value')
+        return value
+
+    def set(self, key, val, ex=None, px=None, nx=False, xx=False):
+        with self.__store.lock:
+            present = self.__store.alive(key)
+            if (nx and present) or (xx and not present):
+                return None
+            self.__store.write(key, self._dumps(val))
+            if ex is not None:
+                self.__store.expire_at(key, time.time() + ex)
+            elif px is not None:
+                self.__store.expire_at(key, time.time() + px / 1000)
+            return True
+
+    def get(self, key):
+        with self.__store.lock:
+            value = self.__store.read(key)
+        if isinstance(value, (set, dict, deque)):
+            raise TypeError(f'Operation against a key {key} holding the wrong kind of value')
+        return self._loads(value)
+
+    def delete(self, *keys):
+        with self.__store.lock:
+            return sum(1 for key in keys if self.__store.alive(key) and self.__store.remove(key))
+
+    def delete_if_equal(self, key, value):
+        with self.__store.lock:
+            if self.__store.read(key) != self._dumps(value):
+                return False
+            return self.__store.remove(key)
+
+    def keys(self, pattern='*'):
+        with self.__store.lock:
+            return [key for key in list(self.__store.data) if fnmatchcase(key, pattern) and self.__store.alive(key)]
+
+    def scan_iter(self, match='*', count=None):
+        # keys are snapshotted, nothing is blocked while the caller walks them
+        yield from self.keys(match)
+
+    def exists(self, key):
+        with self.__store.lock:
+            return self.__store.alive(key)
+
+    def expire(self, key, time):
+        with self.__store.lock:
+            if not self.__store.alive(key):
+                return False
+            self.__store.expire_at(key, _now() + time)
+            return True
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def mset(self, mapping, ex=None):
+        with self.__store.lock:
+            for key, val in mapping.items():
+                self.set(key, val, ex=ex)
+        return True
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self, self.__store.lock)
+
+    def sadd(self, key, *members):
+        with self.__store.lock:
+            value = self.__collection(key, set, create=True)
+            added = [member for member in set(members) if member not in value]
+            value.update(added)
+            self.__store.resize(key, sum(len(m) for m in added))
+            return added.__len__()
+
+    def srem(self, key, *members):
+        with self.__store.lock:
+            value = self.__collection(key, set)
+            removed = [member for member in set(members) if member in value]
+            if not removed:
+                return 0
+            value.difference_update(removed)
+            self.__store.resize(key, -sum(len(m) for m in removed))
+            return removed.__len__()
+
+    def smembers(self, key):
+        with self.__store.lock:
+            return set(self.__collection(key, set))
+
+    def sismember(self, key, member):
+        with self.__store.lock:
+            return member in self.__collection(key, set)
+
+    def zadd(self, key, mapping):
+        with self.__store.lock:
+            value = self.__collection(key, SortedSetValue, create=True)
+            added = [member for member, score in mapping.items() if value.add(member, float(score))]
+            self.__store.resize(key, sum(len(m) + 8 for m in added))
+            return added.__len__()
+
+    def zrem(self, key, *members):
+        with self.__store.lock:
+            value = self.__collection(key, SortedSetValue)
+            removed = [member for member in members if value.discard(member)]
+            if not removed:
+                return 0
+            self.__store.resize(key, -sum(len(m) + 8 for m in removed))
+            return removed.__len__()
+
+    def zrange(self, key, start=0, end=-1, desc=False):
+        with self.__store.lock:
+            order = self.__collection(key, SortedSetValue).order
+            count = order.__len__()
+            start = max(start + count if start < 0 else start, 0)
+            end = min(end + count if end < 0 else end, count - 1)
+            if start > end:
+                return []
+            if desc:
+                return [member for score, member in reversed(order[count - 1 - end:count - start])]
+            return [member for score, member in order[start:end + 1]]
+
+    def zremrangebyscore(self, key, min, max):
+        with self.__store.lock:
+            value = self.__collection(key, SortedSetValue)
+            dropped = value.discard_range(float(min), float(max))
+            if not dropped:
+                return 0
+            self.__store.resize(key, -sum(len(m) + 8 for m in dropped))
+            return dropped.__len__()
+
+    # lists are kept head first
+    def lpush(self, key, *members):
+        with self.__store.lock:
+            value = self.__collection(key, deque, create=True)
+            value.extendleft(members)
+            self.__store.resize(key, sum(len(m) for m in members))
+            self.__store.pushed.notify_all()
+            return value.__len__()
+
+    def rpoplpush(self, src, dst):
+        with self.__store.lock:
+            value = self.__collection(src, deque)
+            if not value:
+                return None
+            member = value.pop()
+            self.__store.resize(src, -len(member))
+            self.lpush(dst, member)
+            return member
+
+    def brpoplpush(self, src, dst, timeout=0):
+        deadline = None if not timeout else time.time() + timeout
+        with self.__store.pushed:
+            while True:
+                member = self.rpoplpush(src, dst)
+                if member is not None:
+                    return member
+                left = None if deadline is None else deadline - time.time()
+                if left is not None and left <= 0:
+                    return None
+                self.__store.pushed.wait(left)
+
+    def lrem(self, key, count, member):
+        with self.__store.lock:
+            value = self.__collection(key, deque)
+            removed = 0
+            if count > 0:  # from head, e.g. an acknowledged task is near the head of a processing list
+                while removed < count:
+                    try:
+                        value.remove(member)
+                    except ValueError:
+                        break
+                    removed += 1
+            else:
+                positions = [i for i, m in enumerate(value) if m == member]
+                if count < 0:
+                    positions = positions[count:]
+                for i in reversed(positions):
+                    del value[i]
+                removed = positions.__len__()
+            if removed:
+                self.__store.resize(key, -len(member) * removed)
+            return removed
+
+    def llen(self, key):
+        with self.__store.lock:
+            return self.__collection(key, deque).__len__()
+
+    def lrange(self, key, start=0, end=-1):
+        with self.__store.lock:
+            value = self.__collection(key, deque)
+            count = value.__len__()
+            start = max(start + count if start < 0 else start, 0)
+            end = min(end + count if end < 0 else end, count - 1)
+            return list(islice(value, start, end + 1)) if start <= end else []
+
+    def hset(self, key, mapping):
+        with self.__store.lock:
+            value = self.__collection(key, HashValue, create=True)
+            delta = 0
+            for f, v in mapping.items():
+                dumped = self._dumps(v)
+                old = value.get(f)
+                delta += MemoryStore.size_of(dumped) - (MemoryStore.size_of(old) if old is not None else -len(f))
+                value[f] = dumped
+            self.__store.resize(key, delta)
+            return True
+
+    def hmget(self, key, fields):
+        with self.__store.lock:
+            value = self.__collection(key, HashValue)
+            return [self._loads(value.get(f)) for f in fields]
+
+    def hgetall(self, key):
+        with self.__store.lock:
+            value = self.__collection(key, HashValue)
+            return {f: self._loads(v) for f, v in value.items()}
+
+    def flushdb(self):
+        with self.__store.lock:
+            self.__store.flush()
+        return True
+
+    def graceful_shutdown(self):
+        # keyspace is shared with other connectors of this process, there is nothing to disconnect
+        return True
+
+    def publish(self, channel, message):
+        with self.__store.lock:
+            handlers = list(self.__store.subscribers.get(channel, []))
+        for handler in handlers:  # delivered synchronously, outside the store lock
+            handler(message)
+        return handlers.__len__()
+
+    def subscribe(self, channel, handler):
+        return MemorySubscription(self.__store, channel, handler)
+
+    def pool_status(self):
+        return {'used_bytes': self.__store.used_bytes, 'max_bytes': self.__store.max_bytes,
+                'keys': self.__store.data.__len__()}
+
+
+class MemorySubscription:
+    """ In-process subscription, messages are delivered in publisher's thread """
+    def __init__(self, store: MemoryStore, channel, handler):
+        self.channel = channel
+        self.handler = handler
+        self.active = True
+        self.__store = store
+        with store.lock:
+            store.subscribers.setdefault(channel, []).append(handler)
+
+    def stop(self):
+        self.active = False
+        with self.__store.lock:
+            handlers = self.__store.subscribers.get(self.channel, [])
+            if self.handler in handlers:
+                handlers.remove(self.handler)
+
+
+class MemoryPipeline:
+    """
+    Queues MemoryConnector calls and runs them under store lock on execute, so a batch is atomic
+    """
+    def __init__(self, connector: MemoryConnector, lock):
+        self.__conn = connector
+        self.__lock = lock
+        self.__commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.reset()
+
+    def __getattr__(self, command):
+        method = getattr(self.__conn, command)
+
+        def queue(*args, **kwargs):
+            self.__commands.append((method, args, kwargs))
+            return self
+        return queue
 
+    def execute(self):
+        commands, self.__commands = self.__commands, []
+        with self.__lock:
+            return [method(*args, **kwargs) for method, args, kwargs in commands]
 
-# TODO: in-memory fake connector
\ No newline at end of file
+    def reset(self):
+        self.__commands = []
@@ -41,8 +41,28 @@ class TaskNotFound(BaseError):
 class ConnectorInitFail(BaseCritical):
     pass
 
+class SerializerNotAvailable(BaseCritical):
+    pass
+
 class NotPermitted(BaseError):
     pass
 
 class BorkedException(BaseError):
-    pass
\ No newline at end of file
+    pass
+
+class TaskCancelled(BaseError):
+    pass
+
+class InvalidSchedule(BaseError):
+    pass
+
+class WorkflowFailed(BaseError):
+    pass
+
+class TaskerOverloaded(BaseError):
+    def __init__(self, message, retry_after=1):
+        super(TaskerOverloaded, self).__init__(message)
+        self.retry_after = retry_after
+
+class TaskTimeout(BaseError):
+    pass
@@ -0,0 +1,127 @@
+"""
+In-process task metrics, rendered in Prometheus text exposition format for GET /metrics
+"""
+from itertools import islice
+import threading
+
+
+class Histogram:
+    """
+    Cumulative histogram: count of observations under each bucket bound, their sum and count
+    """
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * buckets.__len__()
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        lines = [f'{name}_bucket{{{labels},le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+def label(value) -> str:
+    """
+    :return: label value escaped for Prometheus text format, backslash, double quote and newline
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def result_size(res, depth: int = 3, sample: int = 32) -> int:
+    """
+    Approximate size of a task result in bytes, without serializing it;
+    Walks at most depth levels of containers and sample items of each, extrapolating to the rest
+    """
+    if res is None:
+        return 0
+    if hasattr(res, 'nbytes'):  # NumPy arrays, memoryviews
+        return res.nbytes
+    if isinstance(res, (bytes, bytearray, str)):
+        return res.__len__()
+    if isinstance(res, (dict, list, tuple, set)):
+        count = res.__len__()
+        if not count:
+            return 0
+        if depth <= 0:
+            return count * 8
+        items = islice(res.items() if isinstance(res, dict) else res, sample)
+        if isinstance(res, dict):
+            measured = sum(result_size(k, depth - 1, sample) + result_size(v, depth - 1, sample) for k, v in items)
+        else:
+            measured = sum(result_size(v, depth - 1, sample) for v in items)
+        return measured * count // min(count, sample)
+    return 8  # numbers and such
+
+
+class TaskMetrics:
+    """
+    Per task name histograms of queue wait, run time and result size, and counts of outcomes
+    """
+    PREFIX = 'orchestrator'
+    WAIT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+    RUN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+    SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__tasks = dict()  # task name -> dict of histograms and outcome counts
+
+    def observe(self, name: str, outcome: str, queue_wait: float = None, run_time: float = None, result=None):
+        """
+        :param name: task name
+        :param outcome: final status of the run
+        :param queue_wait: seconds from submission to start, None if not known
+        :param run_time: seconds task ran for
+        :param result: task result, only measured for successful runs
+        """
+        size = result_size(result) if result is not None else None
+        with self.__lock:
+            task = self.__tasks.get(name)
+            if task is None:
+                task = self.__tasks[name] = dict(wait=Histogram(self.WAIT_BUCKETS), run=Histogram(self.RUN_BUCKETS),
+                                                 size=Histogram(self.SIZE_BUCKETS), outcomes=dict())
+            if queue_wait is not None:
+                task['wait'].observe(max(queue_wait, 0))
+            if run_time is not None:
+                task['run'].observe(run_time)
+            if size is not None:
+                task['size'].observe(size)
+            task['outcomes'][outcome] = task['outcomes'].get(outcome, 0) + 1
+
+    def render(self, lanes: dict = None) -> str:
+        """
+        :param lanes: lane name -> dict of gauge name (e.g. queue_depth) to value
+        :return: metrics in Prometheus text format
+        """
+        prefix = TaskMetrics.PREFIX
+        lines = []
+        with self.__lock:
+            tasks = sorted(self.__tasks.items())
+            for metric, key, help in ((f'{prefix}_task_queue_wait_seconds', 'wait', 'Time tasks waited for a worker'),
+                                      (f'{prefix}_task_run_seconds', 'run', 'Time tasks ran for'),
+                                      (f'{prefix}_task_result_bytes', 'size', 'Approximate size of task results')):
+                lines += [f'# HELP {metric} {help}', f'# TYPE {metric} histogram']
+                for name, task in tasks:
+                    lines += task[key].render(metric, f'task="{label(name)}"')
+            metric = f'{prefix}_tasks_total'
+            lines += [f'# HELP {metric} Finished task runs by outcome', f'# TYPE {metric} counter']
+            for name, task in tasks:
+                lines += [f'{metric}{{task="{label(name)}",outcome="{label(outcome)}"}} {count}'
+                          for outcome, count in sorted(task['outcomes'].items())]
+        gauges = dict()
+        for lane, values in sorted((lanes or dict()).items()):
+            for gauge, value in values.items():
+                gauges.setdefault(gauge, []).append(f'{prefix}_lane_{gauge}{{lane="{label(lane)}"}} {value}')
+        for gauge, values in gauges.items():
+            lines += [f'# TYPE {prefix}_lane_{gauge} gauge'] + values
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,318 @@
+from . import ConfigLoader, Connector, Tasker, l, Conductor
+from .errors import InvalidSchedule, TaskerOverloaded
+from .config import SchedulerConfig, TaskerConfig
+
+from datetime import datetime, timedelta
+import random
+import threading
+import time
+
+
+class CronExpression:
+    """
+    Five field cron expression: minute, hour, day of month, month, day of week (0 or 7 is Sunday), in local time;
+    Fields take *, values, ranges a-b, lists a,b and steps */n or a-b/n.
+    As in cron, when both days are restricted either of them matches.
+    """
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        parts = expression.split() if isinstance(expression, str) else []
+        if parts.__len__() != 5:
+            raise InvalidSchedule(f'Cron expression {expression} should have 5 fields')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self.__field(part, *bounds) for part, bounds in zip(parts, CronExpression.FIELDS))
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    def __field(self, part, low, high) -> set:
+        values = set()
+        for item in part.split(','):
+            span, _, step = item.partition('/')
+            try:
+                if span == '*':
+                    start, end = low, high
+                elif '-' in span:
+                    start, end = (int(v) for v in span.split('-', 1))
+                else:
+                    start = int(span)
+                    end = high if step else start
+                step = int(step) if step else 1
+            except ValueError:
+                raise InvalidSchedule(f'Invalid field {part} in cron expression {self.expression}')
+            if not low <= start <= end <= high or step < 1:
+                raise InvalidSchedule(f'Field {part} of cron expression {self.expression} is out of {low}-{high}')
+            values.update(range(start, end + 1, step))
+        return values
+
+    def __day_matches(self, dt: datetime) -> bool:
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next(self, after: float) -> float:
+        """
+        :return: timestamp of the first matching minute after given timestamp
+        """
+        dt = datetime.fromtimestamp(after).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)  # e.g. Feb 30 never matches
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self.__day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.timestamp()
+        raise InvalidSchedule(f'Cron expression {self.expression} never matches')
+
+
+class Schedule:
+    """
+    Recurring call of a registered task
+    :param name: schedule name
+    :param task: registered task name
+    :param kwargs: task kwargs
+    :param cron: cron expression, see CronExpression; or
+    :param interval: seconds between runs, counted from creation
+    :param jitter: each run is delayed by up to this many seconds, so schedules due at the same time are spread out
+    :param misfire: SKIP drops runs later than misfire_grace (e.g. all nodes were down), ONCE runs them late;
+    Several missed runs are always run once
+    :param misfire_grace: seconds, SchedulerConfig.MISFIRE_GRACE if None
+    :param max_concurrency: a run is skipped while this many runs of the schedule are not finished
+    :param enabled: disabled schedules don't fire
+    """
+    SKIP, ONCE = 'skip', 'once'
+    FIELDS = ('task', 'kwargs', 'cron', 'interval', 'jitter', 'misfire', 'misfire_grace', 'max_concurrency',
+              'enabled', 'created')
+
+    def __init__(self, name: str, task: str, kwargs: dict = None, cron: str = None, interval: float = None,
+                 jitter: float = 0, misfire: str = SKIP, misfire_grace: float = None, max_concurrency: int = 1,
+                 enabled: bool = True, created: float = None):
+        if (cron is None) == (interval is None):
+            raise InvalidSchedule(f'Schedule {name} needs either cron or interval')
+        if interval is not None and (not isinstance(interval, (int, float)) or interval < 1):
+            raise InvalidSchedule(f'Interval of schedule {name} should be at least 1 second')
+        if misfire not in (Schedule.SKIP, Schedule.ONCE):
+            raise InvalidSchedule(f'Misfire policy of schedule {name} should be {Schedule.SKIP} or {Schedule.ONCE}')
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise InvalidSchedule(f'Max concurrency of schedule {name} should be a positive integer')
+        if not isinstance(jitter, (int, float)) or jitter < 0:
+            raise InvalidSchedule(f'Jitter of schedule {name} should be a non-negative number of seconds')
+        self.name = name
+        self.task = task
+        self.kwargs = kwargs or dict()
+        self.cron = cron
+        self.interval = interval
+        self.jitter = jitter
+        self.misfire = misfire
+        self.misfire_grace = misfire_grace
+        self.max_concurrency = max_concurrency
+        self.enabled = enabled
+        self.created = time.time() if created is None else created
+        self.__cron = None if cron is None else CronExpression(cron)
+
+    def record(self) -> dict:
+        return {f: getattr(self, f) for f in Schedule.FIELDS}
+
+    @classmethod
+    def from_record(cls, name, record: dict):
+        return cls(name, **{f: v for f, v in record.items() if f in Schedule.FIELDS})
+
+    def next_slot(self, after: float) -> float:
+        """
+        :return: first run time after given timestamp, without jitter
+        """
+        if self.__cron is not None:
+            return self.__cron.next(after)
+        if after < self.created:
+            return self.created + self.interval
+        return self.created + ((after - self.created) // self.interval + 1) * self.interval
+
+    def latest_slot(self, last: float, now: float) -> float:
+        """
+        :return: latest run time after last and not after now, None if there is none yet
+        """
+        slot = self.next_slot(last)
+        if slot > now:
+            return None
+        if self.__cron is None:
+            return self.created + ((now - self.created) // self.interval) * self.interval
+        following = self.__cron.next(slot)
+        while following <= now:
+            slot, following = following, self.__cron.next(following)
+        return slot
+
+    def delay(self, slot: float) -> float:
+        """ Jitter of a run; Seeded by the run, so every node delays it the same """
+        if not self.jitter:
+            return 0
+        return random.Random(f'{self.name}:{slot}').uniform(0, self.jitter)
+
+
+class Scheduler:
+    """
+    Fires registered tasks on cron and interval schedules through Tasker.run_task.
+    Schedules are stored with ConfigLoader, so every node sees changes; each node started runs the loop,
+    and a run is fired by whichever node takes it's fire lock in the connector first.
+    """
+
+    def __init__(self, tasker: Tasker = None, **kwargs):
+        l.info('Initializing scheduler')
+        self.tasker = tasker or Tasker()
+        connector = kwargs.pop('connector', None)
+        self.__own_conn = connector is None  # shut down with the scheduler
+        self.__conn = connector or Connector()
+        self.config = kwargs.pop('configurator', None) or self.tasker.config or ConfigLoader(connector=self.__conn)
+        self.config.init_config(SchedulerConfig)
+        self.__lock = threading.Lock()  # read-modify-write of this node's schedule changes
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    def __key(self, *parts) -> str:
+        return '.'.join((self.config.get(SchedulerConfig.SCHEDULER_PATH), *(str(p) for p in parts)))
+
+    def start(self):
+        """ Starts firing due schedules in a background thread """
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__loop, name=f'{Conductor.ORCHESTRATION}-scheduler',
+                                             daemon=True)
+            self.__thread.start()
+            l.info('Scheduler started')
+        return True
+
+    def __loop(self):
+        while not self.__stopped.wait(self.config.get(SchedulerConfig.SCHEDULER_TICK)):
+            try:
+                self.tick()
+            except Exception as e:  # the loop has to survive storage hiccups
+                l.error(f'Scheduler tick failed: {e}')
+
+    def list_schedules(self) -> dict:
+        """
+        :return: dict of schedule name to Schedule
+        """
+        return {name: Schedule.from_record(name, record)
+                for name, record in (self.config.get(SchedulerConfig.SCHEDULES) or dict()).items()}
+
+    def get_schedule(self, name: str) -> Schedule:
+        return self.list_schedules().get(name)
+
+    def add_schedule(self, name: str, task: str, **kwargs) -> Schedule:
+        """
+        Adds or replaces a schedule, see Schedule for kwargs
+        :return: Schedule
+        """
+        if task not in self.tasker.tasks:
+            raise InvalidSchedule(f'Task {task} of schedule {name} is not registered')
+        schedule = Schedule(name, task, **kwargs)
+        with self.__lock:
+            schedules = dict(self.config.get(SchedulerConfig.SCHEDULES) or dict())
+            schedules[name] = schedule.record()
+            self.config.set(SchedulerConfig.SCHEDULES, schedules)
+        self.__conn.delete(self.__key('last', name))  # replaced schedule starts over
+        l.info(f'Schedule {name} of {task} set')
+        return schedule
+
+    def delete_schedule(self, name: str) -> bool:
+        with self.__lock:
+            schedules = dict(self.config.get(SchedulerConfig.SCHEDULES) or dict())
+            if schedules.pop(name, None) is None:
+                return False
+            self.config.set(SchedulerConfig.SCHEDULES, schedules)
+        self.__conn.delete(self.__key('last', name))
+        self.__conn.delete(self.__key('running', name))
+        l.info(f'Schedule {name} deleted')
+        return True
+
+    def schedule_status(self, schedule: Schedule) -> dict:
+        """
+        :return: dict with last fired run, next run (with jitter) and ids of runs not finished yet
+        """
+        last = self.__conn.get(self.__key('last', schedule.name))
+        slot = schedule.next_slot(max(last or schedule.created, time.time()))
+        return dict(last=last, next=slot + schedule.delay(slot), running=self.__running(schedule))
+
+    def __running(self, schedule: Schedule) -> list:
+        running = []
+        for task_id in self.__conn.get(self.__key('running', schedule.name)) or []:
+            task = self.tasker.get_task_info(task_id, result=False)
+            if task is not None and not task.finished:
+                running.append(task_id)
+        return running
+
+    def tick(self, now: float = None) -> list:
+        """
+        Fires schedules that are due
+        :param now: timestamp, current time if None
+        :return: list of ids of tasks fired by this node
+        """
+        now = time.time() if now is None else now
+        fired = []
+        for name, record in (self.config.get(SchedulerConfig.SCHEDULES) or dict()).items():
+            try:  # a broken schedule doesn't hold up the others
+                task_id = self.__fire(Schedule.from_record(name, record), now)
+            except Exception as e:
+                l.error(f'Schedule {name} failed to fire: {e}')
+                continue
+            if task_id is not None:
+                fired.append(task_id)
+        return fired
+
+    def __fire(self, schedule: Schedule, now: float) -> str:
+        """
+        Fires schedule if it's due and this node takes it's fire lock; The run counts as fired only once the task
+        is submitted, otherwise the lock is dropped so it's tried again
+        :return: id of task fired, None if none was
+        """
+        if not schedule.enabled:
+            return None
+        last = self.__conn.get(self.__key('last', schedule.name))
+        slot = schedule.latest_slot(schedule.created if last is None else last, now)
+        if slot is None or now < slot + schedule.delay(slot):
+            return None
+        # every node sees the run due, only the first to lock it fires
+        lock = self.__key('fire', schedule.name, int(slot))
+        if not self.__conn.set(lock, Conductor.ORCHESTRATION, ex=self.tasker.config.get(TaskerConfig.TASK_EX),
+                               nx=True):
+            return None
+        grace = schedule.misfire_grace
+        if grace is None:
+            grace = self.config.get(SchedulerConfig.MISFIRE_GRACE)
+        if schedule.misfire == Schedule.SKIP and now - slot - schedule.delay(slot) > grace:
+            l.warning(f'Schedule {schedule.name} misfired by {now - slot:.0f} seconds, run skipped')
+            self.__conn.set(self.__key('last', schedule.name), slot)
+            return None
+        running = self.__running(schedule)
+        if running.__len__() >= schedule.max_concurrency:
+            l.warning(f'Schedule {schedule.name} has {running.__len__()} runs in progress, run skipped')
+            self.__conn.set(self.__key('last', schedule.name), slot)
+            return None
+        l.info(f'Schedule {schedule.name} fires {schedule.task}')
+        try:
+            trw = self.tasker.run_task(schedule.task, kwargs=schedule.kwargs)
+        except Exception as e:  # e.g. overloaded, or task not registered on this node
+            self.__conn.delete(lock)
+            if isinstance(e, TaskerOverloaded):
+                l.warning(f'Schedule {schedule.name} run not fired, tasker is overloaded')
+                return None
+            raise
+        self.__conn.set(self.__key('last', schedule.name), slot)
+        self.__conn.set(self.__key('running', schedule.name), running + [trw.tid])
+        return trw.tid
+
+    def graceful_shutdown(self):
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        if self.__own_conn:
+            self.__conn.graceful_shutdown()
+        return True
@@ -0,0 +1,219 @@
+from abc import ABCMeta, abstractmethod
+import pickle
+import struct
+import zlib
+
+from .errors import SerializerNotAvailable
+
+# optional codecs; only required when configured
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import lz4.frame as lz4
+except ImportError:
+    lz4 = None
+
+# Stored value layout: plain pickle as before (always starts with PROTO opcode 0x80), or
+# one header byte (codec id in low nibble, compression id in high nibble) followed by payload
+PICKLE_PROTO = 0x80
+
+
+class Codec(metaclass=ABCMeta):
+    code = None
+    name = None
+
+    @abstractmethod
+    def encode(self, val) -> bytes:
+        pass
+
+    def encode_parts(self, val) -> list:
+        """ Encoded value as a list of byte chunks, so the framing is done with one copy """
+        return [self.encode(val)]
+
+    @abstractmethod
+    def decode(self, data: memoryview):
+        pass
+
+    @classmethod
+    def impl_list(cls) -> dict:
+        return {subcl.name: subcl for subcl in cls.__subclasses__()}
+
+
+class PickleCodec(Codec):
+    code = 0
+    name = 'pickle'
+
+    def __init__(self, protocol=pickle.DEFAULT_PROTOCOL):
+        if protocol < 2:  # older protocols don't start with PROTO opcode and can't be told apart from headers
+            raise SerializerNotAvailable(f'Pickle protocol {protocol} is not supported, use 2 or higher')
+        self.protocol = protocol
+
+    def encode(self, val):
+        return pickle.dumps(val, protocol=self.protocol)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class Pickle5Codec(Codec):
+    """
+    Pickle protocol 5 with out-of-band buffers: large contiguous buffers (e.g. NumPy arrays) are not copied into
+    the pickle stream, they are appended raw after it and handed back to pickle as writable copies on load
+    Layout: <I buffer count> <Q length> * (count + 1) <pickle stream> <buffers>
+    """
+    code = 1
+    name = 'pickle5'
+
+    def __init__(self, **kwargs):
+        pass
+
+    def encode_parts(self, val):
+        buffers = []
+        stream = pickle.dumps(val, protocol=5, buffer_callback=buffers.append)
+        raws = [b.raw() for b in buffers]
+        lengths = [len(stream)] + [r.nbytes for r in raws]
+        header = struct.pack(f'<I{lengths.__len__()}Q', buffers.__len__(), *lengths)
+        return [header, stream, *raws]
+
+    def encode(self, val):
+        return b''.join(self.encode_parts(val))
+
+    def decode(self, data):
+        count, = struct.unpack_from('<I', data)
+        lengths = struct.unpack_from(f'<{count + 1}Q', data, 4)
+        offset = 4 + 8 * (count + 1)
+        parts = []
+        for length in lengths:
+            parts.append(data[offset:offset + length])
+            offset += length
+        # views on stored bytes are read-only, loaded objects (e.g. NumPy arrays) get writable copies instead
+        return pickle.loads(parts[0], buffers=[bytearray(part) for part in parts[1:]])
+
+
+class MsgpackCodec(Codec):
+    """
+    Compact encoding for JSON-safe payloads; Note that tuples come back as lists
+    Values msgpack can't handle are stored with pickle codec instead
+    """
+    code = 2
+    name = 'msgpack'
+
+    def __init__(self, **kwargs):
+        if msgpack is None:
+            raise SerializerNotAvailable('msgpack serializer configured, but msgpack package is not installed')
+
+    def encode(self, val):
+        return msgpack.packb(val, use_bin_type=True)
+
+    def decode(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+class Compression(metaclass=ABCMeta):
+    code = None
+    name = None
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        pass
+
+    @abstractmethod
+    def decompress(self, data) -> bytes:
+        pass
+
+    @classmethod
+    def impl_list(cls) -> dict:
+        return {subcl.name: subcl for subcl in cls.__subclasses__()}
+
+
+class ZlibCompression(Compression):
+    code = 1
+    name = 'zlib'
+
+    def __init__(self, level=1):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class Lz4Compression(Compression):
+    code = 2
+    name = 'lz4'
+
+    def __init__(self, level=0):
+        if lz4 is None:
+            raise SerializerNotAvailable('lz4 compression configured, but lz4 package is not installed')
+        self.level = level
+
+    def compress(self, data):
+        return lz4.compress(data, compression_level=self.level)
+
+    def decompress(self, data):
+        return lz4.decompress(data)
+
+
+class Serializer:
+    """
+    Turns values into bytes for typed connectors and back.
+    :param serializer: codec name: pickle, pickle5 or msgpack
+    :param compression: None, zlib or lz4
+    :param compress_threshold: encoded payloads of at least this many bytes are compressed
+    :param protocol: pickle protocol for pickle codec
+    :param compress_level: compression level, codec specific
+    Anything written by any configuration is readable by all of them, including plain pickles stored before.
+    """
+    def __init__(self, serializer='pickle', compression=None, compress_threshold=65536, protocol=None,
+                 compress_level=None):
+        codecs = Codec.impl_list()
+        if serializer not in codecs:
+            raise SerializerNotAvailable(f'Unknown serializer {serializer}, expected one of {list(codecs)}')
+        self.__pickle = PickleCodec() if protocol is None else PickleCodec(protocol=protocol)
+        self.codec = self.__pickle if serializer == PickleCodec.name else codecs[serializer]()
+        self.__codecs = {PickleCodec.code: self.__pickle, Pickle5Codec.code: Pickle5Codec()}
+        self.__codecs[self.codec.code] = self.codec
+        compressions = Compression.impl_list()
+        if compression is not None and compression not in compressions:
+            raise SerializerNotAvailable(f'Unknown compression {compression}, expected one of {list(compressions)}')
+        level = dict() if compress_level is None else dict(level=compress_level)
+        self.compression = None if compression is None else compressions[compression](**level)
+        self.compress_threshold = compress_threshold
+
+    def __decoder(self, code):
+        codec = self.__codecs.get(code)
+        if codec is None:  # written by a node configured with another codec
+            codec = {c.code: c for c in Codec.impl_list().values()}[code]()
+            self.__codecs[code] = codec
+        return codec
+
+    def __decompressor(self, code):
+        if self.compression is not None and self.compression.code == code:
+            return self.compression
+        return {c.code: c for c in Compression.impl_list().values()}[code]()
+
+    def dumps(self, val) -> bytes:
+        codec = self.codec
+        try:
+            parts = codec.encode_parts(val)
+        except (TypeError, ValueError, OverflowError):  # msgpack can't encode it
+            codec = self.__pickle
+            parts = codec.encode_parts(val)
+        if self.compression is not None and sum(memoryview(p).nbytes for p in parts) >= self.compress_threshold:
+            return bytes([codec.code | self.compression.code << 4]) + self.compression.compress(b''.join(parts))
+        if codec is self.__pickle:
+            return parts[0]
+        return b''.join([bytes([codec.code]), *parts])
+
+    def loads(self, data):
+        if data[0] == PICKLE_PROTO:
+            return self.__pickle.decode(data)
+        header = data[0]
+        payload = memoryview(data)[1:]
+        if header >> 4:
+            payload = memoryview(self.__decompressor(header >> 4).decompress(payload))
+        return self.__decoder(header & 0x0f).decode(payload)
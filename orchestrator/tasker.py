@@ -1,55 +1,258 @@
-from . import TaskEnvironment, ConfigLoader, Connector, Tasker, l, Conductor
-from .errors import TaskNotFound, BorkedException
+from . import TaskEnvironment, ConfigLoader, Connector, IndexConnector, QueueConnector, PubSubConnector, \
+    LockConnector, Tasker, l, Conductor
+from .errors import TaskNotFound, BorkedException, InvalidTaskArguments, TaskCancelled, WorkflowFailed, \
+    TaskerOverloaded, TaskTimeout, NotPermitted
 from .config import TaskerConfig
+from .metrics import TaskMetrics
 
 # TODO: task class instead of dict?
 # Tasker.TaskWrapper, including pre- and post-execute
 from uuid import uuid4
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import threading
 import types
 import time
 from concurrent.futures import ThreadPoolExecutor, Future
 
 class ThreadTasker(Tasker):
     name = TaskEnvironment.THREAD.cls
+    local_registry = True  # tasks in flight are served from memory, all of them run in this process
+    SYNC, BATCHED, COMPLETION = 'sync', 'batched', 'completion'  # TaskerConfig.DURABILITY modes
+    WORKFLOW = 'workflow'  # task driving workflows, see run_workflow
+    SKIPPED = 'skipped'  # status of workflow nodes not run
+    REJECT, SHED = 'reject', 'shed'  # TaskerConfig.OVERLOAD policies
 
     def __init__(self, **kwargs):
         l.info(f'Initializing tasker {self.name}')
-        self.__conn = kwargs.pop('connector', TaskEnvironment.THREAD.conf.get('connector', Connector()))
-        self.config = kwargs.pop('configurator', TaskEnvironment.THREAD.conf.get('configurator', ConfigLoader()))
+        # defaults are only built when not supplied, connectors share pooled connections anyway
+        self.__conn = kwargs.pop('connector', None) or TaskEnvironment.THREAD.conf.get('connector') or Connector()
+        self.config = kwargs.pop('configurator', None) or TaskEnvironment.THREAD.conf.get('configurator') or \
+            ConfigLoader(connector=self.__conn)
         self.config.init_config(TaskerConfig)
         l.debug(f'Tasker initialized ConfigLoader {self.config}')
         ts = kwargs.pop('tasks', TaskEnvironment.THREAD.conf.get('tasks', dict()))
-        self.tasks = {t: Tasker.TaskWrapper(t, ts[t]) for t in ts}
+        lanes = kwargs.pop('lanes', TaskEnvironment.THREAD.conf.get('lanes', dict()))
+        self.tasks = {t: Tasker.TaskWrapper(t, ts[t], lane=lanes[t][0] if t in lanes else None) for t in ts}
         l.debug(f'Tasker loaded supplied tasks {self.tasks}')
         w_num = self.config.get(TaskerConfig.WORKER_NUM)
         l.debug(f'Creating {w_num} workers')
         self.worker = ThreadPoolExecutor(max_workers=w_num, thread_name_prefix=Conductor.ORCHESTRATION)
+        self.lanes = {Tasker.DEFAULT_LANE: self.worker}  # lane -> it's own pool, default lane is self.worker
+        self.__lanes_lock = threading.RLock()
+        for t in ts:
+            if t in lanes:
+                self._lane(*lanes[t])
         self.registry = dict()
-        l.info(f'Tasker {self.name} initialized')
+        # optional connector capabilities: task index, completion notifications, takeover of in-flight keys
+        self.__indexing = isinstance(self.__conn, IndexConnector)
+        self.__notifying = isinstance(self.__conn, PubSubConnector)
+        self.__coalescing = isinstance(self.__conn, LockConnector)
+        self.__indexed = False
+        self.__waiters = dict()  # task id -> set of Events of threads waiting for it
+        self.__waiters_lock = threading.Lock()
+        self.__subscription = None
+        self.__subscription_lock = threading.Lock()
+        self.__running = dict()  # task id -> TaskContext of tasks running in this process
+        self.__queued = dict()  # task id -> (TaskWrapper, Future) of tasks waiting for a worker, oldest first
+        self.__queued_lock = threading.Lock()
+        self.__durations = dict()  # lane -> moving average of task run time, seconds
+        self.__active = dict()  # lane -> number of tasks running
+        self.metrics = TaskMetrics()
+        self.__abandoned = dict()  # lane -> set of threads of it's tasks timed out while running
+        self.__local = dict()  # task id -> TaskResultWrapper of tasks in flight here, or with writes not flushed yet
+        self.__inflight = dict()  # task id -> in-flight key of it's call claimed here, see _coalesce
+        self.__pending = dict()  # task id -> [changes, new] waiting for the flusher
+        self.__pending_lock = threading.Lock()
+        self.__flusher = None
+        self.__flushing_stopped = threading.Event()
 
-        for task in self.list_tasks():
-            if task.result[0] is None and not task.result[1]:
-                task.error(BorkedException('Container got killed during task completion'))
-                l.debug(f'Saving task {task.ident}')
-                self.save(task)
-                # TODO: reload task results, re-add NEW to queue and restart PROGRESS
-                #t = self.tasks.get(task['name'])
-                #if t is not None:
+        def workflow(nodes: dict):
+            return self._workflow(nodes)
+        # drivers wait for their nodes in a lane of their own, so they don't take workers from the nodes
+        self.register_task(self.WORKFLOW, workflow, lane=self.WORKFLOW,
+                           max_concurrency=self.config.get(TaskerConfig.WORKFLOW_NUM),
+                           recovery=Tasker.TaskWrapper.RESUME)
+        l.info(f'Tasker {self.name} initialized')
 
+    def recover(self) -> dict:
+        """
+        Tasks of not registered functions are failed, so it should be called after registration
+        :return: dict of task id to it's status after recovery
+        """
+        l.info(f'Recovering unfinished tasks')
+        unfinished = [task.tid for task in self.list_tasks() if not task.finished]  # in order of creation
+        resubmit = []
+        recovered = dict()
+        for task_id in unfinished:
+            task = self.load(task_id)
+            if task is None or task.finished:
+                continue
+            tw = self.tasks.get(task.name)
+            self.update(task_id, self._recovery(tw, task))
+            recovered[task_id] = task.st
+            if not task.finished:
+                resubmit.append((tw, task))
+        self._submit(resubmit)
+        l.info(f'Submitted {resubmit.__len__()} of {recovered.__len__()} unfinished tasks again')
+        return recovered
 
+    def _recovery(self, task: Tasker.TaskWrapper, trw: Tasker.TaskResultWrapper) -> dict:
+        """
+        Applies recovery policy of a task to it's run found unfinished after a crash
+        :param task: TaskWrapper, None if not registered
+        :return: changes to store; Unless trw got failed by them, it is to be run again
+        """
+        crashed = 'Container got killed during task completion'
+        if task is None:
+            return trw.error(BorkedException(f'{crashed}, task {trw.name} is not registered'))
+        if trw.st == Tasker.TaskResultWrapper.NEW:  # never started, just run it
+            return trw.record('attempts')
+        if task.recovery == Tasker.TaskWrapper.FAIL:
+            return trw.error(BorkedException(crashed))
+        if task.max_attempts and trw.attempts >= task.max_attempts:
+            return trw.error(BorkedException(f'{crashed}, gave up after {trw.attempts} attempts'))
+        if task.recovery == Tasker.TaskWrapper.RETRY:
+            trw.state = None
+        trw.attempts += 1
+        l.debug(f'{trw.tid} runs again, attempt {trw.attempts}')
+        return trw.record('attempts', 'state')
 
     def graceful_shutdown(self):
         l.info(f'Tasker {self.name} is shutting down')
+        self.__flushing_stopped.set()
+        self.flush()
+        if self.__subscription is not None:
+            self.__subscription.stop()
         self.config.graceful_shutdown()
         self.__conn.graceful_shutdown()
         l.info(f'Elvis has left the building')
 
-    def register_task(self, name: str, func: types.FunctionType) -> bool:
+    def register_task(self, name: str, func: types.FunctionType, lane: str = None, max_concurrency: int = None,
+                      cache_ttl: int = None, cache_version: types.FunctionType = None, coalesce: bool = False,
+                      recovery: str = None, max_attempts: int = None, timeout: float = None,
+                      affinity: types.FunctionType = None) -> bool:
         l.info(f'Registering {name} task')
-        self.tasks[name] = Tasker.TaskWrapper(name, func)
-        l.info(f'Registered {name} task')
+        tw = Tasker.TaskWrapper(name, func, lane=lane, cache_ttl=cache_ttl, cache_version=cache_version,
+                                coalesce=coalesce, recovery=recovery, max_attempts=max_attempts, timeout=timeout,
+                                affinity=affinity)
+        self._lane(tw.lane, max_concurrency)
+        self.tasks[name] = tw
+        l.info(f'Registered {name} task in {tw.lane} lane')
         return True
 
+    def cache_key(self, task: Tasker.TaskWrapper, args, kwargs, path: str = None) -> str:
+        """
+        Key of a task call: hash of task name, arguments and version token of task.cache_version
+        :param path: key prefix, TaskerConfig.TASK_CACHE if None
+        :return: str or None if version token can't be had
+        """
+        try:
+            version = task.cache_version(*args, **kwargs) if task.cache_version is not None else None
+        except Exception as e:
+            l.warning(f'No cache version for {task.name}, not memoized: {e}')
+            return None
+        call = json.dumps([task.name, args, kwargs, version], sort_keys=True, default=repr)
+        path = path or self.config.get(TaskerConfig.TASK_CACHE)
+        return '.'.join((path, task.name, hashlib.sha1(call.encode()).hexdigest()))
+
+    def _from_cache(self, task: Tasker.TaskWrapper, args, kwargs) -> Tasker.TaskResultWrapper:
+        """
+        :return: already closed task with memoized result, to be stored by the caller; None if there is none
+        """
+        if not task.cache_ttl:
+            return None
+        key = self.cache_key(task, args, kwargs)
+        hit = None if key is None else self.__conn.get(key)
+        if hit is None:
+            return None
+        l.debug(f'Memoized result of {task.name} found')
+        res = Tasker.TaskResultWrapper(uuid4().__str__(), task_name=task.name, args=args, kwargs=kwargs)
+        res.closed(hit[0])
+        return res
+
+    def _coalesce(self, task: Tasker.TaskWrapper, res: Tasker.TaskResultWrapper) -> Tasker.TaskResultWrapper:
+        """
+        Claims the in-flight key of res's call for it before res is stored, unless an identical call is already
+        new or in progress; Then res is neither stored nor run and the running task is returned to be attached to.
+        The key is cleared once res finishes, see update
+        :return: TaskResultWrapper of the running task (status only) or None if res is to be run
+        """
+        if not self.__coalescing:  # a key left by a finished task could never be taken over
+            return None
+        key = self.cache_key(task, res.args, res.kwargs, path=self.config.get(TaskerConfig.TASK_INFLIGHT))
+        if key is None:
+            return None
+        while True:
+            with self.__conn.pipeline(transaction=False) as pipe:
+                pipe.set(key, res.tid, ex=self.config.get(TaskerConfig.TASK_EX), nx=True)
+                pipe.get(key)
+                claimed, running_id = pipe.execute()
+            if claimed:
+                self.__inflight[res.tid] = key
+                return None
+            if running_id is None:  # cleared meanwhile
+                continue
+            running = self.load(running_id, result=False)
+            if running is None:  # claimed, but not stored yet
+                running = Tasker.TaskResultWrapper(running_id, task_name=task.name, args=res.args, kwargs=res.kwargs)
+            if not running.finished:
+                l.debug(f'{task.name} call attached to {running.tid}')
+                return running
+            # finished where the key couldn't be cleared, e.g. on another node; Whoever sees it first takes over
+            self.__conn.delete_if_equal(key, running_id)
+
+    def _unclaim(self, task_id: str):
+        """
+        Clears the in-flight key claimed for task_id by _coalesce, if it still holds it, so identical calls
+        start a task of their own
+        """
+        key = self.__inflight.pop(task_id, None)
+        if key is not None:
+            self.__conn.delete_if_equal(key, task_id)
+
+    def _run_cached(self, task: Tasker.TaskWrapper, args, kwargs):
+        """
+        Runs task body, memoizing the result if task is registered with cache_ttl;
+        Key is taken before the run, so a result is never stored under a version it wasn't computed with
+        """
+        key = self.cache_key(task, args, kwargs) if task.cache_ttl else None
+        res = self._execute(task, args, kwargs)
+        if key is not None:
+            self.__conn.set(key, [res], ex=task.cache_ttl)  # wrapped, so None results are memoized too
+        return res
+
+    def invalidate_cache(self, name: str = None) -> int:
+        path = self.config.get(TaskerConfig.TASK_CACHE)
+        pattern = '.'.join((path, name, '*')) if name else '.'.join((path, '*'))
+        keys = list(self.__conn.scan_iter(pattern))
+        l.info(f'Dropping {keys.__len__()} memoized results of {name or "all tasks"}')
+        return self.__conn.delete(*keys) if keys else 0
+
+    def _lane(self, lane: str, max_concurrency: int = None) -> ThreadPoolExecutor:
+        """
+        Pool of a lane, created on first use; A pool of different size replaces it, tasks queued there still run
+        :param lane: lane name
+        :param max_concurrency: pool size, current one (or TaskerConfig.WORKER_NUM for a new lane) if None
+        :return: ThreadPoolExecutor
+        """
+        with self.__lanes_lock:
+            pool = self.lanes.get(lane)
+            if pool is not None and max_concurrency in [None, pool._max_workers]:
+                return pool
+            size = max_concurrency or self.config.get(TaskerConfig.WORKER_NUM)
+            l.debug(f'Creating {size} workers for {lane} lane')
+            self.lanes[lane] = ThreadPoolExecutor(max_workers=size,
+                                                  thread_name_prefix=f'{Conductor.ORCHESTRATION}-{lane}')
+            if lane == Tasker.DEFAULT_LANE:
+                self.worker = self.lanes[lane]
+        if pool is not None:
+            pool.shutdown(wait=False)
+        return self.lanes[lane]
+
     def add_pre(self, name, fn):
         try:
             self.tasks[name].register_pre_execute(fn)
@@ -66,22 +269,393 @@ class ThreadTasker(Tasker):
         l.debug(f'Registered post-execute hook for {name}')
         return True
 
-    def save(self, res: Tasker.TaskResultWrapper) -> bool:
-        key = '.'.join((self.config.get(TaskerConfig.TASK_PATH), res.tid))
-        if res.status in [Tasker.TaskResultWrapper.DONE, Tasker.TaskResultWrapper.ERROR]:
-            ex = self.config.get(TaskerConfig.TASK_RESULT_EX)
+    def durability(self) -> str:
+        """
+        :return: TaskerConfig.DURABILITY mode task records are written in; Unknown values fall back to sync
+        """
+        mode = self.config.get(TaskerConfig.DURABILITY)
+        return mode if self.local_registry and mode in (self.BATCHED, self.COMPLETION) else self.SYNC
+
+    def save(self, *results: Tasker.TaskResultWrapper) -> bool:
+        """
+        Stores whole task records, in one round trip when durability is sync;
+        Used on task creation, status changes go through update
+        """
+        if not results:
+            return True
+        mode = self.durability()
+        for res in results:
+            if mode != self.SYNC:
+                self.__local[res.tid] = res
+        if mode == self.SYNC:
+            return self.__store([(res.tid, res.record(), True) for res in results])
+        for res in results:
+            if mode == self.BATCHED:
+                self.__defer(res.tid, res.record(), True)
+            elif res.finished:  # on completion only
+                self.__store([(res.tid, res.record(), True)])
+        return True
+
+    def update(self, task_id, changes: dict) -> bool:
+        """
+        Writes only changed fields of a task record, e.g. returned by TaskResultWrapper.started()
+        :param task_id:
+        :param changes: dict of field name to value
+        :return: bool
+        """
+        l.debug(f'Updating {task_id} with {list(changes)}')
+        local = self.__local.get(task_id)
+        if local is not None:
+            for field, value in changes.items():
+                setattr(local, field, value)
+        finished = changes.get('st') in Tasker.TaskResultWrapper.FINISHED
+        mode = self.durability()
+        if mode == self.SYNC:
+            res = self.__store([(task_id, changes, False)])
+        elif mode == self.BATCHED:
+            res = self.__defer(task_id, changes, False)
+        elif finished:  # on completion only: the whole record is written once, if it's here
+            res = self.__store([(task_id, changes, False) if local is None else (task_id, local.record(), True)])
         else:
-            ex = self.config.get(TaskerConfig.TASK_EX)
-        l.debug(f'Saving {res.tid}')
-        return self.__conn.set(key, res, ex=ex)
+            res = True
+        if finished:
+            self._unclaim(task_id)  # identical calls are not attached to it anymore
+            self.__wake(task_id)
+        return res
+
+    def __store(self, writes: list) -> bool:
+        """
+        Writes task records in one pipeline; Finished tasks get result expiry and are announced
+        :param writes: list of (task id, changes, True if record is new and is to be indexed)
+        """
+        path = self.config.get(TaskerConfig.TASK_PATH)
+        task_ex, result_ex = self.config.get(TaskerConfig.TASK_EX), self.config.get(TaskerConfig.TASK_RESULT_EX)
+        index = dict()
+        finished = []
+        expiries = []  # positions of expire replies: False if record is gone, hset replies count new fields only
+        with self.__conn.pipeline() as pipe:
+            queued = 0
+            for task_id, changes, new in writes:
+                key = '.'.join((path, task_id))
+                if changes.get('st') in Tasker.TaskResultWrapper.FINISHED:
+                    ex = result_ex
+                    finished.append(task_id)
+                else:
+                    ex = task_ex if new else None
+                pipe.hset(key, changes)
+                queued += 1
+                if ex is not None:
+                    pipe.expire(key, ex)
+                    expiries.append(queued)
+                    queued += 1
+                if new:
+                    index[task_id] = changes['created']
+            if index and self.__indexing:
+                pipe.zadd(self.config.get(TaskerConfig.TASK_INDEX), index)
+                # records expire by themselves; Index is by creation, a record lives task_ex from then at most,
+                # result_ex more once it's finished, so only entries older than both are trimmed as new ones come
+                pipe.zremrangebyscore(self.config.get(TaskerConfig.TASK_INDEX), 0, time.time() - task_ex - result_ex)
+            for task_id in finished if self.__notifying else []:
+                pipe.publish(self.config.get(TaskerConfig.TASK_CHANNEL), task_id)  # wakes waiters on every node
+            replies = pipe.execute()
+        res = all(replies[i] for i in expiries)
+        for task_id in finished:  # stored for good, storage is authoritative from now on
+            local = self.__local.get(task_id)
+            if local is not None and local.finished:
+                del self.__local[task_id]
+        return res
+
+    def __defer(self, task_id, changes: dict, new: bool) -> bool:
+        """
+        Queues a write for the flusher, merged with writes of the same task not flushed yet
+        """
+        with self.__pending_lock:
+            pending = self.__pending.get(task_id)
+            if pending is None:
+                self.__pending[task_id] = [dict(changes), new]
+            else:
+                pending[0].update(changes)
+                pending[1] = pending[1] or new
+            if self.__flusher is None:
+                self.__flusher = threading.Thread(target=self.__flush_loop, name=f'{Conductor.ORCHESTRATION}-flusher',
+                                                  daemon=True)
+                self.__flusher.start()
+        return True
+
+    def flush(self) -> int:
+        """
+        Writes queued task changes right away
+        :return: number of tasks written
+        """
+        with self.__pending_lock:
+            pending, self.__pending = self.__pending, dict()
+        if pending:
+            self.__store([(task_id, changes, new) for task_id, (changes, new) in pending.items()])
+        return pending.__len__()
+
+    def __flush_loop(self):
+        while not self.__flushing_stopped.wait(self.config.get(TaskerConfig.FLUSH_INTERVAL)):
+            try:
+                self.flush()
+            except Exception as e:  # writes are lost, but tasks keep running
+                l.error(f'Failed to flush task records: {e}')
+
+    def __wake(self, task_id=None):
+        """
+        Wakes threads waiting for task_id, or all of them if None (notifications might have been lost)
+        """
+        with self.__waiters_lock:
+            if task_id is None:
+                events = [event for waiting in self.__waiters.values() for event in waiting]
+            else:
+                events = list(self.__waiters.get(task_id, []))
+        for event in events:
+            event.set()
+        context = self.__running.get(task_id)
+        if context is not None and not context.cancelled:  # finished elsewhere while running here - cancelled
+            task = self.load(task_id, result=False, stored=True)
+            if task is not None and task.st == Tasker.TaskResultWrapper.CANCELLED:
+                context.cancel()
+
+    def _subscribe(self):
+        if not self.__notifying:  # waiters poll the storage every TASK_SYNC_REFRESH_RATE instead
+            return None
+        with self.__subscription_lock:
+            if self.__subscription is None:
+                self.__subscription = self.__conn.subscribe(self.config.get(TaskerConfig.TASK_CHANNEL), self.__wake)
+        return self.__subscription
+
+    def wait_task(self, task_id: str, timeout: float = None, result: bool = True):
+        if timeout is None:
+            timeout = self.config.get(TaskerConfig.TASK_SYNC_TIMEOUT)
+        deadline = time.time() + timeout
+        while True:
+            task = self.wait_any([task_id], timeout=max(deadline - time.time(), 0))[task_id]
+            if task is None or task.finished or time.time() >= deadline:
+                break
+        if task is None or not result:
+            return task
+        return self.load(task_id)
+
+    def wait_any(self, task_ids: list, timeout: float = None, event: threading.Event = None) -> dict:
+        """
+        Blocks until any of the tasks is finished or a completion notification comes
+        :param timeout: seconds to wait at most, None for TaskerConfig.TASK_SYNC_TIMEOUT
+        :param event: threading.Event to be woken by as well, e.g. on cancellation
+        :return: dict of task id to it's status only TaskResultWrapper or None
+        """
+        if timeout is None:
+            timeout = self.config.get(TaskerConfig.TASK_SYNC_TIMEOUT)
+        self._subscribe()
+        event = event or threading.Event()
+        with self.__waiters_lock:  # registered before the first check, so completion in between is not missed
+            for task_id in task_ids:
+                self.__waiters.setdefault(task_id, set()).add(event)
+        deadline = time.time() + timeout
+        try:
+            tasks = {task_id: self.load(task_id, result=False) for task_id in task_ids}
+            while not any(task is None or task.finished for task in tasks.values()):
+                left = deadline - time.time()
+                if left <= 0:
+                    break
+                woken = event.wait(min(left, self.config.get(TaskerConfig.TASK_SYNC_REFRESH_RATE)))
+                tasks = {task_id: self.load(task_id, result=False) for task_id in task_ids}
+                if woken:
+                    break
+        finally:
+            with self.__waiters_lock:
+                for task_id in task_ids:
+                    waiting = self.__waiters[task_id]
+                    waiting.discard(event)
+                    if not waiting:
+                        del self.__waiters[task_id]
+        return tasks
 
-    def load(self, task_id) -> Tasker.TaskResultWrapper:
+    def __workflow_order(self, nodes: dict) -> list:
+        """
+        Checks workflow nodes
+        :return: node names, upstream nodes first
+        :raises InvalidTaskArguments: on unknown tasks or nodes and on cycles
+        """
+        if not isinstance(nodes, dict) or not nodes:
+            raise InvalidTaskArguments('Workflow nodes should be a dict of node name to node')
+        upstream = dict()
+        for node, spec in nodes.items():
+            if not isinstance(spec, dict) or spec.get('task') not in self.tasks or spec['task'] == self.WORKFLOW:
+                raise InvalidTaskArguments(f'Workflow node {node} should have a registered task')
+            upstream[node] = self.__upstream(spec)
+            missing = [u for u in upstream[node] if u not in nodes]
+            if missing:
+                raise InvalidTaskArguments(f'Workflow node {node} depends on unknown nodes {missing}')
+        order = []
+        while upstream.__len__() > order.__len__():
+            ready = [n for n in upstream if n not in order and all(u in order for u in upstream[n])]
+            if not ready:
+                raise InvalidTaskArguments(f'Workflow nodes {[n for n in upstream if n not in order]} form a cycle')
+            order.extend(ready)
+        return order
+
+    @staticmethod
+    def __upstream(spec: dict) -> list:
+        upstream = list(spec.get('after') or []) + list((spec.get('inputs') or dict()).values())
+        if spec.get('when') is not None:
+            upstream.append(spec['when'])
+        return upstream
+
+    def run_workflow(self, nodes: dict, blocking=False, timeout: float = None) -> Tasker.TaskResultWrapper:
+        l.info(f'Got a workflow of {nodes.__len__() if isinstance(nodes, dict) else 0} nodes')
+        self.__workflow_order(nodes)
+        return self.run_task(self.WORKFLOW, kwargs={'nodes': nodes}, blocking=blocking, timeout=timeout)
+
+    def _workflow(self, nodes: dict) -> dict:
+        """
+        Body of workflow task: submits nodes whose upstream nodes are done and waits for any of running ones;
+        Task ids of submitted nodes are checkpointed, so a recovered workflow picks up where it was
+        :return: dict of node name to {'id': task id, 'st': status}
+        :raises WorkflowFailed: if any node failed, after the rest of the nodes that could run are finished
+        """
+        order = self.__workflow_order(nodes)
+        context = Tasker.TaskContext.current()
+        ids = dict(context.state or dict())  # node -> task id
+        finished = dict()  # node -> TaskResultWrapper
+        skipped = set()
+        woken = threading.Event()
+        context.on_cancel(woken.set)
+        try:
+            while True:
+                submitted = False
+                backoff = None  # seconds until nodes not admitted are tried again
+                for node in order:  # upstream nodes first, so skips propagate in one pass
+                    if node in ids or node in skipped or node in finished:
+                        continue
+                    spec = nodes[node]
+                    upstream = self.__upstream(spec)
+                    if any(u not in finished and u not in skipped for u in upstream):
+                        continue
+                    if any(u in skipped or finished[u].st != Tasker.TaskResultWrapper.DONE for u in upstream) or \
+                            (spec.get('when') is not None and not finished[spec['when']].res):
+                        skipped.add(node)
+                        continue
+                    kwargs = dict(spec.get('kwargs') or dict())
+                    kwargs.update({arg: finished[u].res for arg, u in (spec.get('inputs') or dict()).items()})
+                    try:
+                        ids[node] = self.run_task(spec['task'], kwargs=kwargs, validate=True).tid
+                        submitted = True
+                    except TaskerOverloaded as e:
+                        backoff = e.retry_after if backoff is None else min(backoff, e.retry_after)
+                    except (InvalidTaskArguments, TaskNotFound) as e:
+                        failed = Tasker.TaskResultWrapper(None, task_name=spec['task'], kwargs=kwargs)
+                        failed.error(e)
+                        finished[node] = failed
+                if submitted:
+                    context.checkpoint(dict(ids))
+                running = {ids[node]: node for node in ids if node not in finished}
+                if not running and backoff is None:
+                    break
+                woken.clear()
+                context.check()
+                if not running:
+                    woken.wait(backoff)
+                    continue
+                for task_id, task in self.wait_any(list(running), timeout=backoff, event=woken).items():
+                    if task is None:
+                        task = Tasker.TaskResultWrapper(task_id)
+                        task.error(TaskNotFound(f'Task {task_id} of workflow node {running[task_id]} expired'))
+                        finished[running[task_id]] = task
+                    elif task.finished:
+                        finished[running[task_id]] = self.load(task_id)
+        except TaskCancelled:
+            for node, task_id in ids.items():
+                if node not in finished:
+                    try:
+                        self.kill_task(task_id)
+                    except TaskNotFound:
+                        pass
+            raise
+        summary = {node: {'id': ids.get(node), 'st': finished[node].st if node in finished else self.SKIPPED}
+                   for node in order}
+        failed = [node for node in order if node in finished and finished[node].st != Tasker.TaskResultWrapper.DONE]
+        if failed:
+            raise WorkflowFailed(f'Workflow nodes {failed} failed: {summary}')
+        return summary
+
+    def workflow_status(self, task_id: str) -> dict:
+        task = self.load(task_id)
+        if task is None or task.name != self.WORKFLOW:
+            return None
+        ids = task.state or dict()
+        nodes = dict()
+        for node in (task.kwargs or dict()).get('nodes', dict()):
+            node_task = None if ids.get(node) is None else self.load(ids[node], result=False)
+            if node_task is not None:
+                st = node_task.st
+            else:  # not submitted yet, or never will be
+                st = self.SKIPPED if task.finished else Tasker.TaskResultWrapper.NEW
+            nodes[node] = {'id': ids.get(node), 'st': st}
+        return {'id': task.tid, 'st': task.st, 'created': task.created, 'updated': task.updated,
+                'error': task.res if task.exception else None, 'nodes': nodes}
+
+    def load(self, task_id, result=True, stored=False) -> Tasker.TaskResultWrapper:
+        """
+        :param stored: skip tasks in flight here, read storage even if it is behind
+        """
+        local = None if stored else self.__local.get(task_id)
+        if local is not None:
+            return local
         key = '.'.join((self.config.get(TaskerConfig.TASK_PATH), task_id))
         l.debug(f'Loading {task_id}')
-        return self.__conn.get(key)
+        if result:
+            record = self.__conn.hgetall(key)
+        else:
+            fields = Tasker.TaskResultWrapper.STATUS_FIELDS
+            record = {f: v for f, v in zip(fields, self.__conn.hmget(key, fields)) if v is not None}
+        if not record:
+            return None
+        return Tasker.TaskResultWrapper.from_record(record)
+
+    def delete(self, task_id) -> bool:
+        key = '.'.join((self.config.get(TaskerConfig.TASK_PATH), task_id))
+        l.debug(f'Deleting {task_id}')
+        self.__local.pop(task_id, None)
+        with self.__pending_lock:
+            self.__pending.pop(task_id, None)
+        if self.__indexing:
+            self.__conn.zrem(self.config.get(TaskerConfig.TASK_INDEX), task_id)
+        return self.__conn.delete(key) > 0
+
+    def reindex(self) -> int:
+        """
+        Rebuilds task index from stored task records with a cursor walk; Used when index is missing
+        :return: number of tasks indexed
+        :raises NotPermitted: if connector keeps no indexes
+        """
+        if not self.__indexing:
+            raise NotPermitted(f'{self.__conn.__class__.__name__} keeps no indexes, tasks are listed by a key walk')
+        l.info(f'Rebuilding task index')
+        found = self.__scan()
+        if found:
+            self.__conn.zadd(self.config.get(TaskerConfig.TASK_INDEX), found)
+        self.__indexed = True
+        l.debug(f'Indexed {found.__len__()} tasks')
+        return found.__len__()
 
+    def __scan(self) -> dict:
+        """
+        :return: dict of task id to it's creation time, of every stored task record, by a cursor walk
+        """
+        found = dict()
+        for key in self.__conn.scan_iter('.'.join((self.config.get(TaskerConfig.TASK_PATH), '*'))):
+            try:
+                task_id, created = self.__conn.hmget(key, ['tid', 'created'])
+            except Exception as e:  # records stored before hash layout can't be read, they will expire on their own
+                l.debug(f'Skipping {key}: {e}')
+                continue
+            if task_id is not None:
+                found[task_id] = created
+        return found
 
-    def run_task(self, name, args=[], kwargs={}, blocking=False, validate=False) -> Tasker.TaskResultWrapper:
+    def run_task(self, name, args=[], kwargs={}, blocking=False, validate=False,
+                 timeout: float = None) -> Tasker.TaskResultWrapper:
         # Tasker.TaskWrapper performs argscheck itself, raising InvalidTaskArgument if needed
         l.info(f'Task {name} got a run request')
         tw = self.tasks.get(name)
@@ -89,81 +663,898 @@ class ThreadTasker(Tasker):
             raise TaskNotFound(f'task {name} not found in TaskRegistry')
         if validate:
             tw.validate(args, kwargs)
+        cached = self._from_cache(tw, args, kwargs)
+        if cached is not None:
+            self.save(cached)
+            return cached
         task_id = uuid4().__str__()
         l.debug(f'Designated {task_id} for {tw.name}')
         # using task_name to leave backwards compatibility
         res = Tasker.TaskResultWrapper(task_id, task_name=tw.name, args=args, kwargs=kwargs)
+        res.deadline = self._deadline(tw, timeout)
+        if blocking and res.deadline is None:  # it's run by the caller, who doesn't wait longer than this
+            res.deadline = time.time() + self.config.get(TaskerConfig.TASK_SYNC_TIMEOUT)
+        running = self._coalesce(tw, res) if tw.coalesce else None
+        if running is not None:  # attached to a task already admitted
+            return self.wait_task(running.tid, timeout=timeout) if blocking else running
+        try:
+            if not blocking:  # blocking calls run in the calling thread, they don't wait in a queue
+                self._admit([tw])
+            else:
+                self._admit_abandoned([tw])
+        except TaskerOverloaded:
+            self._unclaim(task_id)
+            raise
         self.save(res)
         if blocking:
             l.debug(f'Running {task_id} with block')
             try:
-                tres = self.__run(task_id, tw, args=args, kwargs=kwargs)
-                res.closed(tres)
-                self.save(res)
+                tres = self.__run(task_id, tw, args=args, kwargs=kwargs, deadline=res.deadline)
+                self.update(task_id, res.closed(tres))
+                return res
+            except TaskCancelled:
+                self.update(task_id, res.cancelled())
+                return res
+            except TaskTimeout as e:
+                self.update(task_id, res.timed_out(e))
                 return res
             except Exception as e:
-                res.error(e)
-                self.save(res)
+                self.update(task_id, res.error(e))
                 return res
         else:
             l.debug(f'Running {task_id} in separate thread')
-            future = self.worker.submit(self.__run, *[task_id, tw], **dict(args=args, kwargs=kwargs))
-
-        # since callback will not fire until added - this fucking works
-        self.registry[future] = task_id
-        future.add_done_callback(self.__done)
+            self._submit([(tw, res)])
         return self.load(task_id)
 
-    def get_task_info(self, task_id: str):
-        return self.load(task_id)
+    def run_tasks(self, calls: list, validate=False) -> list:
+        l.info(f'Got a batch of {calls.__len__()} tasks')
+        entries = []
+        for i, call in enumerate(calls):  # whole batch is checked before anything is stored
+            tw = self.tasks.get(call.get('task'))
+            if tw is None:
+                raise TaskNotFound(f'Entry {i}: task {call.get("task")} not found in TaskRegistry')
+            args, kwargs = call.get('args', []), call.get('kwargs', {})
+            if validate:
+                try:
+                    tw.validate(args, kwargs)
+                except InvalidTaskArguments as e:
+                    raise InvalidTaskArguments(f'Entry {i}: {e.message}')
+            entries.append((tw, args, kwargs, call.get('timeout')))
+        results = []
+        queued = []
+        for tw, args, kwargs, timeout in entries:
+            res = self._from_cache(tw, args, kwargs)
+            if res is None:
+                res = Tasker.TaskResultWrapper(uuid4().__str__(), task_name=tw.name, args=args, kwargs=kwargs)
+                res.deadline = self._deadline(tw, timeout)
+                queued.append((tw, res))
+            results.append(res)
+        self._admit([tw for tw, res in queued])  # a rejected batch leaves nothing stored
+        self.save(*results)
+        self._submit(queued)
+        l.debug(f'Submitted {queued.__len__()} tasks of the batch')
+        return results
+
+    def _submit(self, entries: list):
+        """
+        Hands stored tasks over to the workers
+        :param entries: list of (TaskWrapper, TaskResultWrapper)
+        """
+        for tw, res in entries:
+            with self.__queued_lock:  # so the task is known as waiting before a worker takes it
+                future = self._lane(tw.lane).submit(self.__run, *[res.tid, tw],
+                                                    **dict(args=res.args, kwargs=res.kwargs, state=res.state,
+                                                           deadline=res.deadline, queued=time.time()))
+                self.__queued[res.tid] = (tw, future)
+            # since callback will not fire until added - this fucking works
+            self.registry[future] = res.tid
+            future.add_done_callback(self.__done)
+
+    def _admit(self, tasks: list):
+        """
+        Checks queue depth limits before tasks are stored; Makes room by shedding waiting tasks if
+        TaskerConfig.OVERLOAD is shed
+        :param tasks: list of TaskWrapper about to be submitted
+        :raises TaskerOverloaded: with retry_after estimate, if they don't fit
+        """
+        self._admit_abandoned(tasks)
+        default = self.config.get(TaskerConfig.MAX_QUEUE_DEPTH)
+        lane_limits = self.config.get(TaskerConfig.LANE_QUEUE_DEPTH) or dict()
+        task_limits = self.config.get(TaskerConfig.TASK_QUEUE_DEPTH) or dict()
+        if not default and not lane_limits and not task_limits:
+            return
+        shed = self.config.get(TaskerConfig.OVERLOAD) == self.SHED
+        checks = dict()  # (lane, task name or None for the whole lane) -> [limit, tasks to admit]
+        for tw in tasks:
+            limit = lane_limits.get(tw.lane, default)
+            if limit:
+                checks.setdefault((tw.lane, None), [limit, 0])[1] += 1
+            limit = task_limits.get(tw.name)
+            if limit:
+                checks.setdefault((tw.lane, tw.name), [limit, 0])[1] += 1
+        for (lane, name), (limit, new) in checks.items():
+            over = self._depth(lane, name) + new - limit
+            if over > 0 and shed and new <= limit:
+                over -= self._shed(lane, name, over)
+            if over > 0:
+                retry_after = self.retry_after(lane, over)
+                raise TaskerOverloaded(f'{"Task " + name if name else "Lane " + lane} has more than {limit} tasks '
+                                       f'waiting, retry in {retry_after} seconds', retry_after=retry_after)
+
+    def _admit_abandoned(self, tasks: list):
+        """
+        Abandoned threads can't be stopped, so a lane whose timed out tasks keep running takes no new ones
+        until they are fewer than TaskerConfig.MAX_ABANDONED
+        :raises TaskerOverloaded: with retry_after estimate, if a lane of tasks is over the limit
+        """
+        limit = self.config.get(TaskerConfig.MAX_ABANDONED)
+        if not limit:
+            return
+        for lane in {tw.lane for tw in tasks}:
+            if self.__alive_abandoned(lane) >= limit:
+                retry_after = self.retry_after(lane)
+                raise TaskerOverloaded(f'Lane {lane} has {limit} or more timed out tasks still running, '
+                                       f'retry in {retry_after} seconds', retry_after=retry_after)
+
+    def _depth(self, lane: str, name: str = None) -> int:
+        """
+        :return: number of tasks waiting for a worker in lane, only of task name if given
+        """
+        with self.__queued_lock:
+            return sum(1 for tw, future in self.__queued.values() if (tw.name == name if name else tw.lane == lane))
+
+    def _shed(self, lane: str, name: str, count: int) -> int:
+        """
+        Cancels up to count oldest tasks waiting in lane, only of task name if given
+        :return: number of tasks cancelled
+        """
+        with self.__queued_lock:
+            waiting = [future for tw, future in self.__queued.values()
+                       if (tw.name == name if name else tw.lane == lane)][:count]
+        shed = sum(1 for future in waiting if future.cancel())  # done callback stores them cancelled
+        l.warning(f'Shed {shed} waiting tasks of {name or lane}')
+        return shed
+
+    def retry_after(self, lane: str, excess: int = 1) -> int:
+        """
+        Estimates seconds until excess waiting tasks of lane are taken by workers, from recent run times
+        """
+        average = self.__durations.get(lane, 1)
+        with self.__lanes_lock:
+            workers = self.lanes.get(lane, self.worker)._max_workers
+        return max(1, math.ceil(average * excess / workers))
+
+    def __alive_abandoned(self, lane: str = None) -> int:
+        """
+        :return: number of timed out tasks whose threads are still running, only of lane if given
+        """
+        with self.__queued_lock:
+            for name, threads in list(self.__abandoned.items()):
+                self.__abandoned[name] = {thread for thread in threads if thread.is_alive()}
+            if lane is not None:
+                return self.__abandoned.get(lane, set()).__len__()
+            return sum(threads.__len__() for threads in self.__abandoned.values())
+
+    def __took(self, lane: str, seconds: float):
+        average = self.__durations.get(lane)
+        self.__durations[lane] = seconds if average is None else average * 0.8 + seconds * 0.2
+
+    def get_task_info(self, task_id: str, result: bool = True):
+        return self.load(task_id, result=result)
 
     def get_self_status(self):
         tl = list(self.worker.__dict__['_threads'])
+        with self.__lanes_lock:
+            lanes = dict(self.lanes)
         return {
             'threads_alive': [{t.ident: t.is_alive()} for t in tl],
-            'max_threads': self.worker._max_workers
+            'max_threads': self.worker._max_workers,
+            'lanes': {lane: {
+                'max_threads': pool._max_workers,
+                'threads': pool._threads.__len__(),
+                'queued': pool._work_queue.qsize(),
+                'run_time': self.__durations.get(lane),
+                'active': self.__active.get(lane, 0)
+            } for lane, pool in lanes.items()},
+            'connections': self.__conn.pool_status(),
+            'abandoned_threads': self.__alive_abandoned()
         }
 
+    def get_metrics(self) -> str:
+        with self.__lanes_lock:
+            lanes = dict(self.lanes)
+        return self.metrics.render({lane: {
+            'queue_depth': self._depth(lane),
+            'active_workers': self.__active.get(lane, 0),
+            'max_workers': pool._max_workers
+        } for lane, pool in lanes.items()})
+
     def __done(self, f: Future):
         """
         Thread task callback, saves result and such
         :param f:
         :return:
         """
-        task_id = self.registry[f]
-        del self.registry[f]
-        trw = self.load(task_id)
+        task_id = self.registry.pop(f)
+        with self.__queued_lock:
+            self.__queued.pop(task_id, None)
+        trw = Tasker.TaskResultWrapper(task_id)  # only changed fields are written, no need to load the record
+        if f.cancelled():
+            self.update(task_id, trw.cancelled())
+            return
         exc = f.exception()
-        if exc is not None:
-            trw.error(exc)
+        if isinstance(exc, TaskCancelled):
+            self.update(task_id, trw.cancelled())
+        elif isinstance(exc, TaskTimeout):
+            self.update(task_id, trw.timed_out(exc))
+        elif exc is not None:
+            self.update(task_id, trw.error(exc))
         else:
-            trw.closed(f.result())
-        self.save(trw)
+            self.update(task_id, trw.closed(f.result()))
 
-    def __run(self, tid: str, task: Tasker.TaskWrapper, args=[], kwargs={}):
+    def __run(self, tid: str, task: Tasker.TaskWrapper, args=[], kwargs={}, state=None, deadline=None, queued=None):
         """
         Runs a task, already in a separate thread. Used to set progress status and prepare everything
         :param tid: Task id
         :param task: TaskWrapper
         :param args: Args for stored function; Not used for WEB API
         :param kwargs: Kwargs for stored function
+        :param state: checkpoint to resume from
+        :param deadline: timestamp task is timed out at
+        :param queued: timestamp task was handed to the workers at
         :return:
         """
         l.debug(f'{tid} ran')
-        trw = self.load(tid)
-        trw.started()
-        self.save(trw)
-        return task.run(args, kwargs)  # synchronous for this call
+        with self.__queued_lock:
+            self.__queued.pop(tid, None)
+        self.update(tid, Tasker.TaskResultWrapper(tid).started())
+        # synchronous for this call
+        return self._run(tid, task, args, kwargs, state=state, deadline=deadline, queued=queued)
+
+    def _run(self, tid: str, task: Tasker.TaskWrapper, args, kwargs, state=None, deadline=None, queued=None):
+        """
+        Runs task, recording it's queue wait, run time, result size and outcome in self.metrics
+        :param queued: timestamp task was handed to the workers at, None if it didn't wait in a queue
+        :raises TaskCancelled: if task got cancelled while running, whatever it returned or raised
+        :raises TaskTimeout: if deadline passed before it was done
+        """
+        started = time.time()
+        outcome, res = Tasker.TaskResultWrapper.ERROR, None
+        self.__activity(task.lane, 1)
+        try:
+            res = self.__contained(tid, task, args, kwargs, state, deadline)
+            outcome = Tasker.TaskResultWrapper.DONE
+            return res
+        except TaskCancelled:
+            outcome = Tasker.TaskResultWrapper.CANCELLED
+            raise
+        except TaskTimeout:
+            outcome = Tasker.TaskResultWrapper.TIMEOUT
+            raise
+        finally:
+            self.__activity(task.lane, -1)
+            self.metrics.observe(task.name, outcome, queue_wait=None if queued is None else started - queued,
+                                 run_time=time.time() - started, result=res)
+
+    def __activity(self, lane: str, change: int):
+        with self.__queued_lock:
+            self.__active[lane] = self.__active.get(lane, 0) + change
+
+    def __contained(self, tid: str, task: Tasker.TaskWrapper, args, kwargs, state, deadline):
+        """
+        Runs task body within it's TaskContext, so it can be cancelled, checkpointed and timed out
+        """
+        if deadline is not None and time.time() >= deadline:
+            raise TaskTimeout(f'Task {tid} waited past it\'s deadline')
+        context = Tasker.TaskContext(tid, state=state, saver=lambda st: self.update(tid, {'state': st}),
+                                     deadline=deadline)
+        self.__running[tid] = context
+        started = time.time()
+        try:
+            with context:
+                res = self._run_cached(task, args, kwargs)
+        except Exception as e:
+            if context.cancelled and not isinstance(e, TaskCancelled):
+                raise TaskCancelled(f'Task {tid} was cancelled')
+            if context.expired and not isinstance(e, TaskTimeout):  # e.g. process killed at deadline
+                raise TaskTimeout(f'Task {tid} is past it\'s deadline')
+            raise
+        finally:
+            del self.__running[tid]
+            self.__took(task.lane, time.time() - started)
+        if context.cancelled:
+            raise TaskCancelled(f'Task {tid} was cancelled')
+        return res
+
+    def _execute(self, task: Tasker.TaskWrapper, args, kwargs):
+        """
+        Runs task body; In this tasker it's the calling thread, overridden by taskers running it elsewhere.
+        A thread can't be killed, so task with a deadline runs in a thread of it's own: past the deadline it's
+        abandoned to finish by itself and the worker is free for other tasks. A runner of the lane pool won't do:
+        the abandoned task would hold it for good, and a worker waiting on another worker of a full lane never
+        gets it
+        """
+        context = Tasker.TaskContext.current()
+        if context is None or context.deadline is None:
+            return task.run(args, kwargs)
+        outcome = dict()
+
+        def body():
+            with context:
+                try:
+                    outcome['res'] = task.run(args, kwargs)
+                except BaseException as e:
+                    outcome['exc'] = e
+        runner = threading.Thread(target=body, name=f'{Conductor.ORCHESTRATION}-{context.task_id}', daemon=True)
+        runner.start()
+        runner.join(context.remaining)
+        if runner.is_alive():
+            with self.__queued_lock:
+                self.__abandoned.setdefault(task.lane, set()).add(runner)
+            l.warning(f'Task {context.task_id} is past it\'s deadline, it\'s thread is abandoned')
+            raise TaskTimeout(f'Task {context.task_id} is past it\'s deadline')
+        if 'exc' in outcome:
+            raise outcome['exc']
+        return outcome['res']
+
+    def _deadline(self, task: Tasker.TaskWrapper, timeout: float = None) -> float:
+        """
+        :return: timestamp a task submitted now is timed out at: the shortest of task's timeout, call's timeout
+        and time left to the task submitting it, if any; None if there are none
+        """
+        budgets = [t for t in (task.timeout, timeout) if t is not None]
+        context = Tasker.TaskContext.current()
+        if context is not None and context.deadline is not None:
+            budgets.append(context.remaining)
+        return time.time() + min(budgets) if budgets else None
 
     def kill_task(self, name: str) -> bool:
-        raise NotImplementedError('Impossible with threads')
+        """
+        Queued task is cancelled before it starts; Running thread can't be stopped from outside,
+        so it's context is cancelled for the task to stop itself and whatever it returns is dropped
+        """
+        task = self.load(name, result=False)
+        if task is None:
+            raise TaskNotFound(f'Task {name} not found')
+        if task.finished:
+            return False
+        l.info(f'Cancelling {name}')
+        self._cancel_local(name)
+        self.update(name, task.cancelled())
+        return True
 
-    def list_tasks(self) -> list:
+    def _cancel_local(self, task_id) -> bool:
+        """
+        Cancels task queued or running in this process
+        :return: True if it was found here
+        """
+        future = next((f for f, tid in list(self.registry.items()) if tid == task_id), None)
+        if future is not None and future.cancel():
+            return True
+        context = self.__running.get(task_id)
+        if context is not None:
+            context.cancel()
+            return True
+        return False
+
+    def list_tasks(self, offset: int = 0, limit: int = None, result: bool = False) -> list:
         l.info(f'Got task list request')
-        keys = self.__conn.keys('.'.join((self.config.get(TaskerConfig.TASK_PATH), '*')))
-        l.debug(f'{keys} are keys')
+        if self.durability() == self.BATCHED:
+            self.flush()  # so new tasks are indexed
+        index = self.config.get(TaskerConfig.TASK_INDEX)
+        if self.__indexing and not self.__indexed:
+            if not self.__conn.exists(index):
+                self.reindex()
+            self.__indexed = True  # kept by the writes from now on
+        if limit is not None and limit <= 0:
+            return []
+        if self.__indexing:
+            task_ids = self.__conn.zrange(index, offset, -1 if limit is None else offset + limit - 1)
+        else:  # no index to slice, every record is walked
+            found = self.__scan()
+            task_ids = sorted(found, key=lambda task_id: found[task_id] or 0)[offset:None if limit is None else offset + limit]
+        l.debug(f'{task_ids} are indexed tasks')
+        path = self.config.get(TaskerConfig.TASK_PATH)
+        fields = Tasker.TaskResultWrapper.STATUS_FIELDS
+        with self.__conn.pipeline(transaction=False) as pipe:
+            for task_id in task_ids:
+                if result:
+                    pipe.hgetall('.'.join((path, task_id)))
+                else:
+                    pipe.hmget('.'.join((path, task_id)), fields)
+            records = pipe.execute()
         tasks = []
-        for key in keys:
-            k = key.split('.')[-1]
-            tasks.append(self.load(k))
-        return tasks
\ No newline at end of file
+        expired = []
+        for task_id, record in zip(task_ids, records):
+            if not result:
+                record = {f: v for f, v in zip(fields, record) if v is not None}
+            if not record:
+                expired.append(task_id)
+                continue
+            local = self.__local.get(task_id)
+            tasks.append(Tasker.TaskResultWrapper.from_record(record) if local is None else local)
+        if expired and self.__indexing:
+            self.__conn.zrem(index, *expired)
+        if limit is None:  # tasks in flight are not stored with durability on completion
+            listed = set(task_ids)
+            tasks.extend(task for tid, task in list(self.__local.items()) if tid not in listed)
+        return tasks
+
+
+def process_worker(conn, tasks):
+    """
+    Worker process loop: receives (task name, args, kwargs, deadline), runs the registered task's function within
+    a TaskContext with the deadline and sends back (ok, result); Execute hooks are run by the tasker
+    :param conn: multiprocessing connection to the tasker
+    :param tasks: dict of task name to Tasker.TaskWrapper
+    """
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        name, args, kwargs, deadline = message
+        try:
+            with Tasker.TaskContext(None, deadline=deadline):
+                res = (True, tasks[name].f(*args, **kwargs))
+        except Exception as e:
+            res = (False, e)
+        try:
+            conn.send(res)
+        except Exception as e:  # result or exception can't be pickled
+            conn.send((False, BorkedException(f'Task {name} result could not be sent back: {e}')))
+    conn.close()
+
+
+def log_handlers() -> list:
+    """
+    :return: handlers of all loggers, in a stable order
+    """
+    loggers = [logging.getLogger()] + [logger for logger in logging.Logger.manager.loggerDict.values()
+                                       if isinstance(logger, logging.Logger)]
+    return sorted({handler for logger in loggers for handler in logger.handlers}, key=id)
+
+
+class WorkerProcess:
+    """
+    Child process of ProcessTasker; Runs one task at a time, dispatched by registered name
+    """
+    def __init__(self, context, tasks: dict, generation: int, max_tasks: int = 0):
+        self.__conn, child = context.Pipe()
+        self.process = context.Process(target=process_worker, args=(child, tasks), daemon=True,
+                                       name=f'{Conductor.ORCHESTRATION}-worker')
+        # a thread forked in the middle of writing a log line leaves the stream locked for good in the child
+        handlers = log_handlers()
+        for handler in handlers:
+            handler.acquire()
+        try:
+            self.process.start()
+        finally:
+            for handler in handlers:
+                handler.release()
+        child.close()
+        self.generation = generation
+        self.max_tasks = max_tasks
+        self.done = 0
+        self.dead = False  # set once killed, the process may still look alive for a moment after
+        self.resident = []  # affinity keys of tasks run by this worker, most recent first
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def usable(self, generation):
+        return not self.dead and self.process.is_alive() and self.generation == generation and \
+            (not self.max_tasks or self.done < self.max_tasks)
+
+    def run(self, name, args, kwargs, deadline=None):
+        """
+        :raises TaskTimeout: if the task is not done by deadline, worker is killed then
+        """
+        try:
+            self.__conn.send((name, args, kwargs, deadline))
+        except OSError:
+            self.dead = True
+            raise BorkedException(f'Worker process {self.pid} is gone, could not hand it {name}')
+        try:
+            if deadline is not None and not self.__conn.poll(max(deadline - time.time(), 0)):
+                self.kill()
+                raise TaskTimeout(f'Task {name} is past it\'s deadline, worker process {self.pid} killed')
+            ok, res = self.__conn.recv()
+        except (EOFError, OSError):
+            self.dead = True
+            raise BorkedException(f'Worker process {self.pid} died while running {name}')
+        finally:
+            self.done += 1
+        if not ok:
+            raise res
+        return res
+
+    def warm(self, key, keep: int):
+        """
+        Remembers key as loaded in this worker, forgetting the least recent ones over keep
+        """
+        if key is None:
+            return
+        self.resident = [key] + [k for k in self.resident if k != key][:max(keep - 1, 0)]
+
+    def kill(self):
+        self.dead = True
+        self.process.terminate()
+        self.process.join()
+
+    def stop(self, timeout=5):
+        try:
+            self.__conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.__conn.close()
+
+
+class ProcessTasker(ThreadTasker, Tasker):
+    """
+    Runs task bodies in worker processes, so CPU-bound tasks don't share the GIL;
+    Pool threads of ThreadTasker dispatch tasks by name to idle workers and save results through the connector.
+    Workers are replaced after TaskerConfig.WORKER_MAX_TASKS tasks and whenever a task is registered.
+    A task registered with affinity goes to an idle worker that ran the same key (e.g. has the model loaded),
+    otherwise to the idle worker with the fewest keys, so warm workers are kept for their keys.
+    """
+    name = TaskEnvironment.PROCESS.cls
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('tasks', TaskEnvironment.PROCESS.conf.get('tasks', dict()))
+        kwargs.setdefault('lanes', TaskEnvironment.PROCESS.conf.get('lanes', dict()))
+        start_method = kwargs.pop('start_method', TaskEnvironment.PROCESS.conf.get('start_method', 'fork'))
+        self.__context = multiprocessing.get_context(start_method)
+        self.__lock = threading.Lock()
+        self.__idle = []
+        self.__workers = set()
+        self.__generation = 0
+        self.__affinity = dict(warm=0, cold=0)  # runs of tasks with affinity by whether a warm worker was free
+        super(ProcessTasker, self).__init__(**kwargs)
+
+    def register_task(self, name: str, func: types.FunctionType, lane: str = None, max_concurrency: int = None,
+                      cache_ttl: int = None, cache_version: types.FunctionType = None, coalesce: bool = False,
+                      recovery: str = None, max_attempts: int = None, timeout: float = None,
+                      affinity: types.FunctionType = None) -> bool:
+        res = super(ProcessTasker, self).register_task(name, func, lane=lane, max_concurrency=max_concurrency,
+                                                       cache_ttl=cache_ttl, cache_version=cache_version,
+                                                       coalesce=coalesce, recovery=recovery, max_attempts=max_attempts,
+                                                       timeout=timeout, affinity=affinity)
+        self.__generation += 1  # running workers don't know the new task
+        return res
+
+    def add_pre(self, name, fn):
+        res = super(ProcessTasker, self).add_pre(name, fn)
+        self.__generation += 1
+        return res
+
+    def add_post(self, name, fn):
+        res = super(ProcessTasker, self).add_post(name, fn)
+        self.__generation += 1
+        return res
+
+    def __acquire(self, key=None) -> WorkerProcess:
+        """
+        :param key: affinity key of the task, None to take the most recently released worker
+        """
+        with self.__lock:
+            for worker in [w for w in self.__idle if not w.usable(self.__generation)]:
+                self.__idle.remove(worker)
+                self.__workers.discard(worker)
+                worker.stop()
+            if key is not None:
+                warm = [w for w in self.__idle if key in w.resident]
+                self.__affinity['warm' if warm else 'cold'] += 1
+                if warm:
+                    self.__idle.remove(warm[-1])
+                    return warm[-1]
+                if self.__idle:
+                    worker = min(reversed(self.__idle), key=lambda w: w.resident.__len__())
+                    self.__idle.remove(worker)
+                    return worker
+            elif self.__idle:
+                return self.__idle.pop()
+            worker = WorkerProcess(self.__context, self.tasks, self.__generation,
+                                   max_tasks=self.config.get(TaskerConfig.WORKER_MAX_TASKS))
+            self.__workers.add(worker)
+            l.debug(f'Started worker process {worker.pid}')
+            return worker
+
+    def __release(self, worker: WorkerProcess):
+        with self.__lock:
+            if worker.usable(self.__generation):
+                self.__idle.append(worker)
+                return
+            self.__workers.discard(worker)
+        l.debug(f'Recycling worker process {worker.pid} after {worker.done} tasks')
+        worker.stop()
+
+    def _execute(self, task: Tasker.TaskWrapper, args, kwargs):
+        if task.name == self.WORKFLOW:  # submits and waits for other tasks, so it stays with this tasker
+            return super(ProcessTasker, self)._execute(task, args, kwargs)
+        key = self.__affinity_key(task, args, kwargs)
+        worker = self.__acquire(key)
+        context = Tasker.TaskContext.current()
+        if context is not None:
+            context.on_cancel(worker.kill)  # process can be stopped right away, unlike a thread
+        try:
+            # hooks run here, so they see state of this process (e.g. memory storage) and ones added after the fork
+            task.pre_execute(task.name, args, kwargs, None)
+            res = worker.run(task.name, args, kwargs, deadline=None if context is None else context.deadline)
+            worker.warm(key, self.config.get(TaskerConfig.WORKER_AFFINITY_KEYS))
+            task.post_execute(task.name, args, kwargs, res)
+            return res
+        finally:
+            if context is not None:  # a late kill_task must not hit the next task of this worker
+                context.off_cancel(worker.kill)
+            self.__release(worker)
+
+    @staticmethod
+    def __affinity_key(task: Tasker.TaskWrapper, args, kwargs):
+        if task.affinity is None:
+            return None
+        try:
+            return task.affinity(*args, **kwargs)
+        except Exception as e:
+            l.warning(f'No affinity key for {task.name}, it runs on any worker: {e}')
+            return None
+
+    def get_self_status(self):
+        status = super(ProcessTasker, self).get_self_status()
+        with self.__lock:
+            workers = list(self.__workers)
+            idle = self.__idle.__len__()
+        status['processes'] = [{w.pid: {'alive': w.process.is_alive(), 'tasks_done': w.done, 'resident': w.resident}}
+                               for w in workers]
+        status['idle_processes'] = idle
+        status['affinity'] = dict(self.__affinity)
+        return status
+
+    def graceful_shutdown(self):
+        with self.__lock:
+            workers, self.__workers, self.__idle = list(self.__workers), set(), []
+        for worker in workers:
+            worker.stop()
+        super(ProcessTasker, self).graceful_shutdown()
+
+
+class QueueTasker(ThreadTasker, Tasker):
+    """
+    Shares one work queue in the connector between any number of nodes, so API and worker containers scale apart;
+    run_task only stores the record and pushes task id, consumer threads of any node with the task registered run it.
+    Every lane has it's own queue, consumed by the threads of lane's pool.
+    A taken task id is moved atomically into node's processing list and removed from it once the result is saved;
+    Processing lists of nodes that stopped sending heartbeats are pushed back to the queue by the other nodes.
+    """
+    name = TaskEnvironment.QUEUE.cls
+    local_registry = False  # tasks are run and looked up by other nodes, storage is written synchronously
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('tasks', TaskEnvironment.QUEUE.conf.get('tasks', dict()))
+        kwargs.setdefault('lanes', TaskEnvironment.QUEUE.conf.get('lanes', dict()))
+        consumers = kwargs.pop('consumers', TaskEnvironment.QUEUE.conf.get('consumers', None))
+        self.__conn = kwargs.get('connector') or TaskEnvironment.QUEUE.conf.get('connector') or Connector()
+        if not isinstance(self.__conn, QueueConnector) or not isinstance(self.__conn, PubSubConnector):
+            raise NotPermitted(f'Queue tasker needs a connector with queues and pub/sub, '
+                               f'{self.__conn.__class__.__name__} has not')
+        kwargs['connector'] = self.__conn
+        self.node = uuid4().__str__()
+        self.__stopped = threading.Event()
+        self.__consuming = None  # pools consumers were started in, set once the node is ready to consume
+        super(QueueTasker, self).__init__(**kwargs)
+        self.recover()
+        self.__heartbeat = '.'.join((self.config.get(TaskerConfig.TASK_QUEUE), 'nodes', self.node))
+        if consumers == 0:
+            l.info(f'Queue node {self.node} started without consumers')
+            return
+        self.__consuming = set()
+        self._subscribe()  # cancellations of tasks running here come as notifications
+        self.__beat()
+        threading.Thread(target=self.__supervise, name=f'{Conductor.ORCHESTRATION}-heartbeat', daemon=True).start()
+        self._lane(Tasker.DEFAULT_LANE, consumers)
+        for lane in list(self.lanes):
+            self._lane(lane)
+        l.info(f'Queue node {self.node} started consuming {list(self.lanes)} lanes')
+
+    def _lane(self, lane: str, max_concurrency: int = None):
+        pool = super(QueueTasker, self)._lane(lane, max_concurrency)
+        if self.__consuming is not None and pool not in self.__consuming:
+            self.__consuming.add(pool)
+            for _ in range(pool._max_workers):  # every thread of the pool is a consumer
+                pool.submit(self.__consume, lane, pool)
+        return pool
+
+    def _queue(self, lane: str) -> str:
+        """
+        :return: connector key of the lane queue
+        """
+        queue = self.config.get(TaskerConfig.TASK_QUEUE)
+        return queue if lane == Tasker.DEFAULT_LANE else '.'.join((queue, 'lane', lane))
+
+    def _processing(self, lane: str, node: str) -> str:
+        return '.'.join((self.config.get(TaskerConfig.TASK_QUEUE), 'processing', lane, node))
+
+    def recover(self) -> dict:
+        """
+        Unfinished tasks may be running on other nodes, so only tasks taken by dead nodes are requeued;
+        Queue keeps their order and recovery policy is applied by the node taking a task in progress.
+        Runs on start and with every heartbeat, as new tasks never leave the queue
+        :return: dict of requeued task id to it's status
+        """
+        return {task_id: Tasker.TaskResultWrapper.PROGRESS for task_id in self.requeue_orphans()}
+
+    def requeue_orphans(self) -> list:
+        """
+        Pushes tasks taken by nodes without a heartbeat back to the queue
+        :return: ids of requeued tasks
+        """
+        queue = self.config.get(TaskerConfig.TASK_QUEUE)
+        prefix = '.'.join((queue, 'processing', ''))
+        moved = []
+        for processing in self.__conn.scan_iter(prefix + '*'):
+            lane, node = processing[prefix.__len__():].rsplit('.', 1)
+            if self.__conn.exists('.'.join((queue, 'nodes', node))):
+                continue
+            while True:
+                task_id = self.__conn.rpoplpush(processing, self._queue(lane))
+                if task_id is None:
+                    break
+                moved.append(task_id)
+        if moved:
+            l.warning(f'Requeued {moved.__len__()} tasks of dead nodes')
+        return moved
+
+    def __beat(self):
+        self.__conn.set(self.__heartbeat, time.time(), ex=self.config.get(TaskerConfig.QUEUE_HEARTBEAT_EX))
+
+    def __supervise(self):
+        while not self.__stopped.wait(self.config.get(TaskerConfig.QUEUE_HEARTBEAT_EX) / 3):
+            try:
+                self.__beat()
+                self.requeue_orphans()
+            except Exception as e:
+                l.error(f'Queue node {self.node} heartbeat failed: {e}')
+
+    def __consume(self, lane, pool):
+        processing = self._processing(lane, self.node)
+        while not self.__stopped.is_set() and self.lanes.get(lane) is pool:  # pool replaced on lane resize
+            try:
+                task_id = self.__conn.brpoplpush(self._queue(lane), processing, timeout=1)
+            except Exception as e:
+                l.error(f'Queue node {self.node} failed to take a task: {e}')
+                self.__stopped.wait(1)
+                continue
+            if task_id is None:
+                continue
+            try:
+                self.__process(task_id)
+            except Exception as e:  # result could not be saved, task stays taken and is requeued if node dies
+                l.error(f'Failed to process {task_id}: {e}')
+                continue
+            self.__conn.lrem(processing, 1, task_id)
+
+    def __process(self, task_id):
+        trw = self.load(task_id)
+        if trw is None:
+            l.warning(f'Task {task_id} expired in queue')
+            return
+        if trw.finished:  # requeued after the result was saved, but before it was acknowledged
+            return
+        tw = self.tasks.get(trw.name)
+        if tw is None:
+            self.update(task_id, trw.error(TaskNotFound(f'task {trw.name} not found in TaskRegistry of {self.node}')))
+            return
+        if trw.st == Tasker.TaskResultWrapper.PROGRESS:  # requeued from a dead node
+            self.update(task_id, self._recovery(tw, trw))
+            if trw.finished:
+                return
+        l.debug(f'{task_id} taken by {self.node}')
+        self.update(task_id, trw.started())
+        try:
+            res = trw.closed(self._run(task_id, tw, trw.args, trw.kwargs, state=trw.state, deadline=trw.deadline,
+                                       queued=trw.created))
+        except TaskCancelled:
+            res = trw.cancelled()
+        except TaskTimeout as e:
+            res = trw.timed_out(e)
+        except Exception as e:
+            res = trw.error(e)
+        self.update(task_id, res)
+
+    def run_task(self, name, args=[], kwargs={}, blocking=False, validate=False,
+                 timeout: float = None) -> Tasker.TaskResultWrapper:
+        l.info(f'Task {name} got a run request')
+        tw = self.tasks.get(name)
+        if tw is None:
+            raise TaskNotFound(f'task {name} not found in TaskRegistry')
+        if validate:
+            tw.validate(args, kwargs)
+        cached = self._from_cache(tw, args, kwargs)
+        if cached is not None:
+            self.save(cached)
+            return cached
+        res = Tasker.TaskResultWrapper(uuid4().__str__(), task_name=tw.name, args=args, kwargs=kwargs)
+        res.deadline = self._deadline(tw, timeout)
+        running = self._coalesce(tw, res) if tw.coalesce else None
+        if running is not None:  # attached to a task already admitted
+            return self.wait_task(running.tid, timeout=timeout) if blocking else running
+        try:
+            self._admit([tw])
+        except TaskerOverloaded:
+            self._unclaim(res.tid)
+            raise
+        self.save(res)
+        self._submit([(tw, res)])
+        l.debug(f'Queued {res.tid} for {tw.name}')
+        if blocking:  # any node may run it, caller waits up to it's timeout or TASK_SYNC_TIMEOUT
+            return self.wait_task(res.tid, timeout=timeout)
+        return res
+
+    def kill_task(self, name: str) -> bool:
+        """
+        Task is taken off it's lane queue; When it's running on another node, that node cancels it
+        once notified of CANCELLED status
+        """
+        task = self.load(name, result=False)
+        if task is None:
+            raise TaskNotFound(f'Task {name} not found')
+        if task.finished:
+            return False
+        l.info(f'Cancelling {name}')
+        tw = self.tasks.get(task.name)
+        if tw is not None:
+            self.__conn.lrem(self._queue(tw.lane), 0, name)
+        self.update(name, task.cancelled())
+        self._cancel_local(name)
+        return True
+
+    def _submit(self, entries: list):
+        with self.__conn.pipeline(transaction=False) as pipe:
+            for tw, res in entries:
+                pipe.lpush(self._queue(tw.lane), res.tid)
+            pipe.execute()
+
+    def _depth(self, lane: str, name: str = None) -> int:
+        """
+        :return: length of the lane queue shared by all nodes
+        :raises NotPermitted: for a task name, waiting tasks are not counted by name here
+        """
+        if name:
+            raise NotPermitted(f'Task {name} has {TaskerConfig.TASK_QUEUE_DEPTH.namespace} set, the queue tasker '
+                               f'only bounds lanes; Use {TaskerConfig.LANE_QUEUE_DEPTH.namespace} instead')
+        return self.__conn.llen(self._queue(lane))
+
+    def _shed(self, lane: str, name: str, count: int) -> int:
+        queue = self._queue(lane)
+        shed = 0
+        for task_id in reversed(self.__conn.lrange(queue, -count, -1)):  # oldest are taken from the right
+            if self.__conn.lrem(queue, 1, task_id):  # not taken by a consumer meanwhile
+                self.update(task_id, Tasker.TaskResultWrapper(task_id).cancelled())
+                shed += 1
+        l.warning(f'Shed {shed} waiting tasks of {lane}')
+        return shed
+
+    def get_self_status(self):
+        status = super(QueueTasker, self).get_self_status()
+        status['queue'] = {
+            'node': self.node,
+            'consuming': self.__consuming is not None,
+            'lanes': {lane: {
+                'depth': self.__conn.llen(self._queue(lane)),
+                'processing': self.__conn.llen(self._processing(lane, self.node))
+            } for lane in list(self.lanes)}
+        }
+        return status
+
+    def graceful_shutdown(self):
+        # tasks still running are not acknowledged, they are requeued once heartbeat of this node expires
+        self.__stopped.set()
+        for pool in list(self.lanes.values()):
+            pool.shutdown(wait=False)
+        super(QueueTasker, self).graceful_shutdown()
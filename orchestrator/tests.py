@@ -1,12 +1,16 @@
 import unittest
 
+import os
+import threading
 import time
 
 from . import Conductor, Connector, ConfigLoader, Api, Tasker
 from . import StorageEnvironment, ConfigEnvironment, ApiEnvironment, TaskEnvironment
 from .config_loader import BaseConfig
+from .config import TaskerConfig
 Conductor.STORAGE = StorageEnvironment.REDIS
 Conductor.STORAGE.conf['db'] = 13
+StorageEnvironment.MEMORY.conf['db'] = 13  # orc_storage_env=memory runs the suite without a redis server
 Conductor.CONFIG = ConfigEnvironment.PERSISTENT
 Conductor.API = ApiEnvironment.WEB_FLASK
 Conductor.API.conf['port'] = 80
@@ -42,6 +46,182 @@ class ConnectorTest(unittest.TestCase):
         self.connector.delete('test_del')
         self.assertEqual(self.connector.get('test_del'), None)
 
+    def test_mget_mset(self):
+        self.assertTrue(self.connector.mset({'m1': [1], 'm2': {'two': 2}}))
+        self.assertEqual(self.connector.mget(['m1', 'missing', 'm2']), [[1], None, {'two': 2}])
+        self.connector.mset({'m3': 3}, ex=100)
+        self.assertEqual(self.connector.get('m3'), 3)
+
+    def test_pipeline(self):
+        with self.connector.pipeline() as pipe:
+            pipe.set('p1', (1, 2)).sadd('pidx', 'p1')
+            pipe.get('p1').smembers('pidx')
+            res = pipe.execute()
+        self.assertEqual(res[2:], [(1, 2), {'p1'}])
+
+    def test_hash(self):
+        self.connector.hset('h', {'st': 'new', 'res': [1, 2]})
+        self.connector.hset('h', {'st': 'done'})
+        self.assertEqual(self.connector.hmget('h', ['st', 'missing']), ['done', None])
+        self.assertEqual(self.connector.hgetall('h'), {'st': 'done', 'res': [1, 2]})
+        self.assertEqual(self.connector.hgetall('nohash'), {})
+
+    def test_scan_iter(self):
+        self.connector.set('scan.1', '1')
+        self.connector.set('scan.2', '2')
+        self.connector.set('other', '3')
+        self.assertEqual(set(self.connector.scan_iter('scan.*')), {'scan.1', 'scan.2'})
+
+    def test_set_index(self):
+        self.connector.sadd('idx', 'a', 'b')
+        self.connector.srem('idx', 'a')
+        self.assertEqual(self.connector.smembers('idx'), {'b'})
+        self.assertTrue(self.connector.sismember('idx', 'b'))
+        self.assertFalse(self.connector.sismember('idx', 'a'))
+
+    def test_sorted_index(self):
+        self.connector.zadd('zidx', {'second': 2, 'first': 1, 'third': 3})
+        self.assertEqual(self.connector.zrange('zidx'), ['first', 'second', 'third'])
+        self.assertEqual(self.connector.zrange('zidx', 0, 0, desc=True), ['third'])
+        self.connector.zremrangebyscore('zidx', 0, 1)
+        self.connector.zrem('zidx', 'third')
+        self.assertEqual(self.connector.zrange('zidx'), ['second'])
+
+    def test_queue(self):
+        self.assertEqual(self.connector.lpush('queue', 'a', 'b'), 2)
+        self.connector.lpush('queue', 'c')
+        self.assertEqual(self.connector.llen('queue'), 3)
+        self.assertEqual(self.connector.rpoplpush('queue', 'taken'), 'a')
+        self.assertEqual(self.connector.brpoplpush('queue', 'taken', timeout=1), 'b')
+        self.assertEqual(self.connector.lrange('taken'), ['b', 'a'])
+        self.assertEqual(self.connector.lrem('taken', 1, 'a'), 1)
+        self.assertEqual(self.connector.lrange('taken'), ['b'])
+        self.assertEqual(self.connector.rpoplpush('queue', 'taken'), 'c')
+        self.assertIsNone(self.connector.brpoplpush('queue', 'taken', timeout=1))
+
+
+class RedisPoolRegistryTest(unittest.TestCase):
+    def test_shared_pool(self):
+        first = Connector(environment=StorageEnvironment.REDIS, db=14, max_connections=4)
+        second = Connector(environment=StorageEnvironment.REDIS, db=14)
+        other = Connector(environment=StorageEnvironment.REDIS, db=15)
+        self.assertIs(first.connection_pool, second.connection_pool)
+        self.assertIsNot(first.connection_pool, other.connection_pool)
+        self.assertEqual(first.pool_status()['max_connections'], 4)
+        self.assertEqual(first.pool_status()['connectors'], 2)
+        self.assertFalse(first.graceful_shutdown())
+        self.assertTrue(second.graceful_shutdown())
+        other.graceful_shutdown()
+
+    def test_shared_subscription(self):
+        first = Connector(environment=StorageEnvironment.REDIS, db=14)
+        second = Connector(environment=StorageEnvironment.REDIS, db=14)
+        threads = threading.active_count()
+        subscriptions = [connector.subscribe('test.shared', lambda message: None) for connector in (first, second)]
+        self.assertEqual(threading.active_count(), threads + 1)  # one listener for the pool
+        for subscription in subscriptions:
+            subscription.stop()
+        first.graceful_shutdown()
+        second.graceful_shutdown()
+
+
+from .connectors import MemoryStore
+
+
+class MemoryConnectorTest(unittest.TestCase):
+    def setUp(self):
+        self.connector = Connector(environment=StorageEnvironment.MEMORY, db='memory_test', expire_interval=0.05)
+        self.connector.flushdb()
+
+    def test_shared_keyspace(self):
+        self.connector.set('shared', {'a': 1})
+        other = Connector(environment=StorageEnvironment.MEMORY, db='memory_test')
+        self.assertEqual(other.get('shared'), {'a': 1})
+
+    def test_copy_on_set(self):
+        value = [1, 2]
+        self.connector.set('copied', value)
+        value.append(3)
+        self.assertEqual(self.connector.get('copied'), [1, 2])
+
+    def test_expire(self):
+        self.connector.set('lazy', 1, ex=0.05)
+        self.connector.set('active', 1, px=50)
+        time.sleep(0.2)
+        self.assertEqual(self.connector.keys('active'), [])
+        self.assertIsNone(self.connector.get('lazy'))
+
+    def test_nx(self):
+        self.assertTrue(self.connector.set('nx', 1, nx=True))
+        self.assertIsNone(self.connector.set('nx', 2, nx=True))
+        self.assertEqual(self.connector.get('nx'), 1)
+
+    def test_lru_eviction(self):
+        bounded = Connector(environment=StorageEnvironment.MEMORY, db='memory_lru', max_bytes=200, typed=False)
+        bounded.flushdb()
+        bounded.set('old', 'x' * 80)
+        bounded.set('used', 'x' * 80)
+        bounded.get('old')
+        bounded.set('new', 'x' * 80)
+        self.assertEqual(set(bounded.keys()), {'old', 'new'})
+
+    def test_sorted_set(self):
+        self.connector.zadd('zset', {'c': 3, 'a': 1, 'b': 2, 'd': 2})
+        self.connector.zadd('zset', {'c': 0})
+        self.assertEqual(self.connector.zrange('zset'), ['c', 'a', 'b', 'd'])
+        self.assertEqual(self.connector.zrange('zset', 1, 2, desc=True), ['b', 'a'])
+        self.assertEqual(self.connector.zremrangebyscore('zset', 1, 2), 3)
+        self.assertEqual(self.connector.zrange('zset', 0, -1), ['c'])
+
+    def test_collection_size(self):
+        store = MemoryStore.get_store('memory_test')
+        self.connector.sadd('set', 'ab', 'cd')
+        self.connector.lpush('list', 'abc')
+        self.connector.hset('hash', {'f': 'value'})
+        self.assertEqual(store.used_bytes, sum(MemoryStore.size_of(value) for value in store.data.values()))
+        self.connector.srem('set', 'ab', 'cd')
+        self.connector.rpoplpush('list', 'other')
+        self.connector.hset('hash', {'f': 'longer value'})
+        self.assertEqual(store.used_bytes, sum(MemoryStore.size_of(value) for value in store.data.values()))
+        self.assertEqual(set(self.connector.keys()), {'other', 'hash'})
+
+
+from .serializers import Serializer, Codec, Compression
+import pickle
+
+
+class SerializerTest(unittest.TestCase):
+    value = {'res': bytearray(b'x' * 4096), 'args': ['a', 1], 'st': 'done'}
+
+    def test_pickle_compatible(self):
+        self.assertEqual(Serializer().dumps(self.value), pickle.dumps(self.value))
+        self.assertEqual(Serializer(serializer='pickle5').loads(pickle.dumps(self.value)), self.value)
+
+    def test_roundtrip(self):
+        for conf in [dict(serializer='pickle5'), dict(compression='zlib', compress_threshold=1024),
+                     dict(serializer='pickle5', compression='zlib', compress_threshold=0), dict(protocol=5)]:
+            dumped = Serializer(**conf).dumps(self.value)
+            self.assertEqual(Serializer(**conf).loads(dumped), self.value)
+            self.assertEqual(Serializer().loads(dumped), self.value)  # readable with any configuration
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Codec()
+        with self.assertRaises(TypeError):
+            Compression()
+
+    def test_pickle5_writable(self):
+        serializer = Serializer(serializer='pickle5')
+        loaded = serializer.loads(serializer.dumps(pickle.PickleBuffer(bytearray(b'x' * 4096))))
+        self.assertFalse(memoryview(loaded).readonly)
+
+    def test_compress_threshold(self):
+        small = Serializer(compression='zlib', compress_threshold=1 << 20).dumps(self.value)
+        self.assertEqual(small, pickle.dumps(self.value))
+        self.assertLess(Serializer(compression='zlib', compress_threshold=0).dumps(self.value).__len__(),
+                        small.__len__())
+
+
 class TestConfig(BaseConfig):
     INT_KEY = {
         'namespace': 'test.numeric',
@@ -123,6 +303,9 @@ class ConfigLoaderTest(unittest.TestCase):
     def test_list_public(self):
         self.assertEqual(set(self.config.list_public.keys()), {'test.bool'})
 
+    def test_list_config(self):
+        self.assertEqual(self.config.list_config, {'test.bool': True})
+
     def test_set_public(self):
         self.config.set_public('test.bool', False)
         self.assertFalse(self.config.get_public('test.bool'))
@@ -136,11 +319,58 @@ class ConfigLoaderTest(unittest.TestCase):
         self.assertTrue(self.config.check_public('test.bool'))
         self.assertFalse(self.config.check_public('test.str'))
 
-from .errors import NotAFunction, InvalidTaskArguments, TaskNotFound
+    def test_cache_invalidation(self):
+        other = ConfigLoader()
+        self.assertEqual(other.get(TestConfig.INT_KEY), 1)
+        self.config.set(TestConfig.INT_KEY, 7)
+        self.config.set_public('test.bool', False)
+        deadline = time.time() + 5
+        while other.get(TestConfig.INT_KEY) != 7 and time.time() < deadline:
+            time.sleep(0.01)  # redis pub/sub delivers asynchronously
+        self.assertEqual(other.get(TestConfig.INT_KEY), 7)
+        self.config.make_public(TestConfig.TEXT_KEY)
+        while not other.check_public('test.str') and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(other.check_public('test.str'))
+        other.graceful_shutdown()
+
+from .errors import NotAFunction, InvalidTaskArguments, TaskNotFound, TaskerOverloaded, NotPermitted
+from .metrics import result_size, TaskMetrics
 
 def test_function(strict, non_strict='non_strict'):
     return dict(strict=strict, non_strict=non_strict)
 
+def test_sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_resumable(steps):
+    context = Tasker.TaskContext.current()
+    done = context.state or []
+    for step in range(len(done), steps):
+        done = done + [step]
+        context.checkpoint(done)
+    return done
+
+
+def test_remaining(seconds):
+    time.sleep(seconds)
+    return Tasker.TaskContext.current().remaining
+
+
+def test_add(a, b):
+    return a + b
+
+
+def test_cooperative(seconds):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        Tasker.TaskContext.current().check()
+        time.sleep(0.01)
+    return seconds
+
+
 class TaskerTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -148,7 +378,8 @@ class TaskerTest(unittest.TestCase):
         cls.tasker = Tasker()
 
     def test_get_self_status(self):
-        self.assertEqual(set(self.tasker.get_self_status().keys()), {'threads_alive', 'max_threads'})
+        self.assertEqual(set(self.tasker.get_self_status().keys()),
+                         {'threads_alive', 'max_threads', 'lanes', 'connections', 'abandoned_threads'})
 
 
     def test_register_task(self):
@@ -176,6 +407,206 @@ class TaskerTest(unittest.TestCase):
         self.assertEqual(res.ident[0], trw.tid)
         self.assertEqual(self.tasker.get_task_info('notask'), None)
 
+    def test_list_tasks(self):
+        self.tasker.register_task('test_task_list', test_function)
+        first = self.tasker.run_task('test_task_list', args=['strict'], blocking=True)
+        second = self.tasker.run_task('test_task_list', args=['strict'], blocking=True)
+        ids = [t.tid for t in self.tasker.list_tasks()]
+        self.assertLess(ids.index(first.tid), ids.index(second.tid))
+        self.assertEqual(len(self.tasker.list_tasks(limit=1)), 1)
+        self.tasker.delete(second.tid)
+        self.assertNotIn(second.tid, [t.tid for t in self.tasker.list_tasks()])
+
+    def test_lanes(self):
+        self.tasker.register_task('test_task_batch', test_sleep, lane='batch', max_concurrency=1)
+        self.tasker.register_task('test_task_online', test_sleep, lane='online', max_concurrency=2)
+        slow = [self.tasker.run_task('test_task_batch', kwargs={'seconds': 0.5}) for _ in range(2)]
+        self.assertEqual(self.tasker.get_self_status()['lanes']['batch']['queued'], 1)
+        fast = self.tasker.run_task('test_task_online', kwargs={'seconds': 0})
+        self.assertTrue(self.tasker.wait_task(fast.tid, timeout=0.4).finished)  # not queued behind batch lane
+        self.assertFalse(self.tasker.get_task_info(slow[1].tid).finished)
+        self.assertTrue(self.tasker.wait_task(slow[1].tid, timeout=5).finished)
+
+    def test_memoization(self):
+        calls = []
+
+        def test_counted(value):
+            calls.append(value)
+            return value
+
+        version = {'token': 1}
+        self.tasker.register_task('test_task_cached', test_counted, cache_ttl=60,
+                                  cache_version=lambda value: version['token'])
+        first = self.tasker.run_task('test_task_cached', args=['a'], blocking=True)
+        second = self.tasker.run_task('test_task_cached', args=['a'])
+        self.assertNotEqual(first.tid, second.tid)
+        self.assertEqual(second.result, ('a', False))
+        self.assertTrue(self.tasker.get_task_info(second.tid).finished)
+        self.assertEqual(calls, ['a'])
+        self.tasker.run_task('test_task_cached', args=['b'], blocking=True)
+        version['token'] = 2
+        self.tasker.run_task('test_task_cached', args=['a'], blocking=True)
+        self.assertEqual(calls, ['a', 'b', 'a'])
+        self.assertEqual(self.tasker.invalidate_cache('test_task_cached'), 3)
+        self.tasker.run_task('test_task_cached', args=['a'], blocking=True)
+        self.assertEqual(calls, ['a', 'b', 'a', 'a'])
+
+    def test_coalesce(self):
+        self.tasker.register_task('test_task_coalesced', test_sleep, lane='coalesced', max_concurrency=4,
+                                  coalesce=True)
+        first = self.tasker.run_task('test_task_coalesced', kwargs={'seconds': 0.3})
+        attached = [self.tasker.run_task('test_task_coalesced', kwargs={'seconds': 0.3}) for _ in range(3)]
+        other = self.tasker.run_task('test_task_coalesced', kwargs={'seconds': 0.1})
+        self.assertEqual({t.tid for t in attached}, {first.tid})
+        self.assertNotEqual(other.tid, first.tid)
+        self.assertEqual(self.tasker.run_task('test_task_coalesced', kwargs={'seconds': 0.3}, blocking=True).tid,
+                         first.tid)
+        self.assertEqual(self.tasker.get_task_info(first.tid).result, (0.3, False))
+        key = self.tasker.cache_key(self.tasker.tasks['test_task_coalesced'], [], {'seconds': 0.3},
+                                    path=self.tasker.config.get(TaskerConfig.TASK_INFLIGHT))
+        self.assertIsNone(self.conn.get(key))  # cleared once it finished
+        # finished task is not attached to anymore, even if it's key was left behind
+        self.conn.set(key, first.tid)
+        self.assertNotEqual(self.tasker.run_task('test_task_coalesced', kwargs={'seconds': 0.3}).tid, first.tid)
+
+    def test_run_tasks(self):
+        self.tasker.register_task('test_task_batch_run', test_function)
+        calls = [{'task': 'test_task_batch_run', 'args': [i]} for i in range(5)]
+        with self.assertRaises(TaskNotFound):
+            self.tasker.run_tasks(calls + [{'task': 'not_exists'}])
+        with self.assertRaises(InvalidTaskArguments):
+            self.tasker.run_tasks(calls + [{'task': 'test_task_batch_run', 'kwargs': {'non_strict': 1}}], validate=True)
+        trws = self.tasker.run_tasks(calls, validate=True)
+        self.assertEqual(len({trw.tid for trw in trws}), 5)
+        results = [self.tasker.wait_task(trw.tid, timeout=5).result[0]['strict'] for trw in trws]
+        self.assertEqual(results, list(range(5)))
+
+    def test_kill_task(self):
+        self.tasker.register_task('test_task_kill', test_cooperative, lane='kill', max_concurrency=1)
+        running = self.tasker.run_task('test_task_kill', kwargs={'seconds': 5})
+        queued = self.tasker.run_task('test_task_kill', kwargs={'seconds': 5})
+        time.sleep(0.05)
+        self.assertTrue(self.tasker.kill_task(queued.tid))
+        self.assertTrue(self.tasker.kill_task(running.tid))
+        self.assertEqual(self.tasker.get_task_info(running.tid).st, Tasker.TaskResultWrapper.CANCELLED)
+        started = time.time()
+        # lane is free again well before 5 seconds
+        self.assertTrue(self.tasker.run_task('test_task_kill', kwargs={'seconds': 0}, blocking=True).finished)
+        done = self.tasker.run_task('test_task_kill', kwargs={'seconds': 0})
+        self.assertTrue(self.tasker.wait_task(done.tid, timeout=2).finished)
+        self.assertLess(time.time() - started, 2)
+        self.assertEqual(self.tasker.get_task_info(queued.tid).st, Tasker.TaskResultWrapper.CANCELLED)
+        self.assertFalse(self.tasker.kill_task(done.tid))
+        with self.assertRaises(TaskNotFound):
+            self.tasker.kill_task('notask')
+
+    def test_wait_task(self):
+        self.tasker.register_task('test_task_wait', test_sleep)
+        trw = self.tasker.run_task('test_task_wait', kwargs={'seconds': 0.2})
+        started = time.time()
+        res = self.tasker.wait_task(trw.tid, timeout=10)
+        self.assertEqual(res.result, (0.2, False))
+        self.assertLess(time.time() - started, 5)  # woken by notification, not by TASK_SYNC_REFRESH_RATE
+        trw = self.tasker.run_task('test_task_wait', kwargs={'seconds': 0.5})
+        self.assertFalse(self.tasker.wait_task(trw.tid, timeout=0.05).finished)
+        self.assertIsNone(self.tasker.wait_task('notask', timeout=0.05))
+
+    def test_timeout(self):
+        self.tasker.register_task('test_task_timeout', test_sleep, timeout=0.2)
+        self.tasker.register_task('test_task_remaining', test_remaining)
+        started = time.time()
+        trw = self.tasker.run_task('test_task_timeout', kwargs={'seconds': 1})
+        self.assertEqual(self.tasker.wait_task(trw.tid, timeout=5).st, Tasker.TaskResultWrapper.TIMEOUT)
+        self.assertLess(time.time() - started, 0.9)  # worker was not held until the task returned
+        self.assertGreaterEqual(self.tasker.get_self_status()['abandoned_threads'], 1)
+        trw = self.tasker.run_task('test_task_remaining', kwargs={'seconds': 1}, blocking=True, timeout=0.1)
+        self.assertEqual(trw.st, Tasker.TaskResultWrapper.TIMEOUT)
+        trw = self.tasker.run_task('test_task_remaining', kwargs={'seconds': 0}, timeout=5)
+        remaining = self.tasker.wait_task(trw.tid, timeout=5).result[0]
+        self.assertTrue(0 < remaining <= 5)
+        trw = self.tasker.run_task('test_task_remaining', kwargs={'seconds': 0})
+        self.assertIsNone(self.tasker.wait_task(trw.tid, timeout=5).result[0])  # no deadline
+        remaining = self.tasker.run_task('test_task_remaining', kwargs={'seconds': 0}, blocking=True).result[0]
+        self.assertTrue(0 < remaining <= self.tasker.config.get(TaskerConfig.TASK_SYNC_TIMEOUT))
+
+    def test_off_cancel(self):
+        killed = []
+        context = Tasker.TaskContext('test_off_cancel')
+        context.on_cancel(lambda: killed.append('first'))
+        hook = lambda: killed.append('second')
+        context.on_cancel(hook)
+        context.off_cancel(hook)  # e.g. worker process handed to the next task
+        context.cancel()
+        self.assertEqual(killed, ['first'])
+
+    def test_metrics(self):
+        self.tasker.register_task('test_task_metrics', test_sleep)
+        self.tasker.register_task('test_task_metrics_fail', test_fail)
+        trw = self.tasker.wait_task(self.tasker.run_task('test_task_metrics', kwargs={'seconds': 0.1}).tid, timeout=5)
+        self.assertGreaterEqual(trw.finished_at - trw.started_at, 0.1)
+        self.assertLessEqual(trw.created, trw.started_at)
+        self.tasker.wait_task(self.tasker.run_task('test_task_metrics_fail').tid, timeout=5)
+        metrics = self.tasker.get_metrics()
+        self.assertIn('orchestrator_task_run_seconds_count{task="test_task_metrics"} 1', metrics)
+        self.assertIn('orchestrator_task_queue_wait_seconds_count{task="test_task_metrics"} 1', metrics)
+        self.assertIn('orchestrator_tasks_total{task="test_task_metrics",outcome="done"} 1', metrics)
+        self.assertIn('orchestrator_tasks_total{task="test_task_metrics_fail",outcome="error"} 1', metrics)
+        self.assertIn('orchestrator_lane_queue_depth{lane="default"} 0', metrics)
+        self.assertIn('orchestrator_lane_active_workers{lane="default"}', metrics)
+        metrics = TaskMetrics()
+        metrics.observe('say "hi"\\\n', 'done')
+        self.assertIn('orchestrator_tasks_total{task="say \\"hi\\"\\\\\\n",outcome="done"} 1', metrics.render())
+
+    def test_result_size(self):
+        self.assertEqual(result_size({'a': 'xx', 'b': [1, 2]}), 1 + 2 + 1 + 16)
+        self.assertEqual(result_size(['xxxx'] * 10000), 40000)  # sampled
+        nested = []
+        for _ in range(10000):
+            nested = [nested]
+        self.assertEqual(result_size(nested), 8)  # not walked down to the bottom, deeper items count 8 bytes
+
+    def test_workflow(self):
+        self.tasker.register_task('test_wf_sleep', test_sleep, lane='test_wf', max_concurrency=4)
+        self.tasker.register_task('test_wf_add', test_add)
+        self.tasker.register_task('test_wf_fail', test_fail)
+        with self.assertRaises(InvalidTaskArguments):
+            self.tasker.run_workflow({'a': {'task': 'test_wf_add', 'after': ['b']},
+                                      'b': {'task': 'test_wf_add', 'after': ['a']}})
+        with self.assertRaises(InvalidTaskArguments):
+            self.tasker.run_workflow({'a': {'task': 'test_wf_add', 'after': ['nope']}})
+        nodes = {
+            'fit1': {'task': 'test_wf_sleep', 'kwargs': {'seconds': 0.3}},
+            'fit2': {'task': 'test_wf_sleep', 'kwargs': {'seconds': 0.3}},
+            'total': {'task': 'test_wf_add', 'inputs': {'a': 'fit1', 'b': 'fit2'}},
+            'report': {'task': 'test_wf_add', 'kwargs': {'b': 1}, 'inputs': {'a': 'total'}, 'when': 'total'},
+            'never': {'task': 'test_wf_add', 'kwargs': {'a': 0, 'b': 0}, 'when': 'zero'},
+            'zero': {'task': 'test_wf_add', 'kwargs': {'a': 0, 'b': 0}},
+        }
+        started = time.time()
+        wf = self.tasker.run_workflow(nodes)
+        res = self.tasker.wait_task(wf.tid, timeout=10)
+        self.assertLess(time.time() - started, 0.55)  # fits ran in parallel
+        self.assertEqual(res.st, Tasker.TaskResultWrapper.DONE)
+        self.assertEqual(res.result[0]['never']['st'], 'skipped')
+        self.assertEqual(self.tasker.get_task_info(res.result[0]['report']['id']).result[0], 1.6)
+        status = self.tasker.workflow_status(wf.tid)
+        self.assertEqual(status['nodes']['total']['st'], Tasker.TaskResultWrapper.DONE)
+        self.assertIsNone(self.tasker.workflow_status(res.result[0]['report']['id']))
+        wf = self.tasker.run_workflow({'fail': {'task': 'test_wf_fail'},
+                                       'after_fail': {'task': 'test_wf_add', 'kwargs': {'a': 0, 'b': 0},
+                                                      'after': ['fail']}})
+        res = self.tasker.wait_task(wf.tid, timeout=10)
+        self.assertEqual(res.st, Tasker.TaskResultWrapper.ERROR)
+        self.assertEqual(self.tasker.workflow_status(wf.tid)['nodes']['after_fail']['st'], 'skipped')
+
+    def test_status_only(self):
+        self.tasker.register_task('test_task_status', test_function)
+        trw = self.tasker.run_task('test_task_status', args=['strict'], blocking=True)
+        res = self.tasker.get_task_info(trw.tid, result=False)
+        self.assertEqual(res.status[0], Tasker.TaskResultWrapper.DONE)
+        self.assertIsNone(res.result[0])
+        self.assertEqual(self.tasker.get_task_info(trw.tid).result[0], dict(strict='strict', non_strict='non_strict'))
+
     def test_add_pre(self):
         self.tasker.register_task('test_task_add_pre', test_function)
         # True
@@ -200,6 +631,508 @@ class TaskerTest(unittest.TestCase):
             self.tasker.add_post('test_task_add_post', 'lolz')
         # TODO: figure out how to test actual post-exec run
 
+def test_pid(**kwargs):
+    return os.getpid()
+
+
+hooked = []
+
+
+def hook_pid(name, args, kwargs, res):
+    hooked.append((name, os.getpid(), res))
+
+
+def test_fail(**kwargs):
+    raise ArithmeticError('failed in worker')
+
+
+def test_model(model_name, seconds=0):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+class KeyValueConnector:
+    """ Only the key/value and batch operations of a connector, as in a storage with no indexes, queues or pub/sub """
+    OPERATIONS = {'get', 'set', 'delete', 'keys', 'expire', 'exists', 'hset', 'hmget', 'hgetall', 'mget', 'mset',
+                  'pipeline', 'scan_iter', 'graceful_shutdown', 'pool_status'}
+
+    def __init__(self, connector):
+        self.__conn = connector
+
+    def __getattr__(self, name):
+        if name not in self.OPERATIONS:
+            raise AttributeError(name)
+        return getattr(self.__conn, name)
+
+
+class KeyValueConnectorTest(unittest.TestCase):
+    def setUp(self):
+        self.memory = Connector(environment=StorageEnvironment.MEMORY, db='key_value_test')
+        self.memory.flushdb()
+        self.conn = KeyValueConnector(self.memory)
+        self.config = ConfigLoader(connector=self.conn)
+        self.tasker = Tasker(connector=self.conn, configurator=self.config)
+        self.tasker.register_task('test_plain', test_sleep, coalesce=True)
+
+    def tearDown(self):
+        self.tasker.graceful_shutdown()
+
+    def test_tasker(self):
+        first = self.tasker.run_task('test_plain', kwargs={'seconds': 0.2})
+        second = self.tasker.run_task('test_plain', kwargs={'seconds': 0.2})
+        self.assertNotEqual(first.tid, second.tid)  # no takeover of in-flight keys, no coalescing
+        self.assertEqual(self.tasker.wait_task(second.tid, timeout=5).st, Tasker.TaskResultWrapper.DONE)
+        self.assertEqual([task.tid for task in self.tasker.list_tasks()], [first.tid, second.tid])
+        self.assertEqual(self.tasker.list_tasks(offset=1)[0].tid, second.tid)
+        self.assertEqual(self.memory.keys(self.config.get(TaskerConfig.TASK_INDEX)), [])
+        with self.assertRaises(NotPermitted):
+            self.tasker.reindex()
+        with self.assertRaises(NotPermitted):
+            Tasker(environment=TaskEnvironment.QUEUE, connector=self.conn, consumers=0)
+
+    def test_config(self):
+        self.assertIn(TaskerConfig.TASK_EX.namespace, self.config.list_public)
+        self.config.set(TaskerConfig.TASK_EX, 5)
+        self.assertEqual(self.config.get(TaskerConfig.TASK_EX), 5)
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = Connector(db=14)  # nothing else unfinished in there
+        self.conn.flushdb()
+        self.tasker = Tasker(connector=self.conn)
+        self.tasker.register_task('test_retry', test_resumable, recovery='retry', max_attempts=3)
+        self.tasker.register_task('test_resume', test_resumable, recovery='resume')
+        self.tasker.register_task('test_fail', test_resumable)
+
+    def tearDown(self):
+        self.tasker.graceful_shutdown()
+
+    def crashed(self, name, st, attempts=1):
+        trw = Tasker.TaskResultWrapper(name + st + str(attempts), task_name=name, kwargs={'steps': 3})
+        trw.st = st
+        trw.attempts = attempts
+        trw.state = [0]
+        self.tasker.save(trw)
+        return trw.tid
+
+    def test_recover(self):
+        new = self.crashed('test_fail', Tasker.TaskResultWrapper.NEW)
+        retry = self.crashed('test_retry', Tasker.TaskResultWrapper.PROGRESS)
+        exhausted = self.crashed('test_retry', Tasker.TaskResultWrapper.PROGRESS, attempts=3)
+        resume = self.crashed('test_resume', Tasker.TaskResultWrapper.PROGRESS)
+        failed = self.crashed('test_fail', Tasker.TaskResultWrapper.PROGRESS)
+        unknown = self.crashed('not_registered', Tasker.TaskResultWrapper.NEW)
+        recovered = self.tasker.recover()
+        self.assertEqual(list(recovered), [new, retry, exhausted, resume, failed, unknown])
+        for task_id in (new, retry, resume):
+            self.assertEqual(self.tasker.wait_task(task_id, timeout=5).st, Tasker.TaskResultWrapper.DONE)
+        for task_id in (exhausted, failed, unknown):
+            self.assertEqual(self.tasker.get_task_info(task_id).st, Tasker.TaskResultWrapper.ERROR)
+        self.assertEqual(self.tasker.get_task_info(retry).attempts, 2)
+        self.assertEqual(self.tasker.get_task_info(retry).result[0], [0, 1, 2])
+        self.assertEqual(self.tasker.get_task_info(resume).result[0], [0, 1, 2])
+        self.assertEqual(self.tasker.get_task_info(resume).state, [0, 1, 2])
+
+
+class DurabilityTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = Connector(db=12)
+        self.conn.flushdb()
+        self.config = ConfigLoader(connector=self.conn)
+        self.tasker = Tasker(connector=self.conn, configurator=self.config)
+        self.tasker.register_task('test_task_durable', test_sleep)
+        self.path = self.config.get(TaskerConfig.TASK_PATH)
+
+    def tearDown(self):
+        self.tasker.graceful_shutdown()
+
+    def stored(self, task_id):
+        return self.tasker.load(task_id, stored=True)
+
+    def test_batched(self):
+        self.config.set(TaskerConfig.DURABILITY, 'batched')
+        self.config.set(TaskerConfig.FLUSH_INTERVAL, 60)
+        trw = self.tasker.run_task('test_task_durable', kwargs={'seconds': 0.3})
+        self.assertIsNone(self.stored(trw.tid))  # not flushed yet, but served from memory
+        self.assertFalse(self.tasker.get_task_info(trw.tid).finished)
+        self.assertIn(trw.tid, [t.tid for t in self.tasker.list_tasks()])  # listing flushes
+        self.assertFalse(self.stored(trw.tid).finished)
+        self.assertEqual(self.tasker.wait_task(trw.tid, timeout=5).st, Tasker.TaskResultWrapper.DONE)
+        self.assertNotEqual(self.stored(trw.tid).st, Tasker.TaskResultWrapper.DONE)
+        self.assertEqual(self.tasker.flush(), 1)
+        self.assertEqual(self.stored(trw.tid).result, (0.3, False))
+
+    def test_completion(self):
+        self.config.set(TaskerConfig.DURABILITY, 'completion')
+        trw = self.tasker.run_task('test_task_durable', kwargs={'seconds': 0.3})
+        self.assertIsNone(self.stored(trw.tid))
+        self.assertIn(trw.tid, [t.tid for t in self.tasker.list_tasks()])
+        self.assertEqual(self.tasker.wait_task(trw.tid, timeout=5).st, Tasker.TaskResultWrapper.DONE)
+        self.assertEqual(self.stored(trw.tid).result, (0.3, False))
+        self.assertIn(trw.tid, self.conn.zrange(self.config.get(TaskerConfig.TASK_INDEX), 0, -1))
+
+    def test_sync(self):
+        self.config.set(TaskerConfig.TASK_EX, 1)
+        self.config.set(TaskerConfig.TASK_RESULT_EX, 60)
+        try:
+            done = self.tasker.run_task('test_task_durable', kwargs={'seconds': 0}, blocking=True)
+            time.sleep(1.1)  # past task_ex, within result_ex
+            self.tasker.run_task('test_task_durable', kwargs={'seconds': 0}, blocking=True)  # trims the index
+            self.assertIn(done.tid, [t.tid for t in self.tasker.list_tasks()])
+            self.assertTrue(self.tasker.update(done.tid, {'st': done.st}))  # nothing new in the record is no failure
+        finally:
+            self.config.set(TaskerConfig.TASK_EX)
+            self.config.set(TaskerConfig.TASK_RESULT_EX)
+
+
+class AdmissionTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = Connector(db=10)
+        self.conn.flushdb()
+        self.config = ConfigLoader(connector=self.conn)
+        self.tasker = Tasker(connector=self.conn, configurator=self.config)
+        self.tasker.register_task('test_admitted', test_sleep, lane='test_admission', max_concurrency=1)
+        self.config.set(TaskerConfig.LANE_QUEUE_DEPTH, {'test_admission': 2})
+        running = self.tasker.run_task('test_admitted', kwargs={'seconds': 0.5})
+        while self.tasker.get_task_info(running.tid, result=False).st == Tasker.TaskResultWrapper.NEW:
+            time.sleep(0.01)
+        self.waiting = [self.tasker.run_task('test_admitted', kwargs={'seconds': 0}) for _ in range(2)]
+
+    def tearDown(self):
+        self.tasker.graceful_shutdown()
+
+    def test_reject(self):
+        with self.assertRaises(TaskerOverloaded) as e:
+            self.tasker.run_task('test_admitted', kwargs={'seconds': 0})
+        self.assertGreaterEqual(e.exception.retry_after, 1)
+        self.tasker.register_task('test_admitted_cached', test_sleep, lane='test_admission', cache_ttl=60)
+        self.tasker.run_task('test_admitted_cached', kwargs={'seconds': 0}, blocking=True)
+        stored = self.tasker.list_tasks().__len__()
+        with self.assertRaises(TaskerOverloaded):
+            self.tasker.run_tasks([{'task': 'test_admitted_cached', 'kwargs': {'seconds': 0}},
+                                   {'task': 'test_admitted', 'kwargs': {'seconds': 0}}])
+        self.assertEqual(self.tasker.list_tasks().__len__(), stored)  # memoized one is not stored either
+        self.assertEqual(self.tasker.run_task('test_admitted', kwargs={'seconds': 0}, blocking=True).result[0], 0)
+        client = Api(tasker=self.tasker, configurator=self.config).app.test_client()
+        res = client.post('/tasks/test_admitted', json={'seconds': 0})
+        self.assertEqual(res.status_code, 429)
+        self.assertGreaterEqual(int(res.headers['Retry-After']), 1)
+
+    def test_abandoned(self):
+        self.config.set(TaskerConfig.MAX_ABANDONED, 1)
+        self.tasker.register_task('test_abandoned', test_sleep, lane='test_abandoned')
+        trw = self.tasker.run_task('test_abandoned', kwargs={'seconds': 1}, blocking=True, timeout=0.05)
+        self.assertEqual(trw.st, Tasker.TaskResultWrapper.TIMEOUT)
+        with self.assertRaises(TaskerOverloaded):
+            self.tasker.run_task('test_abandoned', kwargs={'seconds': 0})
+        time.sleep(1)  # abandoned thread is done
+        self.assertEqual(self.tasker.run_task('test_abandoned', kwargs={'seconds': 0}, blocking=True).result[0], 0)
+
+    def test_coalesced(self):
+        self.tasker.register_task('test_admitted_coalesced', test_sleep, lane='test_admission', coalesce=True)
+        self.config.set(TaskerConfig.LANE_QUEUE_DEPTH, {'test_admission': 3})
+        waiting = self.tasker.run_task('test_admitted_coalesced', kwargs={'seconds': 0})
+        attached = self.tasker.run_task('test_admitted_coalesced', kwargs={'seconds': 0})  # lane is full by now
+        self.assertEqual(attached.tid, waiting.tid)
+        with self.assertRaises(TaskerOverloaded):
+            self.tasker.run_task('test_admitted_coalesced', kwargs={'seconds': 0.1})
+        self.config.set(TaskerConfig.LANE_QUEUE_DEPTH, {'test_admission': 4})
+        trw = self.tasker.run_task('test_admitted_coalesced', kwargs={'seconds': 0.1})  # not attached to rejected
+        self.assertEqual(self.tasker.wait_task(trw.tid, timeout=5).st, Tasker.TaskResultWrapper.DONE)
+
+    def test_shed(self):
+        self.config.set(TaskerConfig.OVERLOAD, 'shed')
+        trw = self.tasker.run_task('test_admitted', kwargs={'seconds': 0})
+        self.assertEqual(self.tasker.get_task_info(self.waiting[0].tid).st, Tasker.TaskResultWrapper.CANCELLED)
+        self.assertEqual(self.tasker.wait_task(trw.tid, timeout=5).st, Tasker.TaskResultWrapper.DONE)
+
+
+from .tasker import WorkerProcess
+from .errors import BorkedException
+import multiprocessing
+
+
+class ProcessTaskerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tasker = Tasker(environment=TaskEnvironment.PROCESS)
+        cls.tasker.register_task('test_pid', test_pid)
+        cls.tasker.register_task('test_fail', test_fail)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tasker.graceful_shutdown()
+
+    def test_timeout(self):
+        self.tasker.register_task('test_remaining', test_remaining, timeout=0.3)
+        started = time.time()
+        trw = self.tasker.run_task('test_remaining', kwargs={'seconds': 5})
+        self.assertEqual(self.tasker.wait_task(trw.tid, timeout=5).st, Tasker.TaskResultWrapper.TIMEOUT)
+        self.assertLess(time.time() - started, 2)  # worker process killed
+        trw = self.tasker.run_task('test_remaining', kwargs={'seconds': 0}, blocking=True)
+        self.assertTrue(0 < trw.result[0] <= 0.3)  # budget is known in the worker process
+
+    def test_run_in_process(self):
+        trw = self.tasker.run_task('test_pid', blocking=True)
+        self.assertNotEqual(trw.result[0], os.getpid())
+        trw = self.tasker.run_task('test_pid')
+        deadline = time.time() + 10
+        while not self.tasker.get_task_info(trw.tid, result=False).finished and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertNotEqual(self.tasker.get_task_info(trw.tid).result[0], os.getpid())
+
+    def test_error(self):
+        trw = self.tasker.run_task('test_fail', blocking=True)
+        self.assertTrue(trw.result[1])
+        self.assertIn('ArithmeticError', trw.result[0])
+
+    def test_recycling(self):
+        self.tasker.config.set(TaskerConfig.WORKER_MAX_TASKS, 1)
+        try:
+            self.tasker.register_task('test_pid', test_pid)  # replaces workers started with old limit
+            first = self.tasker.run_task('test_pid', blocking=True).result[0]
+            second = self.tasker.run_task('test_pid', blocking=True).result[0]
+            self.assertNotEqual(first, second)
+        finally:
+            self.tasker.config.set(TaskerConfig.WORKER_MAX_TASKS)
+
+    def test_kill_task(self):
+        self.tasker.register_task('test_sleep', test_sleep)
+        trw = self.tasker.run_task('test_sleep', kwargs={'seconds': 10})
+        while self.tasker.get_task_info(trw.tid).st == Tasker.TaskResultWrapper.NEW:
+            time.sleep(0.01)
+        started = time.time()
+        self.assertTrue(self.tasker.kill_task(trw.tid))
+        self.assertTrue(self.tasker.run_task('test_pid', blocking=True).finished)
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(self.tasker.get_task_info(trw.tid).st, Tasker.TaskResultWrapper.CANCELLED)
+
+    def test_affinity(self):
+        self.tasker.register_task('test_model', test_model, lane='test_affinity', max_concurrency=2,
+                                  affinity=lambda model_name, **kwargs: model_name)
+        first, second = (self.tasker.run_task('test_model', kwargs={'model_name': name, 'seconds': 0.3})
+                         for name in ('first', 'second'))  # both run at once, in two workers
+        pids = {name: self.tasker.wait_task(trw.tid, timeout=10).result[0]
+                for name, trw in (('first', first), ('second', second))}
+        self.assertNotEqual(pids['first'], pids['second'])
+        warm = self.tasker.get_self_status()['affinity']['warm']
+        for name in ('second', 'first', 'second'):
+            trw = self.tasker.run_task('test_model', kwargs={'model_name': name}, blocking=True)
+            self.assertEqual(trw.result[0], pids[name])
+        self.assertEqual(self.tasker.get_self_status()['affinity']['warm'], warm + 3)
+
+    def test_get_self_status(self):
+        self.tasker.run_task('test_pid', blocking=True)
+        self.assertIn('processes', self.tasker.get_self_status())
+
+    def test_hooks_in_tasker_process(self):
+        self.tasker.run_task('test_pid', blocking=True)  # worker forked before the hook is added
+        self.tasker.register_task('test_hooked', test_pid)
+        self.tasker.add_post('test_hooked', hook_pid)
+        pid = self.tasker.run_task('test_hooked', blocking=True).result[0]
+        self.assertEqual(hooked[-1], ('test_hooked', os.getpid(), pid))
+
+    def test_killed_worker(self):
+        worker = WorkerProcess(multiprocessing.get_context(), dict(), generation=0)
+        worker.kill()
+        self.assertFalse(worker.usable(0))
+        self.assertFalse(worker.process.is_alive())
+        with self.assertRaises(BorkedException):
+            worker.run('test_pid', (), dict())
+
+
+class QueueTaskerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.api_node = Tasker(environment=TaskEnvironment.QUEUE, consumers=0)
+        cls.worker_node = Tasker(environment=TaskEnvironment.QUEUE, consumers=2)
+        for tasker in (cls.api_node, cls.worker_node):
+            tasker.register_task('test_pid', test_pid)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.api_node.graceful_shutdown()
+        cls.worker_node.graceful_shutdown()
+
+    def wait(self, task_id, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            task = self.api_node.get_task_info(task_id)
+            if task.finished:
+                return task
+            time.sleep(0.01)
+        self.fail(f'{task_id} was not finished in {timeout} seconds')
+
+    def test_run_on_other_node(self):
+        trw = self.api_node.run_task('test_pid')
+        self.assertEqual(trw.st, Tasker.TaskResultWrapper.NEW)
+        self.assertEqual(self.wait(trw.tid).result, (os.getpid(), False))
+        self.assertEqual(self.worker_node.get_self_status()['queue']['lanes'][Tasker.DEFAULT_LANE]['processing'], 0)
+
+    def test_blocking(self):
+        self.assertEqual(self.api_node.run_task('test_pid', blocking=True).result, (os.getpid(), False))
+
+    def test_task_queue_depth(self):
+        self.api_node.config.set(TaskerConfig.TASK_QUEUE_DEPTH, {'test_pid': 1})
+        try:
+            with self.assertRaises(NotPermitted):  # not counted by name, so it's not silently ignored
+                self.api_node.run_task('test_pid')
+        finally:
+            self.api_node.config.set(TaskerConfig.TASK_QUEUE_DEPTH)
+
+    def test_kill_task(self):
+        for tasker in (self.api_node, self.worker_node):
+            tasker.register_task('test_cooperative', test_cooperative)
+        running = self.api_node.run_task('test_cooperative', kwargs={'seconds': 5})
+        while self.api_node.get_task_info(running.tid).st == Tasker.TaskResultWrapper.NEW:
+            time.sleep(0.01)
+        self.assertTrue(self.api_node.kill_task(running.tid))
+        started = time.time()
+        while self.worker_node.get_self_status()['queue']['lanes'][Tasker.DEFAULT_LANE]['processing']:
+            time.sleep(0.01)
+        self.assertLess(time.time() - started, 2)  # worker node stopped it
+        self.assertEqual(self.api_node.get_task_info(running.tid).st, Tasker.TaskResultWrapper.CANCELLED)
+
+    def test_requeue_orphans(self):
+        trw = Tasker.TaskResultWrapper('orphan', task_name='test_pid')
+        self.api_node.save(trw)
+        queue = self.api_node.config.get(TaskerConfig.TASK_QUEUE)
+        Connector().lpush('.'.join((queue, 'processing', Tasker.DEFAULT_LANE, 'dead-node')), trw.tid)
+        self.assertEqual(self.api_node.requeue_orphans(), [trw.tid])
+        self.assertEqual(self.wait(trw.tid).st, Tasker.TaskResultWrapper.DONE)
+
+    def test_get_self_status(self):
+        self.assertFalse(self.api_node.get_self_status()['queue']['consuming'])
+        status = self.worker_node.get_self_status()
+        self.assertTrue(status['queue']['consuming'])
+        self.assertEqual(status['lanes'][Tasker.DEFAULT_LANE]['max_threads'], 2)
+        self.assertIn('service', status['queue']['lanes'])
+
+    def test_workflow(self):
+        nodes = {'first': {'task': 'test_pid'}, 'second': {'task': 'test_pid', 'after': ['first']}}
+        wf = self.api_node.run_workflow(nodes)
+        res = self.api_node.wait_task(wf.tid, timeout=10)  # driven and run by the worker node
+        self.assertEqual(res.st, Tasker.TaskResultWrapper.DONE)
+        status = self.api_node.workflow_status(wf.tid)
+        self.assertEqual(status['nodes']['second']['st'], Tasker.TaskResultWrapper.DONE)
+
+
+from .scheduler import CronExpression, Schedule, Scheduler
+from .errors import InvalidSchedule
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = Connector(db=11)
+        self.conn.flushdb()
+        config = ConfigLoader(connector=self.conn)
+        self.tasker = Tasker(connector=self.conn, configurator=config)
+        self.tasker.register_task('test_scheduled', test_sleep)
+        self.scheduler = Scheduler(tasker=self.tasker, connector=self.conn)
+        self.other = Scheduler(tasker=self.tasker, connector=self.conn)  # another node
+
+    def tearDown(self):
+        self.tasker.graceful_shutdown()
+
+    def test_cron(self):
+        start = time.mktime((2024, 1, 1, 10, 7, 30, 0, 0, -1))  # Monday
+        self.assertEqual(CronExpression('*/15 * * * *').next(start), start - 7 * 60 - 30 + 15 * 60)
+        saturday = CronExpression('0 3 * * 6').next(start)
+        self.assertEqual(time.localtime(saturday)[:5], (2024, 1, 6, 3, 0))
+        self.assertEqual(time.localtime(CronExpression('0 0 1 * 7').next(start))[:5], (2024, 1, 7, 0, 0))
+        for expression in ('* * *', '60 * * * *', 'a * * * *', '0 0 30 2 *'):
+            with self.assertRaises(InvalidSchedule):
+                CronExpression(expression).next(start)
+
+    def test_schedule(self):
+        with self.assertRaises(InvalidSchedule):
+            self.scheduler.add_schedule('nope', 'not_registered', interval=10)
+        with self.assertRaises(InvalidSchedule):
+            self.scheduler.add_schedule('nope', 'test_scheduled', interval=10, cron='* * * * *')
+        self.scheduler.add_schedule('every10', 'test_scheduled', kwargs={'seconds': 0}, interval=10, jitter=5)
+        self.assertIn('every10', self.other.list_schedules())
+        created = self.scheduler.get_schedule('every10').created
+        self.assertEqual(self.scheduler.tick(now=created + 5), [])
+        fired = self.scheduler.tick(now=created + 15) + self.other.tick(now=created + 15)
+        self.assertEqual(len(fired), 1)  # once across nodes
+        self.assertEqual(self.other.tick(now=created + 19), [])
+        self.tasker.wait_task(fired[0], timeout=5)
+        self.assertEqual(len(self.other.tick(now=created + 45)), 1)  # missed runs fire once
+        self.assertTrue(self.scheduler.delete_schedule('every10'))
+        self.assertFalse(self.scheduler.delete_schedule('every10'))
+
+    def test_misfire_and_concurrency(self):
+        created = self.scheduler.add_schedule('late', 'test_scheduled', kwargs={'seconds': 0}, interval=100,
+                                              misfire_grace=10).created
+        self.assertEqual(self.scheduler.tick(now=created + 150), [])  # 50 seconds late, skipped
+        self.assertEqual(len(self.scheduler.tick(now=created + 205)), 1)
+        self.scheduler.delete_schedule('late')
+        created = self.scheduler.add_schedule('slow', 'test_scheduled', kwargs={'seconds': 1}, interval=1,
+                                              misfire=Schedule.ONCE).created
+        self.assertEqual(len(self.scheduler.tick(now=created + 1000)), 1)
+        self.assertEqual(self.scheduler.tick(now=created + 1001), [])  # previous run is not finished
+        self.assertEqual(len(self.scheduler.schedule_status(self.scheduler.get_schedule('slow'))['running']), 1)
+
+    def test_failed_fire(self):
+        self.tasker.register_task('test_scheduled_elsewhere', test_sleep)
+        created = self.scheduler.add_schedule('elsewhere', 'test_scheduled_elsewhere', kwargs={'seconds': 0},
+                                              interval=10).created
+        self.scheduler.add_schedule('here', 'test_scheduled', kwargs={'seconds': 0}, interval=10)
+        del self.tasker.tasks['test_scheduled_elsewhere']  # registered on another node only
+        self.assertEqual(len(self.scheduler.tick(now=created + 15)), 1)  # the other schedule still fires
+        self.assertIsNone(self.scheduler.schedule_status(self.scheduler.get_schedule('elsewhere'))['last'])
+        self.tasker.register_task('test_scheduled_elsewhere', test_sleep)
+        self.assertEqual(len(self.other.tick(now=created + 16)), 1)  # failed run was not marked fired
+
+
 class ApiTest(unittest.TestCase):
-    pass
-    # TODO: test cases for API
\ No newline at end of file
+    @classmethod
+    def setUpClass(cls):
+        cls.api = Api()
+        cls.api.tasker.register_task('test_api_function', test_function)
+        cls.client = cls.api.app.test_client()
+
+    def test_batch(self):
+        calls = [{'task': 'test_api_function', 'kwargs': {'strict': i}} for i in range(3)]
+        res = self.client.post('/tasks:batch', json=calls).get_json()
+        self.assertFalse(res['error'])
+        self.assertEqual(len(res['object']), 3)
+        res = self.client.post('/tasks:batch', json=calls + [{'task': 'not_exists'}]).get_json()
+        self.assertTrue(res['error'])
+
+    def test_cancel_without_id(self):
+        res = self.client.delete('/control/')
+        self.assertEqual(res.status_code, 400)
+        self.assertTrue(res.get_json()['error'])
+
+    def test_metrics(self):
+        self.api.tasker.run_task('test_api_function', kwargs={'strict': 1}, blocking=True)
+        res = self.client.get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content_type.startswith('text/plain'))
+        self.assertIn('orchestrator_tasks_total{task="test_api_function",outcome="done"}', res.get_data(as_text=True))
+
+    def test_schedules(self):
+        res = self.client.put('/schedules/test_api_schedule', json={'task': 'test_api_function', 'interval': 60,
+                                                                     'kwargs': {'strict': 1}}).get_json()
+        self.assertFalse(res['error'])
+        self.assertTrue(self.client.put('/schedules/test_api_schedule', json={'task': 'test_api_function'}
+                                        ).get_json()['error'])
+        res = self.client.get('/schedules/test_api_schedule').get_json()
+        self.assertEqual(res['test_api_schedule']['interval'], 60)
+        self.assertIn('next', res['test_api_schedule'])
+        self.assertFalse(self.client.delete('/schedules/test_api_schedule').get_json()['error'])
+        self.assertTrue(self.client.get('/schedules/test_api_schedule').get_json()['error'])
+
+    def test_workflow(self):
+        nodes = {'first': {'task': 'test_api_function', 'kwargs': {'strict': 1}},
+                 'second': {'task': 'test_api_function', 'inputs': {'strict': 'first'}}}
+        res = self.client.post('/workflows', json={'nodes': nodes}).get_json()
+        self.assertFalse(res['error'])
+        self.api.tasker.wait_task(res['object'], timeout=5)
+        res = self.client.get(f'/workflows/{res["object"]}').get_json()
+        self.assertEqual(res['response']['st'], Tasker.TaskResultWrapper.DONE)
+        self.assertEqual(res['response']['nodes']['second']['st'], Tasker.TaskResultWrapper.DONE)
+        self.assertTrue(self.client.post('/workflows', json={'nodes': {'a': {'task': 'nope'}}}).get_json()['error'])
+        self.assertTrue(self.client.get('/workflows/nope').get_json()['error'])
@@ -1,4 +1,4 @@
-from orchestrator import Api, Tasker, Conductor, l
+from orchestrator import Api, Tasker, Scheduler, Conductor, l
 from models_handler import current_loader, predict, fit, show_dumps_list, delete_model_dump, restore_model_dump
 from time import sleep
 # DON'T USE DOTS HERE
@@ -24,6 +24,12 @@ def predict_task(model_name: str, **kwargs) -> dict:
     pr = predict(model)
     return pr
 
+def prediction_task(model_name: str, **kwargs) -> dict:
+    # predictions are not written out, so this one is safe to memoize: a hit skips nothing
+    model = current_loader(model_name).model()
+    pr = predict(model, write_out=False)
+    return pr
+
 def model_dump_control(model_name: str='', restore: bool=False, dump_id: str='') -> str:
     model = current_loader(model_name).model()
     if restore:
@@ -31,20 +37,62 @@ def model_dump_control(model_name: str='', restore: bool=False, dump_id: str='')
     else:
         return delete_model_dump(model, dump_id=dump_id)
 
+def predict_version(model_name: str, **kwargs) -> str:
+    return current_loader(model_name).model.champion_stamp()
+
+def task_champion(args, kwargs) -> str:
+    return predict_version(kwargs.get('model_name', args[0] if args else ''))
+
+def task_id():
+    context = Tasker.TaskContext.current()
+    return context and context.task_id
+
+started_with = dict()  # task id -> champion it started with, until it's post-execute hook
+
+def note_champion(name: str, args, kwargs, res):
+    started_with[task_id()] = task_champion(args, kwargs)
+
+def drop_predictions(name: str, args, kwargs, res):
+    """
+    Post-execute hook of tasks that can change a champion: memoized predictions of an old one are not hit anymore,
+    they are dropped instead of waiting out their ttl. Execute hooks of a task run in the same process, the tasker's
+    one in any tasker mode, so the champion it started with is at hand
+    """
+    if started_with.pop(task_id(), None) != task_champion(args, kwargs):
+        t.invalidate_cache('prediction')
+
+def model_affinity(model_name: str, **kwargs) -> tuple:
+    return model_name, predict_version(model_name)
+
 def model_dump_show(model_name: str=''):
     model = current_loader(model_name).model()
     return show_dumps_list(model)
 
 t = Tasker()
 
-t.register_task('fit', fit_task)
-t.register_task('predict', predict_task)
+# fits take minutes, so they get their own lane and don't hold up predictions
+# in process mode model tasks go to a worker that already has the model loaded, if one is free
+t.register_task('fit', fit_task, lane='batch', recovery='retry', max_attempts=3, affinity=model_affinity)
+# predict writes predictions out on every call, prediction only returns them and is memoized per champion
+t.register_task('predict', predict_task, lane='online', coalesce=True, recovery='retry', max_attempts=3,
+                affinity=model_affinity)
+t.register_task('prediction', prediction_task, lane='online', cache_ttl=3600, cache_version=predict_version,
+                coalesce=True, recovery='retry', max_attempts=3, affinity=model_affinity)
 t.register_task('test', test_task)
 
 t.register_task('dumpdump', model_dump_show)
 t.register_task('controldump', model_dump_control)
+t.add_pre('fit', note_champion)
+t.add_post('fit', drop_predictions)
+t.add_pre('controldump', note_champion)
+t.add_post('controldump', drop_predictions)
+t.recover()  # tasks left by previous container run
+
+# recurring fit and predict runs, set up with PUT /schedules/<name>
+s = Scheduler(tasker=t)
+s.start()
 
-a = Api(tasker=t)
+a = Api(tasker=t, scheduler=s)
 a.start()
 
 